@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academia_api.settings')
 
 application = get_asgi_application()
+
+# Solo los procesos del servidor vuelcan métricas a METRICAS_DIR (academia_app/metricas.py)
+from academia_app.metricas import activar_volcado
+
+activar_volcado()
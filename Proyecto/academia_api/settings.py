@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,6 +54,9 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'academia_app.perfilado.PerfiladorMiddleware',  # el primero, para medir también al resto de middlewares
+    'academia_app.academias.AcademiaMiddleware',   # antes de cualquier consulta a los modelos de la app
+    'academia_app.metricas.MetricasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # ← justo después de SecurityMiddleware
@@ -58,6 +64,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'academia_app.idempotencia.IdempotenciaMiddleware',  # después de la autenticación: las claves son por usuario
+    'academia_app.coalescencia.CoalescenciaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,6 +78,8 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 ROOT_URLCONF = 'academia_api.urls'
 
 TEMPLATES = [
@@ -142,3 +152,84 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Archivo de matrículas (academia_app/archivo.py)
+# Un curso activo se considera terminado cuando empezó hace más de estos días
+ARCHIVO_DIAS_CURSO_FINALIZADO = 365
+
+# Stream SSE de eventos (academia_app/eventos.py)
+EVENTOS_HISTORIAL = 1000     # eventos guardados en memoria para reanudar con Last-Event-ID
+EVENTOS_TAMANO_COLA = 100    # eventos pendientes por cliente antes de pedirle que resincronice
+EVENTOS_LATIDO = 15          # segundos entre comentarios keep-alive en conexiones sin eventos
+
+# Webhooks de eventos (outbox, academia_app/webhooks.py)
+WEBHOOK_URLS = []              # destinos que reciben los eventos, p. ej. ['https://facturacion.example.com/hooks/academia']
+WEBHOOK_TIMEOUT = 5            # segundos por petición
+WEBHOOK_HILOS = 4              # destinos que se entregan en paralelo
+WEBHOOK_LOTE = 100             # eventos por petición a un destino
+WEBHOOK_MAX_INTENTOS = 10      # después se deja de reintentar (queda en la tabla con ultimo_error)
+WEBHOOK_BACKOFF_BASE = 2       # segundos; se duplica en cada intento fallido
+WEBHOOK_BACKOFF_MAX = 3600
+
+# Trabajos de reportes masivos (academia_app/reportes.py)
+REPORTES_DIR = BASE_DIR / 'reportes'     # ficheros generados
+REPORTES_TAMANO_FRAGMENTO = 5000         # ids de estudiante por fragmento
+REPORTES_CADUCIDAD = 600                 # segundos sin avanzar tras los que otro worker reanuda un trabajo en curso
+
+# Caché en proceso de elegibilidad de cursos (academia_app/cache_cursos.py)
+CURSOS_CACHE_TTL = 60        # segundos; acota el retraso entre workers, dentro del proceso se invalida al guardar
+
+# Lectura por lotes ?ids= y POST batch_get/ (academia_app/lotes.py)
+LOTE_MAX_IDS = 500           # ids por petición
+
+# Contadores de filas para ?count=true (academia_app/contadores.py)
+CONTADORES_LIMITE_EXACTO = 10000   # con filtros sin contador se cuenta hasta aquí; por encima el total es aproximado
+
+# Perfilado de peticiones con ?_profile=1 (academia_app/perfilado.py)
+PERFILADO_DIR = BASE_DIR / 'perfiles'   # resúmenes .json y estadísticas .prof
+PERFILADO_TOKEN = None                  # si se define, la cabecera X-Perfil-Token también autoriza el perfilado
+PERFILADO_MUESTREO = 0.0                # fracción de peticiones que se perfilan sin pedirlo (p. ej. 0.001)
+PERFILADO_MAX_PERFILES = 200            # se borran los más antiguos
+PERFILADO_TOP_FUNCIONES = 30
+
+# Métricas Prometheus en /metrics (academia_app/metricas.py)
+# Directorio compartido por todos los workers; mejor en disco local o tmpfs. gunicorn.conf.py lo vacía al arrancar
+METRICAS_DIR = os.environ.get('METRICAS_DIR', BASE_DIR / 'metricas')
+METRICAS_INTERVALO = 1.0     # segundos entre volcados de cada proceso a su fichero
+
+# Idempotency-Key en los POST de alta (academia_app/idempotencia.py)
+IDEMPOTENCIA_RUTAS = {'estudiante-list', 'matricula-list'}  # nombres de URL del router
+IDEMPOTENCIA_TTL = 24 * 3600      # segundos que se guarda la respuesta de cada clave
+IDEMPOTENCIA_BLOQUEO = 60         # segundos que una petición en curso retiene su clave (si su worker muere, se libera)
+IDEMPOTENCIA_ESPERA = 10          # segundos que un reintento espera a la petición original en curso
+
+# Coalescencia de lecturas caras idénticas y simultáneas (academia_app/coalescencia.py)
+COALESCENCIA_RUTAS = {'curso-estudiantes', 'estudiante-reporte'}  # nombres de URL del router
+COALESCENCIA_ESPERA = 10     # segundos que una petición espera a la idéntica en curso antes de calcular por su cuenta
+
+# Academias con base de datos propia (academia_app/academias.py). Se eligen por la cabecera ACADEMIA_CABECERA o por
+# el Host (que debe estar también en ALLOWED_HOSTS); el resto de peticiones usan 'default'. Ej:
+# ACADEMIAS = {'norte': {'hosts': ['norte.academia.com']}, 'sur': {'hosts': ['sur.academia.com']}}
+ACADEMIAS = {}
+ACADEMIAS_DIR = BASE_DIR / 'academias'   # un fichero SQLite por academia: <nombre>.sqlite3
+ACADEMIA_CABECERA = 'X-Academia'
+for _nombre in ACADEMIAS:
+    DATABASES[f'academia_{_nombre}'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ACADEMIAS_DIR / f'{_nombre}.sqlite3'}
+DATABASE_ROUTERS = ['academia_app.academias.RouterAcademias']
+
+# Autocompletado en memoria de GET /api/autocomplete/ (academia_app/autocompletado.py)
+AUTOCOMPLETADO_RECONSTRUIR = 300       # segundos entre reconstrucciones completas en segundo plano
+AUTOCOMPLETADO_MAX_EXPLORADAS = 2000   # palabras recorridas como mucho por búsqueda
+AUTOCOMPLETADO_LIMITE = 10             # resultados por defecto; ?limite= admite hasta AUTOCOMPLETADO_LIMITE_MAXIMO
+AUTOCOMPLETADO_LIMITE_MAXIMO = 50
+
+# Instantáneas de la base de datos de cada academia en GET /api/instantanea/ (academia_app/instantaneas.py)
+INSTANTANEAS_DIR = BASE_DIR / 'instantaneas'   # una subcarpeta por academia
+INSTANTANEAS_CONSERVAR = 3            # instantáneas que se guardan; se borran las más antiguas
+INSTANTANEAS_PAGINAS_POR_PASO = 256   # páginas copiadas con la BD bloqueada para escribir (1 MB con páginas de 4 KB)
+INSTANTANEAS_MAX_REINICIOS = 5        # copias reiniciadas por escrituras antes de copiar de una vez
+
+# Borrado de cursos y estudiantes con sus matrículas por lotes (academia_app/borrado.py)
+BORRADO_TAMANO_LOTE = 2000        # matrículas por transacción; entre lotes entran las demás escrituras
+BORRADO_LIMITE_SINCRONO = 5000    # con más matrículas DELETE responde 202 y sigue en segundo plano
+BORRADO_CADUCIDAD = 300           # segundos sin avanzar tras los que procesar_borrados da por muerto un trabajo en curso o reintenta uno con error
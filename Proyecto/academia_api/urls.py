@@ -20,13 +20,19 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework.routers import DefaultRouter
-from academia_app.views import EstudianteViewSet, CursoViewSet, MatriculaViewSet
+from academia_app.views import EstudianteViewSet, CursoViewSet, MatriculaViewSet, MatriculaArchivadaViewSet, TrabajoReporteViewSet, TrabajoBorradoViewSet, PerfilViewSet, AutocompletadoViewSet, InstantaneaViewSet, eventos, metricas
 
 # para asociar vista a /api  aunque aun te faltaria asociar vistas tambien para esas urls, que no lo veo mucho sentido ahora mismo.
 router = DefaultRouter()
 router.register(r'estudiantes', EstudianteViewSet)
 router.register(r'cursos', CursoViewSet)
 router.register(r'matriculas', MatriculaViewSet)
+router.register(r'matriculas-archivadas', MatriculaArchivadaViewSet)
+router.register(r'reportes/jobs', TrabajoReporteViewSet)
+router.register(r'borrados', TrabajoBorradoViewSet)
+router.register(r'perfiles', PerfilViewSet, basename='perfil')
+router.register(r'autocomplete', AutocompletadoViewSet, basename='autocomplete')
+router.register(r'instantanea', InstantaneaViewSet, basename='instantanea')
 
 # Configuración de Swagger
 schema_view = get_schema_view(
@@ -40,7 +46,9 @@ schema_view = get_schema_view(
 )
 
 urlpatterns = [
-    #path('admin/', admin.site.urls), # Panel de administración de Django, si usas admin
+    path('admin/', admin.site.urls), # Panel de administración de Django
+    path('api/eventos/', eventos, name='eventos'), # Stream SSE, necesita servidor ASGI
+    path('metrics', metricas, name='metricas'), # Métricas Prometheus
     path('api/', include(router.urls)), # Mis endpoints del API
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'), # Documentacion interactiva Swagger
     path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'), #redireccion directa al swagger 
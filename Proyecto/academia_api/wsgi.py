@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academia_api.settings')
 
 application = get_wsgi_application()
+
+# Solo los procesos del servidor vuelcan métricas a METRICAS_DIR (academia_app/metricas.py)
+from academia_app.metricas import activar_volcado
+
+activar_volcado()
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+
+# Varias academias en un mismo despliegue, cada una con su propia base de datos (ACADEMIAS en settings).
+#  - AcademiaMiddleware elige la academia de cada petición por la cabecera ACADEMIA_CABECERA o por el Host;
+#    las peticiones que no corresponden a ninguna van a 'default', como antes de haber academias.
+#  - RouterAcademias manda los modelos de academia_app a la base de datos de esa academia. Usuarios, sesiones
+#    y admin siguen en 'default'. Con un fichero SQLite por academia cada una tiene su propio bloqueo de escritura.
+#  - Los comandos de gestión trabajan sobre la academia de la variable de entorno ACADEMIA (o 'default');
+#    `manage.py academias` migra, resume o ejecuta un comando en todas.
+#  - Las cachés y difusores en memoria usan PorAcademia: una instancia por academia.
+
+APP = 'academia_app'
+
+_alias = ContextVar('academia', default=None)
+
+
+def alias_de(nombre):
+    return f"academia_{nombre}"
+
+
+def aliases():
+    """'default' y los alias de todas las academias configuradas."""
+    return [DEFAULT_DB_ALIAS, *(alias_de(nombre) for nombre in settings.ACADEMIAS)]
+
+
+def alias_actual():
+    alias = _alias.get()
+    if alias is None:
+        nombre = os.environ.get('ACADEMIA')
+        alias = alias_de(nombre) if nombre else DEFAULT_DB_ALIAS
+    return alias
+
+
+@contextmanager
+def con_academia(alias):
+    token = _alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _alias.reset(token)
+
+
+def registrar_academia(nombre, hosts=(), ruta=None):
+    """Da de alta una academia en caliente (la configuración habitual es ACADEMIAS en settings). Devuelve su alias."""
+    alias = alias_de(nombre)
+    settings.ACADEMIAS[nombre] = {'hosts': list(hosts)}
+    configuracion = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ruta or settings.ACADEMIAS_DIR / f"{nombre}.sqlite3"}
+    # configure_settings completa las claves por defecto (exige que esté 'default')
+    connections.settings[alias] = connections.configure_settings(
+        {DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS], alias: configuracion}
+    )[alias]
+    return alias
+
+
+def resolver_academia(request):
+    """Alias de la academia de la petición; None si la cabecera nombra una academia que no existe."""
+    nombre = request.headers.get(settings.ACADEMIA_CABECERA)
+    if nombre:
+        return alias_de(nombre) if nombre in settings.ACADEMIAS else None
+    host = request.get_host().rsplit(':', 1)[0].lower()
+    for nombre, configuracion in settings.ACADEMIAS.items():
+        if host in configuracion.get('hosts', ()):
+            return alias_de(nombre)
+    return DEFAULT_DB_ALIAS
+
+
+class AcademiaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ACADEMIAS:
+            return self.get_response(request)
+        alias = resolver_academia(request)
+        if alias is None:
+            return HttpResponse(json.dumps({"error": "Academia desconocida."}, ensure_ascii=False), status=404,
+                                content_type='application/json')
+        with con_academia(alias):
+            return self.get_response(request)
+
+
+class RouterAcademias:
+    """Modelos de academia_app en la base de datos de la academia actual; el resto en 'default'."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != APP:
+            return None
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            return instancia._state.db  # relaciones de un objeto ya leído: su misma base de datos
+        return alias_actual()
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == APP:
+            return True
+        return db == DEFAULT_DB_ALIAS
+
+
+class PorAcademia:
+    """Una instancia de `fabrica` por academia. Los atributos se delegan en la de la academia actual."""
+
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._lock = threading.Lock()
+        self._instancias = {}
+
+    def para(self, alias):
+        instancia = self._instancias.get(alias)
+        if instancia is None:
+            with self._lock:
+                instancia = self._instancias.setdefault(alias, self._fabrica())
+        return instancia
+
+    def actual(self):
+        return self.para(alias_actual())
+
+    def todas(self):
+        return list(self._instancias.values())
+
+    def __getattr__(self, nombre):
+        return getattr(self.actual(), nombre)
@@ -1,11 +1,78 @@
 from django.contrib import admin
 
-# Register your models here.
-from django.contrib import admin
-from .models import Estudiante
-from .models import Curso
-from .models import Matricula   
+from .contadores import PaginadorEstimado
+from .models import Curso, Estudiante, Matricula
+
+# Admin preparado para tablas grandes (millones de matrículas):
+#  - sin COUNT(*) completo: show_full_result_count=False y PaginadorEstimado (contadores mantenidos)
+#  - estudiante y curso en la misma consulta del listado (list_select_related)
+#  - FKs con autocompletado en lugar de un <select> con todos los estudiantes y cursos
+#  - búsquedas y filtros solo sobre columnas indexadas; los prefijos (LIKE en SQLite, que no distingue
+#    mayúsculas) van a los índices COLLATE NOCASE de nombre y titulo
+#  - orden explícito por la clave primaria (la más reciente primero)
+
+
+class AdminTablaGrande(admin.ModelAdmin):
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ('-id',)
+
+
+@admin.register(Estudiante)
+class EstudianteAdmin(AdminTablaGrande):
+    list_display = ('id', 'nombre', 'email', 'fecha_registro')
+    # email: índice único; nombre: prefijo sobre el índice estudiante_nombre_nocase
+    search_fields = ('email__exact', 'nombre__istartswith')
+    search_help_text = "Email exacto o comienzo del nombre"
+    list_filter = (('fecha_registro', admin.DateFieldListFilter),)
+    readonly_fields = ('fecha_registro', 'seq')
+
+
+@admin.register(Curso)
+class CursoAdmin(AdminTablaGrande):
+    list_display = ('id', 'titulo', 'fecha_inicio', 'activo')
+    search_fields = ('titulo__istartswith',)  # índice curso_titulo_nocase
+    search_help_text = "Comienzo del título"
+    list_filter = ('activo', ('fecha_inicio', admin.DateFieldListFilter))  # índice (activo, fecha_inicio)
+    readonly_fields = ('seq',)
+
+
+class FiltroCalificacion(admin.SimpleListFilter):
+    """Tramos de calificación sobre el índice de calificacion, sin SELECT DISTINCT de todos los valores."""
+    title = "calificación"
+    parameter_name = 'tramo'
+
+    def lookups(self, request, model_admin):
+        return (('sin', "Sin calificar"), ('suspenso', "Suspenso (< 5)"), ('aprobado', "Aprobado (>= 5)"))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'sin':
+            return queryset.filter(calificacion__isnull=True)
+        if self.value() == 'suspenso':
+            return queryset.filter(calificacion__lt=5)
+        if self.value() == 'aprobado':
+            return queryset.filter(calificacion__gte=5)
+        return queryset
+
+
+@admin.register(Matricula)
+class MatriculaAdmin(AdminTablaGrande):
+    list_display = ('id', 'estudiante', 'curso', 'fecha_matricula', 'calificacion')
+    list_select_related = ('estudiante', 'curso')
+    autocomplete_fields = ('estudiante', 'curso')
+    list_filter = (FiltroCalificacion, ('fecha_matricula', admin.DateFieldListFilter))
+    search_fields = ('estudiante__email', 'curso__titulo')
+    search_help_text = "Id de matrícula, email exacto del estudiante o comienzo del título del curso"
+    readonly_fields = ('fecha_matricula', 'seq')
 
-admin.site.register(Estudiante)
-admin.site.register(Curso)
-admin.site.register(Matricula)
\ No newline at end of file
+    def get_search_results(self, request, queryset, search_term):
+        # Cada tipo de término va a un índice: pk, email único (subconsulta) o cursos por título (pocos)
+        termino = search_term.strip()
+        if not termino:
+            return queryset, False
+        if termino.isascii() and termino.isdigit():
+            return queryset.filter(pk=int(termino)), False
+        if '@' in termino:
+            return queryset.filter(estudiante_id__in=Estudiante.objects.filter(email=termino).values('id')), False
+        return queryset.filter(curso_id__in=Curso.objects.filter(titulo__istartswith=termino).values('id')), False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'academia_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401  conecta los receptores
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .borrado import matriculas_eliminadas
+from .models import Curso, Matricula, MatriculaArchivada
+
+# Mueve las matrículas de cursos terminados o inactivos a MatriculaArchivada por lotes.
+# Cada lote va en su propia transacción para no bloquear al resto de escrituras mucho tiempo.
+# Un mismo estudiante puede tener varias archivadas del mismo curso (se reactivó y volvió a matricularse):
+# cada una conserva el id de su matrícula, que es lo que impide archivar dos veces la misma.
+
+TAMANO_LOTE = 5000
+
+
+def cursos_archivables(hoy=None):
+    """Cursos inactivos o que empezaron hace más de ARCHIVO_DIAS_CURSO_FINALIZADO días."""
+    hoy = hoy or timezone.now().date()
+    limite = hoy - timedelta(days=settings.ARCHIVO_DIAS_CURSO_FINALIZADO)
+    return Curso.objects.filter(Q(activo=False) | Q(fecha_inicio__lte=limite))
+
+
+def archivar_matriculas(tamano_lote=TAMANO_LOTE, hoy=None, progreso=None):
+    """Archiva todas las matrículas de cursos archivables. Devuelve cuántas se han movido."""
+    cursos = cursos_archivables(hoy).values('id')
+    total = 0
+    while True:
+        with transaction.atomic(using=router.db_for_write(Matricula)):
+            filas = list(
+                Matricula.objects.filter(curso__in=cursos)
+                .order_by('id')
+                .values_list('id', 'estudiante_id', 'curso_id', 'fecha_matricula', 'calificacion', 'curso__fecha_inicio')
+                [:tamano_lote]
+            )
+            if not filas:
+                break
+            MatriculaArchivada.objects.bulk_create([
+                MatriculaArchivada(
+                    id=id_, estudiante_id=estudiante_id, curso_id=curso_id,
+                    fecha_matricula=fecha_matricula, calificacion=calificacion, anio=fecha_inicio.year,
+                )
+                for id_, estudiante_id, curso_id, fecha_matricula, calificacion, fecha_inicio in filas
+            ])
+            # Borrado directo en SQL (sin cargar las filas ni una señal por fila). Si otra transacción ha borrado
+            # alguna entre la lectura y el DELETE, se deshace el lote y se vuelve a leer
+            borradas = Matricula.objects.filter(id__in=[fila[0] for fila in filas])
+            if borradas._raw_delete(borradas.db) != len(filas):
+                transaction.set_rollback(True, using=borradas.db)
+                continue
+            # Marcas de borrado, eventos SSE y contadores del lote, como en el borrado por lotes de borrado.py
+            matriculas_eliminadas.send(sender=Matricula, filas=[fila[:3] for fila in filas], using=borradas.db)
+        total += len(filas)
+        if progreso:
+            progreso(total)
+    return total
@@ -0,0 +1,258 @@
+import heapq
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+from .academias import PorAcademia, alias_actual, con_academia
+from .models import Curso, Estudiante
+
+# Índice en memoria para el autocompletado de GET /api/autocomplete/?q= (nombre y email de estudiantes y
+# título de cursos), en lugar de un LIKE '%x%' sobre toda la tabla en cada pulsación.
+#  - Cada texto se normaliza (sin tildes ni mayúsculas: "Lucía" -> "lucia") y se parte en palabras; el email
+#    entra entero. Las palabras se guardan en una lista ordenada por tipo y un prefijo es un rango contiguo
+#    de esa lista que se encuentra con bisect: la búsqueda no depende del tamaño de la tabla.
+#  - Con varias palabras ("lucia go") se recorre el rango de la que tiene menos coincidencias y se filtra por las demás.
+#  - Se construye en la primera búsqueda. Las señales de Estudiante y Curso lo actualizan al confirmar la
+#    transacción y cada AUTOCOMPLETADO_RECONSTRUIR segundos se reconstruye entero en segundo plano, así
+#    recoge también lo que no pasa por señales (importaciones con bulk_create, cambios de otros workers).
+#  - Es de cada proceso y de cada academia.
+
+TIPOS = ('estudiante', 'curso')
+
+_SEPARADORES = re.compile(r"[^\w@.+-]+")
+
+
+def normalizar(texto):
+    """Minúsculas y sin marcas diacríticas: 'Lucía Gómez' -> 'lucia gomez'."""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def palabras(texto):
+    return [palabra for palabra in _SEPARADORES.split(normalizar(texto)) if palabra]
+
+
+def _tokens(tipo, texto, detalle):
+    tokens = set(palabras(texto))
+    if tipo == 'estudiante':
+        tokens.add(normalizar(detalle))   # el email completo
+    return tuple(sorted(tokens))
+
+
+class _Tabla:
+    """Palabras ordenadas de un tipo, con el id de su registro en una lista paralela."""
+
+    def __init__(self, pares=()):
+        pares = sorted(pares)
+        self.tokens = [token for token, _ in pares]
+        self.ids = [id_ for _, id_ in pares]
+
+    def poner(self, id_, tokens):
+        for token in tokens:
+            posicion = bisect_left(self.tokens, token)
+            # entre palabras iguales, por id (mismo orden que sorted() en la construcción)
+            while posicion < len(self.tokens) and self.tokens[posicion] == token and self.ids[posicion] < id_:
+                posicion += 1
+            self.tokens.insert(posicion, token)
+            self.ids.insert(posicion, id_)
+
+    def quitar(self, id_, tokens):
+        for token in tokens:
+            posicion = bisect_left(self.tokens, token)
+            while posicion < len(self.tokens) and self.tokens[posicion] == token:
+                if self.ids[posicion] == id_:
+                    del self.tokens[posicion]
+                    del self.ids[posicion]
+                    break
+                posicion += 1
+
+    def rango(self, prefijo, tipo):
+        """(palabra, tipo, id) de las palabras que empiezan por prefijo, en orden."""
+        posicion = bisect_left(self.tokens, prefijo)
+        tokens, ids = self.tokens, self.ids
+        while posicion < len(tokens) and tokens[posicion].startswith(prefijo):
+            yield tokens[posicion], tipo, ids[posicion]
+            posicion += 1
+
+    def cuantas(self, prefijo):
+        """Número de palabras que empiezan por prefijo (dos bisect, sin recorrerlas)."""
+        return bisect_left(self.tokens, prefijo + '\U0010ffff') - bisect_left(self.tokens, prefijo)
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+def _bytes_entrada(entrada):
+    """Tamaño aproximado de una entrada: la tupla, sus textos y las dos referencias por palabra en su tabla."""
+    texto, detalle, tokens = entrada
+    return (sys.getsizeof(entrada) + sys.getsizeof(texto) + sys.getsizeof(detalle) + sys.getsizeof(tokens)
+            + sum(sys.getsizeof(token) + 16 for token in tokens) + 100)  # ~100 por la entrada del diccionario
+
+
+class IndiceAutocompletado:
+
+    def __init__(self, reconstruir=None):
+        self.reconstruir = reconstruir
+        self._lock = threading.Lock()
+        self._lock_primera = threading.Lock()
+        self._tablas = {tipo: _Tabla() for tipo in TIPOS}
+        self._entradas = {}        # (tipo, id) -> (texto, detalle, tokens)
+        self._bytes = 0
+        self._construido = None    # time.monotonic() de la última construcción; None si no lo está
+        self._pendientes = None    # cambios llegados durante una reconstrucción; None si no hay ninguna en curso
+        self.construcciones = 0
+        self.ultima_construccion = None  # segundos que tardó
+
+    # --- construcción -----------------------------------------------------------------------------------
+
+    @staticmethod
+    def _leer():
+        """(tipo, id, texto, detalle) de todos los estudiantes y cursos de la academia actual."""
+        for id_, nombre, email in Estudiante.objects.values_list('id', 'nombre', 'email').iterator(chunk_size=5000):
+            yield 'estudiante', id_, nombre, email
+        for id_, titulo in Curso.objects.values_list('id', 'titulo').iterator(chunk_size=5000):
+            yield 'curso', id_, titulo, ''
+
+    def construir(self):
+        """Lee toda la tabla y sustituye el índice. Los cambios que llegan mientras tanto se aplican después."""
+        with self._lock:
+            if self._pendientes is not None:
+                return  # ya hay otra construcción en curso
+            self._pendientes = []
+        inicio = time.perf_counter()
+        try:
+            entradas, pares = {}, {tipo: [] for tipo in TIPOS}
+            for tipo, id_, texto, detalle in self._leer():
+                tokens = _tokens(tipo, texto, detalle)
+                entradas[(tipo, id_)] = (texto, detalle, tokens)
+                pares[tipo].extend((token, id_) for token in tokens)
+            tablas = {tipo: _Tabla(pares[tipo]) for tipo in TIPOS}
+            del pares
+            bytes_ = sys.getsizeof(entradas) + sum(
+                sys.getsizeof(tabla.tokens) + sys.getsizeof(tabla.ids) for tabla in tablas.values()
+            ) + sum(_bytes_entrada(entrada) for entrada in entradas.values())
+        except BaseException:
+            with self._lock:
+                self._pendientes = None
+            raise
+        with self._lock:
+            self._tablas, self._entradas, self._bytes = tablas, entradas, bytes_
+            for cambio in self._pendientes:
+                self._aplicar(*cambio)
+            self._pendientes = None
+            self._construido = time.monotonic()
+            self.construcciones += 1
+            self.ultima_construccion = time.perf_counter() - inicio
+
+    def _reconstruir_en_segundo_plano(self):
+        alias = alias_actual()
+
+        def tarea():
+            try:
+                with con_academia(alias):
+                    self.construir()
+            finally:
+                connections[alias].close()
+
+        threading.Thread(target=tarea, name='autocompletado', daemon=True).start()
+
+    def _asegurar(self):
+        if self._construido is None:
+            # Las búsquedas que llegan durante la primera construcción la esperan en vez de ver el índice vacío
+            with self._lock_primera:
+                if self._construido is None:
+                    self.construir()
+            return
+        periodo = self.reconstruir if self.reconstruir is not None else settings.AUTOCOMPLETADO_RECONSTRUIR
+        if self._pendientes is None and time.monotonic() - self._construido >= periodo:
+            # Mientras se reconstruye se sigue respondiendo con el índice actual
+            self._construido = time.monotonic()
+            self._reconstruir_en_segundo_plano()
+
+    def caducar(self):
+        """Pide una reconstrucción en la próxima búsqueda (p. ej. tras una importación masiva)."""
+        if self._construido is not None:
+            self._construido = float('-inf')
+
+    def limpiar(self):
+        with self._lock:
+            self._tablas = {tipo: _Tabla() for tipo in TIPOS}
+            self._entradas = {}
+            self._bytes = 0
+            self._construido = None
+
+    # --- cambios de las señales -------------------------------------------------------------------------
+
+    def _aplicar(self, operacion, tipo, id_, texto=None, detalle=None):
+        anterior = self._entradas.pop((tipo, id_), None)
+        if anterior is not None:
+            self._tablas[tipo].quitar(id_, anterior[2])
+            self._bytes -= _bytes_entrada(anterior)
+        if operacion == 'poner':
+            entrada = (texto, detalle, _tokens(tipo, texto, detalle))
+            self._entradas[(tipo, id_)] = entrada
+            self._tablas[tipo].poner(id_, entrada[2])
+            self._bytes += _bytes_entrada(entrada)
+
+    def cambiar(self, *cambio):
+        """('poner', tipo, id, texto, detalle) o ('quitar', tipo, id). Sin índice construido no hace nada."""
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append(cambio)
+            if self._construido is not None:
+                self._aplicar(*cambio)
+
+    def poner(self, tipo, id_, texto, detalle=''):
+        self.cambiar('poner', tipo, id_, texto, detalle)
+
+    def quitar(self, tipo, id_):
+        self.cambiar('quitar', tipo, id_)
+
+    # --- búsqueda ---------------------------------------------------------------------------------------
+
+    def buscar(self, consulta, tipos=TIPOS, limite=10):
+        """
+        Hasta `limite` dicts {tipo, id, texto, detalle} cuyas palabras empiezan por las de la consulta,
+        en orden alfabético de la palabra que coincide. Se exploran como mucho AUTOCOMPLETADO_MAX_EXPLORADAS
+        palabras, así una consulta poco selectiva ("a") sigue siendo rápida.
+        """
+        buscadas = set(palabras(consulta))
+        if not buscadas or limite <= 0:
+            return []
+        self._asegurar()
+        resultados, vistos = [], set()
+        with self._lock:
+            # Se recorre el rango de la palabra más selectiva y las demás solo filtran
+            principal = min(buscadas, key=lambda palabra: sum(self._tablas[tipo].cuantas(palabra) for tipo in tipos))
+            resto = buscadas - {principal}
+            rangos = [self._tablas[tipo].rango(principal, tipo) for tipo in tipos]
+            for explorados, (_, tipo, id_) in enumerate(heapq.merge(*rangos)):
+                if explorados >= settings.AUTOCOMPLETADO_MAX_EXPLORADAS:
+                    break
+                if (tipo, id_) in vistos:
+                    continue
+                vistos.add((tipo, id_))
+                texto, detalle, tokens = self._entradas[(tipo, id_)]
+                if all(any(token.startswith(palabra) for token in tokens) for palabra in resto):
+                    resultados.append({"tipo": tipo, "id": id_, "texto": texto, "detalle": detalle})
+                    if len(resultados) >= limite:
+                        break
+        return resultados
+
+    def estadisticas(self):
+        return {
+            "entradas": len(self._entradas),
+            "palabras": sum(len(tabla) for tabla in self._tablas.values()),
+            "bytes": self._bytes,
+            "construcciones": self.construcciones,
+            "ultima_construccion_ms": round(self.ultima_construccion * 1000, 1) if self.ultima_construccion is not None else None,
+        }
+
+
+indice = PorAcademia(IndiceAutocompletado)
@@ -0,0 +1,179 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.urls import reverse
+from django.utils import timezone
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import contadores
+from .academias import alias_actual, con_academia
+from .models import Curso, Estudiante, Matricula, MatriculaArchivada, TrabajoBorrado
+from .serializers import TrabajoBorradoSerializer
+
+# Borrado de cursos y estudiantes con muchas matrículas.
+# Con on_delete=CASCADE y receptores post_delete en Matricula, el Collector de Django carga en Python todas las
+# matrículas dependientes y las borra en la misma transacción: con 100.000 matrículas la escritura de SQLite queda
+# bloqueada varios segundos. Aquí las matrículas (y las archivadas) se borran antes, por lotes de
+# BORRADO_TAMANO_LOTE ids con un DELETE directo, cada lote en su propia transacción; entre lotes entran las demás
+# escrituras. En lugar de un post_delete por fila cada lote envía la señal `matriculas_eliminadas` con sus filas
+# (signals.py mantiene con ella contadores, marcas de borrado y eventos SSE). Al final se borra el propio objeto
+# con delete(), que ya no tiene matrículas que recoger y envía sus señales de siempre.
+# Si se interrumpe a medias, lo borrado queda borrado y repetir el borrado continúa donde se quedó.
+
+# sender=Matricula, filas=[(id, estudiante_id, curso_id), ...], using=alias. Se envía dentro de la transacción del lote
+matriculas_eliminadas = Signal()
+
+_FILTRO = {Curso: 'curso_id', Estudiante: 'estudiante_id'}
+
+
+def matriculas_pendientes(instancia):
+    """Matrículas que dependen del objeto, según los contadores de filas (sin COUNT)."""
+    return contadores.valor(contadores.clave(Matricula, _FILTRO[type(instancia)], instancia.pk),
+                            using=router.db_for_read(Matricula, instance=instancia))
+
+
+def _borrar_por_lotes(modelo, filtro, using, columnas, tamano_lote, progreso=None):
+    total = 0
+    while True:
+        with transaction.atomic(using=using):
+            filas = list(modelo.objects.using(using).filter(**filtro).order_by('id').values_list(*columnas)[:tamano_lote])
+            if not filas:
+                return total
+            borradas = modelo.objects.using(using).filter(id__in=[fila[0] for fila in filas])
+            if borradas._raw_delete(using) != len(filas):
+                # Otra transacción ha borrado alguna entre la lectura y el DELETE: sus marcas y contadores ya
+                # están hechos, así que se deshace el lote y se vuelve a leer
+                transaction.set_rollback(True, using=using)
+                continue
+            if modelo is Matricula:
+                matriculas_eliminadas.send(sender=Matricula, filas=filas, using=using)
+        total += len(filas)
+        if progreso:
+            progreso(total)
+
+
+def borrar(instancia, tamano_lote=None, progreso=None):
+    """Borra un curso o estudiante y sus matrículas por lotes. Devuelve cuántas matrículas se han borrado."""
+    tamano_lote = tamano_lote or settings.BORRADO_TAMANO_LOTE
+    using = router.db_for_write(type(instancia), instance=instancia)
+    filtro = {_FILTRO[type(instancia)]: instancia.pk}
+    borradas = _borrar_por_lotes(Matricula, filtro, using, ('id', 'estudiante_id', 'curso_id'), tamano_lote, progreso)
+    # Los lotes de archivadas también avisan (con las mismas matrículas borradas): en un trabajo renuevan el latido
+    _borrar_por_lotes(MatriculaArchivada, filtro, using, ('id',), tamano_lote,
+                      progreso and (lambda _archivadas: progreso(borradas)))
+    # Las matrículas que hayan entrado mientras tanto las recoge el Collector como siempre
+    instancia.delete()
+    return borradas
+
+
+def _en_segundo_plano(funcion):
+    threading.Thread(target=funcion, name='borrado', daemon=True).start()
+
+
+def _reclamar(trabajo_id):
+    # UPDATE condicional: un trabajo pendiente, o uno en curso o con error que lleva BORRADO_CADUCIDAD segundos sin
+    # avanzar (su hilo murió con el servidor, o falló y se reintenta). Si dos procesos van a por el mismo, solo a
+    # uno le cambia la fila
+    ahora = timezone.now()
+    caducado = ahora - timedelta(seconds=settings.BORRADO_CADUCIDAD)
+    return TrabajoBorrado.objects.filter(
+        Q(estado='pendiente') | Q(estado__in=('en_curso', 'error'), actualizado__lt=caducado), pk=trabajo_id,
+    ).update(estado='en_curso', actualizado=ahora) == 1
+
+
+def _actualizar(trabajo_id, **campos):
+    # update() no toca auto_now; actualizado es además el latido que mira _reclamar
+    TrabajoBorrado.objects.filter(pk=trabajo_id).update(actualizado=timezone.now(), **campos)
+
+
+def ejecutar(trabajo_id):
+    """
+    Ejecuta un TrabajoBorrado de la academia actual (también uno interrumpido, que sigue donde se quedó).
+    Devuelve False sin hacer nada si otro hilo o proceso lo está ejecutando.
+    """
+    if not _reclamar(trabajo_id):
+        return False
+    trabajo = TrabajoBorrado.objects.get(pk=trabajo_id)
+    modelo = Curso if trabajo.modelo == 'curso' else Estudiante
+    try:
+        instancia = modelo.objects.filter(pk=trabajo.objeto_id).first()
+        if instancia is not None:
+            ya_borradas = trabajo.borradas
+            borrar(instancia, progreso=lambda n: _actualizar(trabajo.pk, borradas=ya_borradas + n))
+    except Exception as e:
+        _actualizar(trabajo.pk, estado='error', error=str(e))
+        raise
+    _actualizar(trabajo.pk, estado='completado', error='')
+    return True
+
+
+def encolar(instancia):
+    """
+    Crea el trabajo de borrado del objeto (o reintenta el que falló) y lo ejecuta en otro hilo.
+    Si ya hay uno pendiente o en marcha lo devuelve sin lanzar otro.
+    """
+    modelo = type(instancia)._meta.model_name
+    trabajo = (TrabajoBorrado.objects.filter(modelo=modelo, objeto_id=instancia.pk, estado__in=('pendiente', 'en_curso', 'error'))
+               .order_by('-id').first())
+    if trabajo is None:
+        trabajo = TrabajoBorrado.objects.create(modelo=modelo, objeto_id=instancia.pk, total=matriculas_pendientes(instancia))
+    elif trabajo.estado == 'error' and TrabajoBorrado.objects.filter(pk=trabajo.pk, estado='error').update(estado='pendiente'):
+        trabajo.estado = 'pendiente'  # un DELETE repetido reintenta ya el que falló; sigue donde se quedó
+    else:
+        return trabajo
+    alias = alias_actual()
+
+    def tarea():
+        try:
+            with con_academia(alias):
+                ejecutar(trabajo.pk)
+        finally:
+            connections[alias].close()
+
+    transaction.on_commit(lambda: _en_segundo_plano(tarea), using=router.db_for_write(TrabajoBorrado))
+    return trabajo
+
+
+def reanudar():
+    """
+    Ejecuta los trabajos pendientes, los interrumpidos (en curso sin avanzar desde hace BORRADO_CADUCIDAD segundos,
+    p. ej. tras reiniciar el servidor) y los que fallaron hace más de BORRADO_CADUCIDAD segundos. Devuelve cuántos
+    ha terminado; los que vuelven a fallar se quedan en error (GET /borrados/{id}/ da el mensaje).
+    """
+    ids = list(TrabajoBorrado.objects.filter(estado__in=('pendiente', 'en_curso', 'error')).order_by('id').values_list('id', flat=True))
+    terminados = 0
+    for trabajo_id in ids:
+        try:
+            terminados += ejecutar(trabajo_id)
+        except Exception:
+            pass  # el error queda guardado en el trabajo; seguimos con el siguiente
+    return terminados
+
+
+class BorradoMixin:
+    """DELETE de un ModelViewSet de Curso o Estudiante con las matrículas por lotes; en segundo plano si son muchas."""
+
+    @swagger_auto_schema(
+        operation_description="Borra el registro y sus matrículas. Con más de BORRADO_LIMITE_SINCRONO matrículas el "
+                              "borrado sigue en segundo plano: responde 202 con el trabajo (cabecera Location) "
+                              "para consultar su progreso en /borrados/{id}/",
+        responses={
+            status.HTTP_204_NO_CONTENT: "Borrado",
+            status.HTTP_202_ACCEPTED: TrabajoBorradoSerializer,
+            status.HTTP_404_NOT_FOUND: "No encontrado",
+        }
+    )
+    def destroy(self, request, *args, **kwargs):
+        instancia = self.get_object()
+        if matriculas_pendientes(instancia) <= settings.BORRADO_LIMITE_SINCRONO:
+            borrar(instancia)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        trabajo = encolar(instancia)
+        return Response(TrabajoBorradoSerializer(trabajo).data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': reverse('trabajoborrado-detail', args=[trabajo.pk])})
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .academias import PorAcademia
+from .models import Curso
+
+# Caché en proceso de los datos de un curso que deciden si admite matrículas (activo y fecha_inicio).
+# Se guarda el dato, no el resultado: la regla "no iniciado" se evalúa con la fecha de cada llamada,
+# así la caché no se equivoca al pasar la medianoche. La lista de cursos abiertos sí depende del día
+# y se guarda junto con su fecha.
+# Invalidación: las señales de Curso llaman a invalidar(). Cada curso tiene un número de versión que
+# sube al invalidar; una lectura de la BD que empezó antes de una invalidación no se guarda.
+# Cada academia tiene su propia caché (los ids de curso se repiten entre academias).
+
+
+class CacheElegibilidad:
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = {}     # curso_id -> (activo, fecha_inicio, caduca)
+        self._versiones = {}    # curso_id -> versión; sube en cada invalidación
+        self._version_abiertos = 0
+        self._abiertos = None   # (fecha, caduca, datos serializados)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _caducidad(self):
+        return time.monotonic() + (self.ttl if self.ttl is not None else settings.CURSOS_CACHE_TTL)
+
+    def datos_curso(self, curso_id):
+        """(activo, fecha_inicio) del curso o None si no existe."""
+        entrada = self._entradas.get(curso_id)
+        if entrada is not None and entrada[2] > time.monotonic():
+            self.aciertos += 1
+            return entrada[0], entrada[1]
+        self.fallos += 1
+        version = self._versiones.get(curso_id, 0)
+        fila = Curso.objects.filter(pk=curso_id).values_list('activo', 'fecha_inicio').first()
+        if fila is None:
+            return None
+        with self._lock:
+            if self._versiones.get(curso_id, 0) == version:
+                self._entradas[curso_id] = (fila[0], fila[1], self._caducidad())
+        return fila
+
+    def admite_matriculas(self, curso_id, hoy=None):
+        datos = self.datos_curso(curso_id)
+        if datos is None:
+            return False
+        activo, fecha_inicio = datos
+        return activo and fecha_inicio >= (hoy or timezone.now().date())
+
+    def abiertos(self, serializar, hoy=None):
+        """Datos serializados de los cursos que hoy admiten matrículas. serializar(queryset) -> lista."""
+        hoy = hoy or timezone.now().date()
+        guardado = self._abiertos
+        if guardado is not None and guardado[0] == hoy and guardado[1] > time.monotonic():
+            self.aciertos += 1
+            return guardado[2]
+        self.fallos += 1
+        version = self._version_abiertos
+        datos = serializar(Curso.objects.filter(activo=True, fecha_inicio__gte=hoy).order_by('fecha_inicio', 'id'))
+        with self._lock:
+            if self._version_abiertos == version:
+                self._abiertos = (hoy, self._caducidad(), datos)
+        return datos
+
+    def invalidar(self, curso_id):
+        with self._lock:
+            self._versiones[curso_id] = self._versiones.get(curso_id, 0) + 1
+            self._entradas.pop(curso_id, None)
+            self._version_abiertos += 1
+            self._abiertos = None
+
+    def limpiar(self):
+        """Vacía la caché y pone a cero las estadísticas."""
+        with self._lock:
+            for curso_id in list(self._entradas):
+                self._versiones[curso_id] = self._versiones.get(curso_id, 0) + 1
+            self._entradas.clear()
+            self._version_abiertos += 1
+            self._abiertos = None
+            self.aciertos = 0
+            self.fallos = 0
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / total, 4) if total else 0.0,
+            "entradas": len(self._entradas),
+        }
+
+
+elegibilidad = PorAcademia(CacheElegibilidad)
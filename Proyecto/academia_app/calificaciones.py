@@ -0,0 +1,70 @@
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+
+from .eventos import publicar_al_confirmar
+from .filtros import ENTERO_MAX
+from .models import Matricula, reservar_seq
+
+# Registro de calificaciones de todo un curso en una sola operación.
+# Solo cambia la nota, así que no pasa por Matricula.clean(): el curso y la matrícula ya existen.
+
+_campo_calificacion = Matricula._meta.get_field('calificacion')
+
+
+def _validar_calificacion(valor):
+    # Mismas reglas que el campo del modelo: decimal, max_digits y rango 0-10 (None borra la nota)
+    if valor is None:
+        return None
+    if isinstance(valor, bool):  # bool es un int: true se guardaría como un 1
+        raise ValidationError("La calificación debe ser un número, no true o false.")
+    valor = _campo_calificacion.to_python(valor)
+    _campo_calificacion.run_validators(valor)
+    return valor
+
+
+def registrar_calificaciones(curso, pares):
+    """
+    Guarda las calificaciones {estudiante_id: nota} del curso con un único bulk_update.
+    Si alguna nota o estudiante no es válido no se guarda nada y se lanza
+    ValidationError con los errores indexados por estudiante_id.
+    """
+    if not isinstance(pares, dict) or not pares:
+        raise ValidationError({"non_field_errors": ["Envía un objeto {estudiante_id: calificacion}."]})
+
+    errores = {}
+    notas = {}
+    for clave, valor in pares.items():
+        texto = str(clave).strip()
+        # Solo dígitos ASCII y que quepa en la columna: un id mayor haría fallar la consulta con un 500
+        if not (texto.isascii() and texto.isdigit()) or not 0 < int(texto) <= ENTERO_MAX:
+            errores[str(clave)] = [f"El id de estudiante debe ser un entero entre 1 y {ENTERO_MAX}."]
+            continue
+        estudiante_id = int(texto)
+        try:
+            notas[estudiante_id] = _validar_calificacion(valor)
+        except ValidationError as e:
+            errores[str(clave)] = e.messages
+
+    with transaction.atomic(using=router.db_for_write(Matricula)):
+        matriculas = list(
+            Matricula.objects.filter(curso=curso, estudiante_id__in=notas).only('id', 'estudiante_id', 'calificacion', 'seq')
+        )
+        encontrados = {m.estudiante_id for m in matriculas}
+        for estudiante_id in notas.keys() - encontrados:
+            errores[str(estudiante_id)] = ["El estudiante no está matriculado en este curso."]
+        if errores:
+            raise ValidationError(errores)
+
+        primero = reservar_seq(len(matriculas)) - len(matriculas) + 1 if matriculas else 0
+        for i, matricula in enumerate(matriculas):
+            anterior = matricula.calificacion
+            matricula.calificacion = notas[matricula.estudiante_id]
+            matricula.seq = primero + i
+            # bulk_update no envía post_save: publicamos aquí el evento de recalificación
+            if matricula.calificacion != anterior:
+                publicar_al_confirmar(matricula.seq, 'matricula.calificada', curso.pk, {
+                    "matricula": matricula.pk, "estudiante": matricula.estudiante_id, "curso": curso.pk,
+                    "calificacion": matricula.calificacion,
+                })
+        Matricula.objects.bulk_update(matriculas, ['calificacion', 'seq'])
+    return len(matriculas)
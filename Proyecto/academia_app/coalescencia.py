@@ -0,0 +1,91 @@
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .academias import alias_actual
+from .metricas import registro
+
+# Coalescencia de lecturas caras (COALESCENCIA_RUTAS): si llegan a la vez varias peticiones idénticas
+# (misma academia, ruta, objeto, parámetros, Accept y usuario), solo la primera ejecuta la vista; las demás esperan
+# y reciben una copia de su respuesta ya renderizada. No es una caché: al terminar la primera, la siguiente
+# petición vuelve a calcular, así nunca se sirve un resultado anterior a la petición. Es dentro de cada proceso.
+
+
+class _Vuelo:
+    __slots__ = ('listo', 'resultado')
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+
+
+class Coalescedor:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos = {}   # clave -> _Vuelo en curso
+
+    def compartir(self, clave, calcular, espera):
+        """
+        (resultado, coalescida). Solo una llamada concurrente por clave ejecuta calcular(); las demás esperan
+        hasta `espera` segundos su resultado. Si falla o tarda más, cada una lo calcula por su cuenta.
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+        if not lider:
+            if vuelo.listo.wait(espera) and vuelo.resultado is not None:
+                return vuelo.resultado, True
+            return calcular(), False
+        try:
+            vuelo.resultado = calcular()
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.listo.set()
+        return vuelo.resultado, False
+
+    def en_curso(self):
+        return len(self._vuelos)
+
+
+coalescedor = Coalescedor()
+
+
+class CoalescenciaMiddleware:
+    """Comparte la ejecución de las vistas de COALESCENCIA_RUTAS (nombres de URL del router) entre peticiones GET idénticas."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        ruta = request.resolver_match.url_name
+        if request.method != 'GET' or ruta not in settings.COALESCENCIA_RUTAS:
+            return None
+        usuario = request.user.pk if request.user.is_authenticated else None
+        clave = (alias_actual(), ruta, tuple(sorted(view_kwargs.items())), tuple((k, tuple(v)) for k, v in sorted(request.GET.lists())),
+                 request.headers.get('Accept', ''), usuario)
+
+        def calcular():
+            respuesta = view_func(request, *view_args, **view_kwargs)
+            if hasattr(respuesta, 'render'):
+                respuesta.render()
+            # Copia inmutable para las demás: la respuesta de la primera sigue su camino por los middlewares
+            return respuesta, (respuesta.status_code, list(respuesta.items()), respuesta.content)
+
+        (respuesta, copia), coalescida = coalescedor.compartir(clave, calcular, settings.COALESCENCIA_ESPERA)
+        registro.sumar('academia_coalescencia_total', (('ruta', ruta), ('resultado', 'coalescida' if coalescida else 'ejecutada')))
+        if not coalescida:
+            return respuesta
+        estado, cabeceras, contenido = copia
+        respuesta = HttpResponse(contenido, status=estado)
+        for nombre, valor in cabeceras:
+            respuesta[nombre] = valor
+        respuesta['X-Coalescida'] = 'true'
+        return respuesta
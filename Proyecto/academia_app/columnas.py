@@ -0,0 +1,98 @@
+from django.db import models
+from django.db.models import Value
+from drf_yasg import openapi
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Formato columnar para listados grandes (clientes de analítica): GET /<recurso>/?format=columns o
+# Accept: application/vnd.academia.columns+json. En vez de una lista de objetos que repite las claves en cada
+# fila, devuelve una lista por campo:
+#   {"filas": 2, "columnas": ["id", "estudiante", "fecha_matricula", ...],
+#    "datos": {"id": [1, 2], "estudiante": [5, 5], "fecha_matricula": [0, 0], ...},
+#    "diccionarios": {"fecha_matricula": ["2025-01-10"]}}
+# Una columna que aparece en "diccionarios" lleva en "datos" la posición de cada valor en su diccionario
+# (null sigue siendo null). Se codifican así las columnas que no son enteros y repiten valores (fechas, notas).
+# Se lee con values_list(), sin instancias ni un dict por fila; cada valor distinto se convierte una sola vez
+# con el campo del serializer, así el resultado es el mismo que el del listado normal.
+
+parametro_format = openapi.Parameter(
+    'format',
+    openapi.IN_QUERY,
+    description="columns: una lista por campo con los valores repetidos en diccionarios, mucho más pequeña "
+                "en listados grandes (también con Accept: application/vnd.academia.columns+json)",
+    type=openapi.TYPE_STRING,
+    required=False
+)
+
+_ENTEROS = (models.AutoField, models.BigAutoField, models.IntegerField, models.BigIntegerField,
+            models.SmallIntegerField, models.PositiveIntegerField, models.BooleanField)
+
+
+class ColumnasRenderer(JSONRenderer):
+    media_type = 'application/vnd.academia.columns+json'
+    format = 'columns'
+
+
+def _campos(modelo, serializer):
+    """(nombre, campo del modelo, convertir o None) de cada campo que devuelve el serializer."""
+    campos = []
+    for nombre, campo in serializer.fields.items():
+        if campo.write_only:
+            continue
+        campo_modelo = modelo._meta.get_field(campo.source)
+        if campo_modelo.is_relation or isinstance(campo_modelo, _ENTEROS):
+            campos.append((nombre, campo_modelo, None))  # el id o el entero tal cual
+        else:
+            campos.append((nombre, campo_modelo, campo.to_representation))
+    return campos
+
+
+def _columna(valores, convertir):
+    """(datos, diccionario o None) de una columna."""
+    if convertir is None:
+        return list(valores), None
+    posiciones = {}
+    codigos = [None if valor is None else posiciones.setdefault(valor, len(posiciones)) for valor in valores]
+    if len(posiciones) * 2 <= len(codigos):
+        return codigos, [convertir(valor) for valor in posiciones]
+    return [None if valor is None else convertir(valor) for valor in valores], None
+
+
+def _leer(queryset, campos):
+    # Un campo que no tiene este modelo (p. ej. seq en las archivadas) sale como null
+    existentes = {campo.attname for campo in queryset.model._meta.concrete_fields}
+    return queryset.values_list(*(
+        campo.attname if campo.attname in existentes else Value(None, output_field=campo) for _, campo, _ in campos
+    ))
+
+
+def columnas(querysets, serializer):
+    """Representación columnar de las filas de `querysets` (uno o varios, seguidos) con los campos del serializer."""
+    campos = _campos(querysets[0].model, serializer)
+    filas = [fila for queryset in querysets for fila in _leer(queryset, campos)]
+    datos, diccionarios = {}, {}
+    for (nombre, _, convertir), valores in zip(campos, zip(*filas) if filas else [()] * len(campos)):
+        datos[nombre], diccionario = _columna(valores, convertir)
+        if diccionario is not None:
+            diccionarios[nombre] = diccionario
+    return {
+        "filas": len(filas),
+        "columnas": [nombre for nombre, _, _ in campos],
+        "datos": datos,
+        "diccionarios": diccionarios,
+    }
+
+
+class ColumnasMixin:
+    """Añade el formato ?format=columns al listado de un ModelViewSet."""
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnasRenderer]
+
+    def en_columnas(self, request):
+        return getattr(request, 'accepted_renderer', None) is not None and request.accepted_renderer.format == 'columns'
+
+    def list(self, request, *args, **kwargs):
+        if not self.en_columnas(request):
+            return super().list(request, *args, **kwargs)
+        return Response(columnas([self.filter_queryset(self.get_queryset())], self.get_serializer()))
@@ -0,0 +1,163 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections, router, transaction
+from django.db.models import Count, F
+from django.utils.functional import cached_property
+from drf_yasg import openapi
+
+from .filtros import condiciones_filtro
+from .models import Contador, Curso, Estudiante, Matricula
+
+# Totales de filas sin COUNT(*): la tabla Contador guarda el total de cada modelo y el de sus particiones
+# frecuentes (matrículas por curso y por estudiante, cursos activos/inactivos).
+#  - Las señales ajustan los contadores dentro de la transacción de cada save/delete; las rutas masivas
+#    (importación, archivo, datos de prueba) los ajustan a mano con deltas_creacion().
+#  - reconciliar() los compara con un COUNT real y los corrige (comando reconciliar_contadores).
+#  - Un listado con filtros o búsqueda que no corresponden a un contador usa contar_aproximado().
+
+# modelo -> campos (attname) por los que se lleva un contador por valor
+PARTICIONES = {
+    Estudiante: (),
+    Curso: ('activo',),
+    Matricula: ('curso_id', 'estudiante_id'),
+}
+
+
+def clave(modelo, attname=None, valor=None):
+    if attname is None:
+        return modelo._meta.model_name
+    return f"{modelo._meta.model_name}:{attname}:{valor}"
+
+
+def deltas_creacion(modelo, filas, signo=1):
+    """Deltas de crear (signo=1) o borrar (signo=-1) las filas dadas; cada fila es un objeto o un dict de attnames."""
+    deltas = Counter()
+    for fila in filas:
+        deltas[clave(modelo)] += signo
+        for attname in PARTICIONES[modelo]:
+            valor = fila[attname] if isinstance(fila, dict) else getattr(fila, attname)
+            deltas[clave(modelo, attname, valor)] += signo
+    return deltas
+
+
+def ajustar(deltas, using=None):
+    """Suma los deltas {clave: n} a los contadores. Una UPDATE por cada valor de delta distinto."""
+    deltas = {c: d for c, d in deltas.items() if d}
+    if not deltas:
+        return
+    using = using or router.db_for_write(Contador)
+    contadores = Contador.objects.using(using)
+    por_delta = {}
+    for c, d in deltas.items():
+        por_delta.setdefault(d, []).append(c)
+    with transaction.atomic(using=using):
+        contadores.bulk_create([Contador(clave=c) for c in deltas], ignore_conflicts=True, batch_size=500)
+        for delta, claves in por_delta.items():
+            for i in range(0, len(claves), 500):
+                contadores.filter(clave__in=claves[i:i + 500]).update(valor=F('valor') + delta)
+
+
+def valor(clave_contador, using=None):
+    """Valor del contador, o 0 si nunca se ha creado (ninguna fila con esa clave)."""
+    return Contador.objects.using(using).filter(clave=clave_contador).values_list('valor', flat=True).first() or 0
+
+
+def contar_aproximado(queryset, limite=None):
+    """
+    (total, exacto) de un queryset arbitrario sin recorrer toda la tabla: cuenta como mucho `limite` filas.
+    En PostgreSQL, si la estimación del planificador supera el límite, se devuelve la estimación.
+    """
+    limite = limite or settings.CONTADORES_LIMITE_EXACTO
+    queryset = queryset.order_by()
+    conexion = connections[queryset.db]
+    if conexion.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with conexion.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            estimado = cursor.fetchone()[0][0]['Plan']['Plan Rows']
+        if estimado > limite:
+            return int(estimado), False
+    contadas = queryset[:limite + 1].count()
+    if contadas > limite:
+        return limite, False
+    return contadas, True
+
+
+def _reales(using):
+    reales = {}
+    for modelo, particiones in PARTICIONES.items():
+        objetos = modelo.objects.using(using)
+        reales[clave(modelo)] = objetos.count()
+        for attname in particiones:
+            for valor_, n in objetos.order_by().values_list(attname).annotate(n=Count('pk')):
+                reales[clave(modelo, attname, valor_)] = n
+    return reales
+
+
+def reconciliar(corregir=True, using=None):
+    """Compara los contadores con COUNT reales. Devuelve [(clave, guardado, real)] de los que no cuadraban."""
+    using = using or router.db_for_write(Contador)
+    with transaction.atomic(using=using):
+        reales = _reales(using)
+        guardados = dict(Contador.objects.using(using).values_list('clave', 'valor'))
+        diferencias = [
+            (c, guardados.get(c, 0), reales.get(c, 0))
+            for c in sorted(reales.keys() | guardados.keys())
+            if guardados.get(c, 0) != reales.get(c, 0)
+        ]
+        if corregir and diferencias:
+            ajustar({c: real - guardado for c, guardado, real in diferencias}, using=using)
+            # Particiones que ya no tienen filas (p. ej. un curso borrado): fuera de la tabla
+            Contador.objects.using(using).filter(valor=0).exclude(clave__in=[clave(m) for m in PARTICIONES]).delete()
+    return diferencias
+
+
+parametro_count = openapi.Parameter(
+    'count',
+    openapi.IN_QUERY,
+    description="Con true añade las cabeceras X-Total-Count y X-Total-Exacto. Sin filtros, o con un único filtro "
+                "de partición (curso, estudiante, activo), el total sale de los contadores; si no, es aproximado",
+    type=openapi.TYPE_BOOLEAN,
+    required=False
+)
+
+# Parámetros que no cambian qué filas entran en el total
+PARAMETROS_NEUTROS = {'count', 'ordering', 'format', '_profile'}
+
+
+class ConteoMixin:
+    """Añade ?count=true al listado de un ModelViewSet: total en cabeceras sin COUNT(*) sobre toda la tabla."""
+
+    def total(self, request):
+        """(total, exacto) de lo que devuelve el listado con los parámetros de la petición."""
+        modelo = self.get_queryset().model
+        usados = [p for p, v in request.query_params.items() if p not in PARAMETROS_NEUTROS and v != '']
+        if not usados:
+            return valor(clave(modelo)), True
+        condiciones = condiciones_filtro(request, self)
+        if len(usados) == 1 and len(condiciones) == 1:
+            (lookup, valor_), = condiciones.items()
+            if lookup in PARTICIONES[modelo]:
+                return valor(clave(modelo, lookup, valor_)), True
+        return contar_aproximado(self.filter_queryset(self.get_queryset()))
+
+    def list(self, request, *args, **kwargs):
+        respuesta = super().list(request, *args, **kwargs)
+        if request.query_params.get('count', '').lower() in ('true', '1'):
+            total, exacto = self.total(request)
+            respuesta['X-Total-Count'] = str(total)
+            respuesta['X-Total-Exacto'] = 'true' if exacto else 'false'
+        return respuesta
+
+
+class PaginadorEstimado(Paginator):
+    """Paginator sin COUNT(*) completo: sin filtros usa el contador del modelo y con filtros contar_aproximado()."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and queryset.model in PARTICIONES:
+            return valor(clave(queryset.model), using=queryset.db)
+        return contar_aproximado(queryset)[0]
@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .contadores import ajustar, deltas_creacion
+from .models import Curso, Estudiante, Matricula, reservar_seq
+
+# Generador de datos sintéticos para benchmarks y pruebas de carga.
+# Inserta con bulk_create por lotes (sin pasar por Matricula.clean) para poder sembrar millones de filas.
+
+TAMANO_LOTE = 10000
+
+NOMBRES = ['Lucía', 'Juan', 'María', 'Pedro', 'Ana', 'Miguel', 'Sofía', 'Diego', 'Laura', 'Javier']
+APELLIDOS = ['Gómez', 'Pérez', 'García', 'Torres', 'Ruiz', 'Herrera', 'Castro', 'Morales', 'Fernández', 'Núñez']
+MATERIAS = ['Matemáticas', 'Historia', 'Física', 'Programación', 'Química', 'Biología', 'Inglés', 'Arte']
+
+
+def _guardar(modelo, lote):
+    # bulk_create no pasa por save() ni por las señales: asignamos el bloque de secuencia
+    # y ajustamos los contadores a mano
+    primero = reservar_seq(len(lote)) - len(lote) + 1
+    for i, objeto in enumerate(lote):
+        objeto.seq = primero + i
+    creados = modelo.objects.bulk_create(lote)
+    ajustar(deltas_creacion(modelo, creados))
+    return creados
+
+
+def _en_lotes(objetos, modelo, tamano_lote):
+    lote = []
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) == tamano_lote:
+            _guardar(modelo, lote)
+            lote = []
+    if lote:
+        _guardar(modelo, lote)
+
+
+def sembrar(estudiantes=10000, cursos=200, matriculas=100000, anios=5, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Crea estudiantes, cursos repartidos en los últimos `anios` años (más algunos futuros)
+    y matrículas sin duplicados estudiante-curso. Devuelve un dict con lo creado.
+    """
+    if matriculas > estudiantes * cursos:
+        raise ValueError("No hay suficientes pares estudiante-curso para tantas matrículas.")
+    hoy = timezone.now().date()
+    prefijo = f"s{int(time.time())}"  # permite sembrar varias veces sin chocar con el email único
+
+    using = router.db_for_write(Estudiante)
+    with transaction.atomic(using=using):
+        primer_estudiante = (Estudiante.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        _en_lotes(
+            (
+                Estudiante(
+                    nombre=f"{NOMBRES[i % len(NOMBRES)]} {APELLIDOS[(i // len(NOMBRES)) % len(APELLIDOS)]} {i}",
+                    email=f"{prefijo}.{i}@academia.test",
+                )
+                for i in range(estudiantes)
+            ),
+            Estudiante, tamano_lote,
+        )
+        ids_estudiantes = list(
+            Estudiante.objects.filter(id__gte=primer_estudiante, email__startswith=f"{prefijo}.")
+            .order_by('id').values_list('id', flat=True)
+        )
+        if progreso:
+            progreso(f"{len(ids_estudiantes)} estudiantes")
+
+        # Tres de cada cuatro cursos son del pasado (los archivables), el resto empieza en el futuro
+        dias_pasado = max(anios, 1) * 365
+        nuevos_cursos = []
+        for i in range(cursos):
+            if i % 4 == 3:
+                inicio = hoy + timedelta(days=10 + i % 60)
+            else:
+                inicio = hoy - timedelta(days=(i * 37) % dias_pasado + 1)
+            nuevos_cursos.append(Curso(
+                titulo=f"{MATERIAS[i % len(MATERIAS)]} {i}",
+                descripcion=f"Curso sintético {i}",
+                fecha_inicio=inicio,
+                activo=i % 10 != 0,
+            ))
+        cursos_creados = _guardar(Curso, nuevos_cursos)
+        if progreso:
+            progreso(f"{len(cursos_creados)} cursos")
+
+    # Las matrículas van en transacciones por lote para no crecer el journal sin límite
+    n_cursos = len(cursos_creados)
+    generadas = (
+        Matricula(
+            estudiante_id=ids_estudiantes[(i // n_cursos) % len(ids_estudiantes)],
+            curso_id=cursos_creados[i % n_cursos].id,
+            calificacion=(i * 7) % 101 / 10 if i % 3 else None,
+        )
+        for i in range(matriculas)
+    )
+    creadas = 0
+    while creadas < matriculas:
+        with transaction.atomic(using=using):
+            lote = [m for _, m in zip(range(tamano_lote), generadas)]
+            _guardar(Matricula, lote)
+        creadas += len(lote)
+        if progreso:
+            progreso(f"{creadas} matrículas")
+
+    # auto_now_add pone la fecha de hoy; la dejamos coherente con el inicio de cada curso
+    with transaction.atomic(using=using):
+        for curso in cursos_creados:
+            fecha = min(curso.fecha_inicio - timedelta(days=7), hoy)
+            Matricula.objects.filter(curso=curso).update(fecha_matricula=fecha)
+
+    return {"estudiantes": len(ids_estudiantes), "cursos": n_cursos, "matriculas": creadas}
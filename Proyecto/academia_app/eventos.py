@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+
+from .academias import PorAcademia, alias_actual
+
+# Difusión en proceso de eventos de matrículas y cursos para el stream SSE (GET /api/eventos/).
+# Las señales de los modelos publican al confirmar la transacción; cada suscriptor SSE es una
+# asyncio.Queue en el bucle del servidor ASGI, así un suscriptor inactivo solo ocupa su cola.
+# El id de cada evento es el seq del cambio, que el navegador reenvía como Last-Event-ID al reconectar.
+# Cada academia tiene su difusor: los seq son de su base de datos y sus eventos no llegan a las demás.
+
+
+class Evento:
+    __slots__ = ('id', 'tipo', 'curso_id', 'datos')
+
+    def __init__(self, id, tipo, curso_id, datos):
+        self.id = id
+        self.tipo = tipo
+        self.curso_id = curso_id
+        self.datos = datos
+
+    def como_sse(self):
+        return f"id: {self.id}\nevent: {self.tipo}\ndata: {json.dumps(self.datos, default=str)}\n\n"
+
+
+class Suscripcion:
+    """Cola de un cliente SSE. Se llena desde cualquier hilo a través del bucle asyncio del cliente."""
+
+    def __init__(self, loop, curso_id=None, tamano_cola=None):
+        self.loop = loop
+        self.curso_id = curso_id
+        self.cola = asyncio.Queue(maxsize=tamano_cola or settings.EVENTOS_TAMANO_COLA)
+        self.desbordada = False  # el cliente no lee al ritmo de los eventos: se le pide resincronizar
+
+    def acepta(self, evento):
+        return self.curso_id is None or evento.curso_id == self.curso_id
+
+    def entregar(self, evento):
+        # Se ejecuta dentro del bucle del suscriptor
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.desbordada = True
+
+
+class Difusor:
+    """Publica eventos a todas las suscripciones y guarda los últimos para reanudar con Last-Event-ID."""
+
+    def __init__(self, historial=None):
+        self._lock = threading.Lock()
+        self._historial = deque(maxlen=historial or settings.EVENTOS_HISTORIAL)
+        self._descartado_hasta = 0  # id del último evento que ya no está en el historial
+        self._suscripciones = set()
+
+    def publicar(self, evento):
+        with self._lock:
+            if len(self._historial) == self._historial.maxlen:
+                self._descartado_hasta = self._historial[0].id
+            self._historial.append(evento)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            if suscripcion.acepta(evento):
+                try:
+                    suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+                except RuntimeError:
+                    self.cancelar(suscripcion)  # el bucle ya se cerró
+
+    def suscribir(self, curso_id=None, ultimo_id=None):
+        """
+        Registra una suscripción en el bucle actual. Devuelve (suscripcion, pendientes, completo):
+        los eventos posteriores a ultimo_id que siguen en el historial y si el historial alcanza
+        para no perder ninguno (si no, el cliente debe resincronizar con ?since=).
+        """
+        suscripcion = Suscripcion(asyncio.get_running_loop(), curso_id)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if ultimo_id is None:
+                return suscripcion, [], True
+            pendientes = [e for e in self._historial if e.id > ultimo_id and suscripcion.acepta(e)]
+            return suscripcion, pendientes, ultimo_id >= self._descartado_hasta
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    @property
+    def suscriptores(self):
+        return len(self._suscripciones)
+
+
+difusor = PorAcademia(Difusor)
+
+
+def publicar_al_confirmar(id, tipo, curso_id, datos, using=None):
+    """Publica el evento cuando se confirme la transacción actual (nunca eventos de cambios deshechos)."""
+    evento = Evento(id, tipo, curso_id, datos)
+    canal = difusor.para(using or alias_actual())
+    transaction.on_commit(lambda: canal.publicar(evento), using=using)
+
+
+def publicar_varios_al_confirmar(eventos, using=None):
+    """Como publicar_al_confirmar para una lista de Evento, con un único callback (p. ej. un lote de borrados)."""
+    canal = difusor.para(using or alias_actual())
+    transaction.on_commit(lambda: [canal.publicar(evento) for evento in eventos], using=using)
@@ -0,0 +1,88 @@
+from django.db.models import Avg, Count, Max, Min, Q
+from rest_framework.exceptions import ValidationError
+
+from .models import Matricula
+
+# Expediente de un estudiante en una sola petición: sus datos, sus matrículas con el curso y las
+# estadísticas. Con el estudiante ya cargado cuesta una consulta más (matrículas + cursos en un JOIN);
+# las estadísticas se calculan sobre esas filas. Cada sección admite elegir sus campos.
+
+SECCIONES = ('estudiante', 'matriculas', 'estadisticas')
+CAMPOS_ESTUDIANTE = ('id', 'nombre', 'email', 'fecha_registro', 'seq')
+CAMPOS_MATRICULA = ('id', 'fecha_matricula', 'calificacion', 'seq')
+CAMPOS_CURSO = ('id', 'titulo', 'descripcion', 'fecha_inicio', 'activo')
+
+
+def _lista(valor, permitidos, parametro):
+    """Valores separados por comas de un parámetro; todos si no viene."""
+    if not valor:
+        return list(permitidos)
+    elegidos = list(dict.fromkeys(v.strip() for v in valor.split(',') if v.strip()))
+    desconocidos = [v for v in elegidos if v not in permitidos]
+    if desconocidos:
+        raise ValidationError({parametro: [f"No válidos: {', '.join(desconocidos)}. Opciones: {', '.join(permitidos)}"]})
+    return elegidos
+
+
+def _calificacion(valor):
+    return f"{valor:.2f}" if valor is not None else None  # mismo formato que MatriculaSerializer ("8.50")
+
+
+def _estadisticas(calificaciones, total, activos):
+    return {
+        "total_cursos": total,
+        "cursos_activos": activos,
+        "calificadas": len(calificaciones),
+        "media_calificacion": round(float(sum(calificaciones) / len(calificaciones)), 2) if calificaciones else None,
+        "mejor_calificacion": _calificacion(max(calificaciones)) if calificaciones else None,
+        "peor_calificacion": _calificacion(min(calificaciones)) if calificaciones else None,
+    }
+
+
+def construir_expediente(estudiante, parametros):
+    """Expediente del estudiante según los parámetros secciones, campos_estudiante, campos_matricula y campos_curso."""
+    secciones = _lista(parametros.get('secciones'), SECCIONES, 'secciones')
+    expediente = {}
+
+    if 'estudiante' in secciones:
+        campos = _lista(parametros.get('campos_estudiante'), CAMPOS_ESTUDIANTE, 'campos_estudiante')
+        expediente['estudiante'] = {campo: getattr(estudiante, campo) for campo in campos}
+
+    if 'matriculas' in secciones:
+        campos_matricula = _lista(parametros.get('campos_matricula'), CAMPOS_MATRICULA, 'campos_matricula')
+        campos_curso = _lista(parametros.get('campos_curso'), CAMPOS_CURSO, 'campos_curso')
+        # Una consulta con solo las columnas necesarias; calificacion y activo siempre para las estadísticas
+        columnas = {*campos_matricula, 'calificacion', *(f'curso__{c}' for c in {*campos_curso, 'activo'})}
+        filas = list(
+            Matricula.objects.filter(estudiante_id=estudiante.pk)
+            .order_by('curso__fecha_inicio', 'id')
+            .values(*columnas)
+        )
+        matriculas = []
+        for fila in filas:
+            matricula = {campo: fila[campo] for campo in campos_matricula}
+            if 'calificacion' in matricula:
+                matricula['calificacion'] = _calificacion(matricula['calificacion'])
+            matricula['curso'] = {campo: fila[f'curso__{campo}'] for campo in campos_curso}
+            matriculas.append(matricula)
+        expediente['matriculas'] = matriculas
+        if 'estadisticas' in secciones:
+            calificaciones = [f['calificacion'] for f in filas if f['calificacion'] is not None]
+            expediente['estadisticas'] = _estadisticas(calificaciones, len(filas), sum(f['curso__activo'] for f in filas))
+
+    elif 'estadisticas' in secciones:
+        # Sin la lista de matrículas basta un agregado
+        datos = Matricula.objects.filter(estudiante_id=estudiante.pk).aggregate(
+            total=Count('id'), activos=Count('id', filter=Q(curso__activo=True)), calificadas=Count('calificacion'),
+            media=Avg('calificacion'), mejor=Max('calificacion'), peor=Min('calificacion'),
+        )
+        expediente['estadisticas'] = {
+            "total_cursos": datos['total'],
+            "cursos_activos": datos['activos'],
+            "calificadas": datos['calificadas'],
+            "media_calificacion": round(float(datos['media']), 2) if datos['media'] is not None else None,
+            "mejor_calificacion": _calificacion(datos['mejor']),
+            "peor_calificacion": _calificacion(datos['peor']),
+        }
+
+    return expediente
@@ -0,0 +1,70 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Filtros exactos y por rango de los listados. Cada vista declara los suyos en `campos_filtro`:
+#   {parámetro de la URL: (lookup del ORM, tipo)}
+# Se aplican como un único WHERE en SQL y un valor mal formado responde 400 en vez de ignorarse.
+# Las combinaciones documentadas tienen su índice en models.py (Meta.indexes).
+
+
+def _booleano(valor):
+    valor = valor.lower()
+    if valor in ('true', '1'):
+        return True
+    if valor in ('false', '0'):
+        return False
+    raise ValueError(valor)
+
+
+# Mayor entero que cabe en una columna INTEGER de SQLite (64 bits con signo); uno mayor hace fallar la consulta
+ENTERO_MAX = 2 ** 63 - 1
+
+
+def _entero(valor):
+    # Solo dígitos ASCII: isdigit() también acepta '²' o '٣', que int() rechaza o convierte
+    if not (valor.isascii() and valor.isdigit()) or int(valor) > ENTERO_MAX:
+        raise ValueError(valor)
+    return int(valor)
+
+
+def _decimal(valor):
+    numero = Decimal(valor)
+    if not numero.is_finite():
+        raise ValueError(valor)
+    return numero
+
+
+# tipo -> (conversión, mensaje de error)
+TIPOS = {
+    'booleano': (_booleano, "Debe ser true o false."),
+    'entero': (_entero, f"Debe ser un entero entre 0 y {ENTERO_MAX}. Ej: 5"),
+    'decimal': (_decimal, "Debe ser un número. Ej: 7.5"),
+    'fecha': (date.fromisoformat, "Debe ser una fecha AAAA-MM-DD. Ej: 2025-01-31"),
+}
+
+
+def condiciones_filtro(request, view):
+    """{lookup: valor convertido} de los filtros de la vista presentes en la petición; 400 si alguno no es válido."""
+    condiciones, errores = {}, {}
+    for parametro, (lookup, tipo) in getattr(view, 'campos_filtro', {}).items():
+        valor = request.query_params.get(parametro)
+        if valor is None or valor == '':
+            continue
+        convertir, mensaje = TIPOS[tipo]
+        try:
+            condiciones[lookup] = convertir(valor.strip())
+        except (ValueError, InvalidOperation):
+            errores[parametro] = [mensaje]
+    if errores:
+        raise ValidationError(errores)
+    return condiciones
+
+
+class FiltroCampos(BaseFilterBackend):
+    """Aplica los filtros de `campos_filtro` de la vista con los valores de la query string."""
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.filter(**condiciones_filtro(request, view))
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from drf_yasg import openapi
+
+from .models import ClaveIdempotencia
+
+# Cabecera Idempotency-Key en los POST de alta (IDEMPOTENCIA_RUTAS).
+# La primera petición con una clave se ejecuta normalmente y su respuesta se guarda IDEMPOTENCIA_TTL segundos;
+# los reintentos con la misma clave y el mismo cuerpo reciben esa respuesta sin llegar a la vista.
+# Si el reintento llega mientras la primera sigue en curso, espera a que termine en vez de ejecutarse otra vez.
+# Los 5xx no se guardan: un fallo transitorio (p. ej. "database is locked") se puede reintentar con la misma clave.
+# Las claves están en la tabla ClaveIdempotencia de la academia, compartida por todos los workers: la reserva es
+# un INSERT que solo gana una petición (restricción única). Si el proceso de la original muere sin responder,
+# la clave queda libre a los IDEMPOTENCIA_BLOQUEO segundos.
+
+CABECERA = 'Idempotency-Key'
+LONGITUD_MAXIMA = 255
+
+parametro_idempotency_key = openapi.Parameter(
+    CABECERA,
+    openapi.IN_HEADER,
+    description="Clave única por operación (p. ej. un UUID). Un reintento con la misma clave y el mismo cuerpo "
+                "devuelve la respuesta original con la cabecera Idempotent-Replayed: true",
+    type=openapi.TYPE_STRING,
+    required=False
+)
+
+
+SONDEO = 0.05  # segundos entre consultas de un reintento que espera a la petición original
+
+
+class AlmacenIdempotencia:
+
+    def __init__(self, ttl=None, bloqueo=None):
+        self.ttl = ttl
+        self.bloqueo = bloqueo
+        self.repetidas = 0
+        self.esperadas = 0
+
+    def _caducidad(self, segundos, ajuste):
+        return timezone.now() + timedelta(seconds=segundos if segundos is not None else ajuste)
+
+    def reservar(self, clave, huella):
+        """
+        ('ejecutar', None) si esta petición debe ejecutarse (y luego llamar a terminar),
+        ('repetir', (estado, content_type, cuerpo)) si ya hay una respuesta guardada, ('en_curso', None) si otra
+        la está ejecutando o ('distinta', None) si la clave se usó con otro cuerpo.
+        """
+        entrada = (ClaveIdempotencia.objects.filter(clave=clave)
+                   .values_list('huella', 'estado', 'content_type', 'cuerpo', 'caduca').first())
+        bloqueo = self._caducidad(self.bloqueo, settings.IDEMPOTENCIA_BLOQUEO)
+        if entrada is None:
+            try:
+                with transaction.atomic(using=router.db_for_write(ClaveIdempotencia)):
+                    ClaveIdempotencia.objects.create(clave=clave, huella=huella, caduca=bloqueo)
+            except IntegrityError:
+                return 'en_curso', None  # otra petición la ha reservado entre la consulta y el INSERT
+            return 'ejecutar', None
+        huella_guardada, estado, content_type, cuerpo, caduca = entrada
+        if caduca <= timezone.now():
+            # Respuesta caducada u original que murió: UPDATE condicional, si varios la reclaman solo gana uno
+            reclamada = ClaveIdempotencia.objects.filter(clave=clave, caduca=caduca).update(
+                huella=huella, estado=None, content_type='', cuerpo=b'', caduca=bloqueo)
+            return ('ejecutar', None) if reclamada else ('en_curso', None)
+        if huella_guardada != huella:
+            return 'distinta', None
+        if estado is None:
+            return 'en_curso', None
+        return 'repetir', (estado, content_type, bytes(cuerpo))
+
+    def terminar(self, clave, huella, respuesta=None):
+        """Guarda la respuesta (estado, content_type, cuerpo) o, si es None, libera la clave para un reintento."""
+        mia = ClaveIdempotencia.objects.filter(clave=clave, huella=huella, estado__isnull=True)
+        if respuesta is None:
+            mia.delete()
+            return
+        estado, content_type, cuerpo = respuesta
+        mia.update(estado=estado, content_type=content_type, cuerpo=cuerpo,
+                   caduca=self._caducidad(self.ttl, settings.IDEMPOTENCIA_TTL))
+        ClaveIdempotencia.objects.filter(caduca__lte=timezone.now()).delete()  # purga de las caducadas (índice)
+
+    def estadisticas(self):
+        return {
+            "repetidas": self.repetidas,
+            "esperadas": self.esperadas,
+            "claves": ClaveIdempotencia.objects.filter(estado__isnull=False).count(),
+            "en_curso": ClaveIdempotencia.objects.filter(estado__isnull=True).count(),
+        }
+
+
+almacen = AlmacenIdempotencia()
+
+
+def _error(mensaje, estado, **cabeceras):
+    respuesta = HttpResponse(json.dumps({"error": mensaje}, ensure_ascii=False), status=estado,
+                             content_type='application/json')
+    for nombre, valor in cabeceras.items():
+        respuesta[nombre] = valor
+    return respuesta
+
+
+def _repetir(entrada):
+    estado, content_type, cuerpo = entrada
+    respuesta = HttpResponse(cuerpo, status=estado, content_type=content_type)
+    respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
+
+class IdempotenciaMiddleware:
+    """
+    Aplica Idempotency-Key a los POST de las rutas de IDEMPOTENCIA_RUTAS (nombres de URL del router).
+    Va después de AuthenticationMiddleware: la clave es por usuario, así dos clientes no comparten respuestas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        clave = request.headers.get(CABECERA)
+        if clave is None or request.method != 'POST' or request.resolver_match.url_name not in settings.IDEMPOTENCIA_RUTAS:
+            return None
+        if not clave or len(clave) > LONGITUD_MAXIMA:
+            return _error(f"La cabecera {CABECERA} debe tener entre 1 y {LONGITUD_MAXIMA} caracteres.", 400)
+
+        usuario = request.user.pk if request.user.is_authenticated else None
+        # La tabla es de la academia actual: la clave solo distingue ruta y usuario
+        clave = hashlib.sha256(json.dumps([request.resolver_match.url_name, usuario, clave]).encode()).hexdigest()
+        huella = hashlib.sha256(request.body).hexdigest()
+        limite = time.monotonic() + settings.IDEMPOTENCIA_ESPERA
+        esperando = False
+        while True:
+            accion, dato = almacen.reservar(clave, huella)
+            if accion == 'ejecutar':
+                request._clave_idempotencia = (clave, huella)
+                return None  # la vista se ejecuta; __call__ guarda la respuesta
+            if accion == 'repetir':
+                almacen.repetidas += 1
+                return _repetir(dato)
+            if accion == 'distinta':
+                return _error(f"La {CABECERA} ya se usó con otro cuerpo de petición.", 422)
+            # Otra petición con la misma clave está en curso, quizá en otro worker: se consulta hasta que guarde
+            # su respuesta. Si no la guarda (5xx) la clave queda libre y la siguiente vuelta ejecuta esta petición
+            if not esperando:
+                almacen.esperadas += 1
+                esperando = True
+            if time.monotonic() >= limite:
+                return _error(f"Hay una petición con la misma {CABECERA} en curso.", 409, **{'Retry-After': '1'})
+            time.sleep(SONDEO)
+
+    def __call__(self, request):
+        try:
+            respuesta = self.get_response(request)
+        except BaseException:
+            reserva = getattr(request, '_clave_idempotencia', None)
+            if reserva is not None:
+                almacen.terminar(*reserva)
+            raise
+        reserva = getattr(request, '_clave_idempotencia', None)
+        if reserva is not None:
+            guardar = respuesta.status_code < 500 and not respuesta.streaming
+            almacen.terminar(*reserva, (respuesta.status_code, respuesta.get('Content-Type'), respuesta.content) if guardar else None)
+        return respuesta
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import router, transaction
+
+from .autocompletado import indice as autocompletado
+from .contadores import ajustar, clave
+from .models import Estudiante, reservar_seq
+
+# Importación masiva de estudiantes desde CSV o NDJSON (una fila JSON por línea).
+# El fichero se lee en streaming y se inserta por lotes, así la memoria no depende del tamaño del fichero.
+
+TAMANO_LOTE = 2000   # filas por INSERT; por debajo del límite de parámetros de SQLite
+MAX_ERRORES = 1000   # errores detallados que se guardan en el informe, el resto solo se cuentan
+
+FORMATOS = ('csv', 'ndjson')
+
+_MAX_NOMBRE = Estudiante._meta.get_field('nombre').max_length
+_MAX_EMAIL = Estudiante._meta.get_field('email').max_length
+
+
+def detectar_formato(nombre_fichero):
+    """Deduce el formato por la extensión del fichero. Por defecto CSV."""
+    nombre = (nombre_fichero or '').lower()
+    if nombre.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def _como_texto(fichero):
+    # Los ficheros subidos y los abiertos en modo 'rb' dan bytes; los envolvemos sin leerlos enteros
+    if isinstance(fichero, io.TextIOBase):
+        return fichero
+    return io.TextIOWrapper(fichero, encoding='utf-8-sig', newline='')
+
+
+def leer_filas(fichero, formato):
+    """
+    Generador de (linea, fila, error). Si la línea no se puede interpretar,
+    fila es None y error contiene el motivo.
+    """
+    texto = _como_texto(fichero)
+    if formato == 'csv':
+        lector = csv.DictReader(texto)
+        for fila in lector:
+            yield lector.line_num, fila, None
+    elif formato == 'ndjson':
+        for linea, contenido in enumerate(texto, start=1):
+            if not contenido.strip():
+                continue
+            try:
+                fila = json.loads(contenido)
+            except ValueError:
+                yield linea, None, "JSON inválido."
+                continue
+            if not isinstance(fila, dict):
+                yield linea, None, "Cada línea debe ser un objeto JSON."
+                continue
+            yield linea, fila, None
+    else:
+        raise ValueError(f"Formato no soportado: {formato}. Usa uno de {', '.join(FORMATOS)}.")
+
+
+def _validar_fila(fila):
+    # Devuelve (nombre, email) limpios o lanza ValidationError con el motivo
+    nombre = str(fila.get('nombre') or '').strip()
+    email = str(fila.get('email') or '').strip()
+    if not nombre:
+        raise ValidationError("El nombre es obligatorio.")
+    if len(nombre) > _MAX_NOMBRE:
+        raise ValidationError(f"El nombre supera los {_MAX_NOMBRE} caracteres.")
+    if len(email) > _MAX_EMAIL:
+        raise ValidationError(f"El email supera los {_MAX_EMAIL} caracteres.")
+    validate_email(email)
+    return nombre, email
+
+
+class CodificacionNoValida(ValueError):
+    """El fichero no es UTF-8. Los lotes anteriores al error quedan guardados; `informe` dice cuántos."""
+
+    def __init__(self, informe):
+        super().__init__("El fichero debe estar codificado en UTF-8.")
+        self.informe = informe
+
+
+class InformeImportacion:
+    """Resumen acumulado de la importación: contadores y errores por fila."""
+
+    def __init__(self):
+        self.procesadas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = []
+        self.errores_omitidos = 0
+
+    def anotar_error(self, linea, mensaje, email=None):
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"linea": linea, "email": email, "error": mensaje})
+        else:
+            self.errores_omitidos += 1
+
+    @property
+    def total_errores(self):
+        return len(self.errores) + self.errores_omitidos
+
+    def como_dict(self):
+        return {
+            "procesadas": self.procesadas,
+            "creados": self.creados,
+            "actualizados": self.actualizados,
+            "total_errores": self.total_errores,
+            "errores": self.errores,
+            "errores_omitidos": self.errores_omitidos,
+        }
+
+
+def _guardar_lote(lote, informe):
+    # lote: dict email -> (linea, nombre). Si un email se repite dentro del lote gana la última fila.
+    if not lote:
+        return
+    emails = list(lote)
+    with transaction.atomic(using=router.db_for_write(Estudiante)):
+        # Una sola consulta por el índice único de email para distinguir altas de actualizaciones
+        existentes = set(Estudiante.objects.filter(email__in=emails).values_list('email', flat=True))
+        # bulk_create no llama a save(): reservamos un bloque de secuencia para todo el lote
+        primero = reservar_seq(len(lote)) - len(lote) + 1
+        Estudiante.objects.bulk_create(
+            [
+                Estudiante(nombre=nombre, email=email, seq=primero + i)
+                for i, (email, (linea, nombre)) in enumerate(lote.items())
+            ],
+            batch_size=TAMANO_LOTE,
+            update_conflicts=True,
+            unique_fields=['email'],
+            update_fields=['nombre', 'seq'],
+        )
+        ajustar({clave(Estudiante): len(lote) - len(existentes)})
+        # bulk_create no envía señales: el autocompletado se reconstruye en la próxima búsqueda
+        transaction.on_commit(autocompletado.caducar, using=router.db_for_write(Estudiante))
+    informe.actualizados += len(existentes)
+    informe.creados += len(lote) - len(existentes)
+
+
+def importar_estudiantes(fichero, formato='csv', tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Importa estudiantes haciendo upsert por email (crea o actualiza el nombre).
+    progreso(informe) se llama tras guardar cada lote. Lanza CodificacionNoValida si el fichero no es UTF-8.
+    """
+    informe = InformeImportacion()
+    filas = leer_filas(fichero, formato)
+    while True:
+        try:
+            bloque = list(islice(filas, tamano_lote))
+        except UnicodeDecodeError:
+            raise CodificacionNoValida(informe) from None
+        if not bloque:
+            break
+        lote = {}
+        for linea, fila, error in bloque:
+            informe.procesadas += 1
+            if error:
+                informe.anotar_error(linea, error)
+                continue
+            try:
+                nombre, email = _validar_fila(fila)
+            except ValidationError as e:
+                informe.anotar_error(linea, e.messages[0], fila.get('email'))
+                continue
+            lote.pop(email, None)  # reinsertar para que el orden refleje la última aparición
+            lote[email] = (linea, nombre)
+        _guardar_lote(lote, informe)
+        if progreso:
+            progreso(informe)
+    return informe
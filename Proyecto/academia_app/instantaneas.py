@@ -0,0 +1,174 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteWrapper
+from django.utils import timezone
+
+from .academias import PorAcademia, alias_actual
+from .models import Curso, Estudiante, Matricula, MatriculaArchivada, SecuenciaCambios, seq_actual
+
+# Instantánea coherente de las tablas de la academia en un momento dado, para herramientas de reporting
+# sin conexión: un fichero SQLite comprimido con gzip con estudiantes, cursos, matrículas y matrículas
+# archivadas, y una tabla `instantanea` con el seq de cambios que refleja, la fecha y la academia.
+#  - En SQLite se copia la base de datos con la API de backup en línea por pasos de
+#    INSTANTANEAS_PAGINAS_POR_PASO páginas: entre paso y paso las escrituras siguen entrando. Si una escritura
+#    obliga a reiniciar la copia más de INSTANTANEAS_MAX_REINICIOS veces, se copia de una vez (las escrituras
+#    esperan solo lo que dura la copia de páginas). Quitar el resto de tablas y comprimir se hace sobre la copia.
+#  - Con otros motores se leen las tablas dentro de una transacción de solo lectura (REPEATABLE READ en
+#    PostgreSQL): una foto coherente que tampoco bloquea a los escritores.
+#  - Cada instantánea se guarda por su seq en INSTANTANEAS_DIR. Mientras no cambie nada el seq es el mismo
+#    y se sirve el fichero ya hecho; con If-None-Match el cliente ni siquiera lo vuelve a descargar.
+
+MODELOS = (Estudiante, Curso, Matricula, MatriculaArchivada)
+
+FILAS_POR_LOTE = 5000
+
+
+class _DemasiadosReinicios(Exception):
+    pass
+
+
+def _carpeta(alias):
+    base = Path(settings.INSTANTANEAS_DIR)
+    return base if alias == DEFAULT_DB_ALIAS else base / alias
+
+
+def ruta_instantanea(seq, alias=None):
+    return _carpeta(alias or alias_actual()) / f"instantanea_{seq}.sqlite3.gz"
+
+
+def _copiar_sqlite(conexion, destino):
+    """Backup en línea de la BD de `conexion` a `destino`. Devuelve el seq de la copia."""
+    conexion.ensure_connection()
+    origen = conexion.connection
+    anterior, reinicios = None, 0
+
+    def progreso(estado, restantes, total):
+        # Si otra conexión escribe entre dos pasos, SQLite vuelve a empezar: quedan más páginas que antes
+        nonlocal anterior, reinicios
+        if anterior is not None and restantes > anterior:
+            reinicios += 1
+            if reinicios > settings.INSTANTANEAS_MAX_REINICIOS:
+                raise _DemasiadosReinicios()
+        anterior = restantes
+
+    with closing(sqlite3.connect(destino)) as copia:
+        try:
+            origen.backup(copia, pages=settings.INSTANTANEAS_PAGINAS_POR_PASO, progress=progreso)
+        except _DemasiadosReinicios:
+            origen.backup(copia, pages=-1)
+        fila = copia.execute(f'SELECT valor FROM "{SecuenciaCambios._meta.db_table}" WHERE id = 1').fetchone()
+        conservar = {modelo._meta.db_table for modelo in MODELOS}
+        tablas = [nombre for (nombre,) in copia.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        copia.execute('PRAGMA foreign_keys = OFF')
+        for nombre in tablas:
+            if nombre not in conservar and not nombre.startswith('sqlite_'):
+                copia.execute(f'DROP TABLE "{nombre}"')
+        copia.commit()
+    return fila[0] if fila else 0
+
+
+def _copiar_por_orm(conexion, destino):
+    """Lee las tablas en una transacción de solo lectura y las escribe en un SQLite nuevo. Devuelve el seq."""
+    copia = SQLiteWrapper({**connections.settings[DEFAULT_DB_ALIAS], 'ENGINE': 'django.db.backends.sqlite3',
+                           'NAME': str(destino), 'OPTIONS': {}}, alias='instantanea')
+    try:
+        with copia.schema_editor(atomic=False) as editor:
+            for modelo in MODELOS:
+                editor.create_model(modelo)
+        with transaction.atomic(using=conexion.alias):
+            if conexion.vendor == 'postgresql':
+                with conexion.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            seq = seq_actual(using=conexion.alias)
+            copia.set_autocommit(False)  # todas las filas en una sola transacción de la copia
+            with copia.cursor() as cursor:
+                for modelo in MODELOS:
+                    campos = modelo._meta.concrete_fields
+                    insertar = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                        copia.ops.quote_name(modelo._meta.db_table),
+                        ', '.join(copia.ops.quote_name(campo.column) for campo in campos),
+                        ', '.join(['%s'] * len(campos)),
+                    )
+                    filas = modelo.objects.using(conexion.alias).order_by('pk').values_list(*(c.attname for c in campos))
+                    lote = []
+                    for fila in filas.iterator(chunk_size=FILAS_POR_LOTE):
+                        lote.append([campo.get_db_prep_value(valor, copia) for campo, valor in zip(campos, fila)])
+                        if len(lote) >= FILAS_POR_LOTE:
+                            cursor.executemany(insertar, lote)
+                            lote = []
+                    if lote:
+                        cursor.executemany(insertar, lote)
+            copia.commit()
+    finally:
+        copia.close()
+    return seq
+
+
+def _completar(destino, seq, alias):
+    """Tabla `instantanea` con los metadatos y VACUUM para no arrastrar las páginas de las tablas quitadas."""
+    with closing(sqlite3.connect(destino)) as copia:
+        copia.execute('CREATE TABLE instantanea (seq INTEGER NOT NULL, creada TEXT NOT NULL, academia TEXT NOT NULL)')
+        copia.execute('INSERT INTO instantanea VALUES (?, ?, ?)', (seq, timezone.now().isoformat(), alias))
+        copia.commit()
+        copia.execute('VACUUM')
+
+
+def _purgar(carpeta):
+    instantaneas = sorted(carpeta.glob('instantanea_*.sqlite3.gz'), key=os.path.getmtime, reverse=True)
+    for ruta in instantaneas[settings.INSTANTANEAS_CONSERVAR:]:
+        ruta.unlink(missing_ok=True)
+
+
+def crear_instantanea():
+    """Crea la instantánea de la academia actual y devuelve (seq, ruta del .sqlite3.gz)."""
+    alias = router.db_for_read(Estudiante)
+    conexion = connections[alias]
+    carpeta = _carpeta(alias)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    temporal = carpeta / f"copia_{os.getpid()}_{threading.get_ident()}.sqlite3"
+    temporal.unlink(missing_ok=True)
+    try:
+        # Dentro de una transacción ya abierta la API de backup no puede leer de esa conexión (SQLITE_BUSY);
+        # ahí se copia con el ORM, que dentro de la transacción también ve un único instante
+        if conexion.vendor == 'sqlite' and not conexion.in_atomic_block:
+            seq = _copiar_sqlite(conexion, temporal)
+        else:
+            seq = _copiar_por_orm(conexion, temporal)
+        _completar(temporal, seq, alias)
+        ruta = ruta_instantanea(seq, alias)
+        comprimido = temporal.with_suffix('.gz.tmp')
+        with open(temporal, 'rb') as origen, gzip.open(comprimido, 'wb', compresslevel=6) as salida:
+            shutil.copyfileobj(origen, salida, 1024 * 1024)
+        os.replace(comprimido, ruta)
+    finally:
+        temporal.unlink(missing_ok=True)
+    _purgar(carpeta)
+    return seq, ruta
+
+
+_construyendo = PorAcademia(threading.Lock)
+
+
+def instantanea_actual():
+    """
+    (seq, ruta) de una instantánea con todos los cambios confirmados hasta ahora. Si ya existe la del seq
+    actual se reutiliza; si no, se crea (una sola a la vez por academia en cada proceso).
+    """
+    seq = seq_actual()
+    ruta = ruta_instantanea(seq)
+    if ruta.exists():
+        return seq, ruta
+    with _construyendo.actual():
+        seq = seq_actual()
+        ruta = ruta_instantanea(seq)
+        if ruta.exists():
+            return seq, ruta
+        return crear_instantanea()
@@ -0,0 +1,77 @@
+from django.conf import settings
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .filtros import ENTERO_MAX
+
+# Lectura por lotes: varios registros por id en una sola consulta IN.
+#  - GET /<recurso>/?ids=3,1,2
+#  - POST /<recurso>/batch_get/ con {"ids": [3, 1, 2]} (para listas largas que no caben en la URL)
+# Devuelve {"resultados": [...], "no_encontrados": [...]} en el orden pedido y sin repetidos.
+
+parametro_ids = openapi.Parameter(
+    'ids',
+    openapi.IN_QUERY,
+    description="Ids separados por comas; devuelve esos registros en el orden pedido y los ids que no existen. "
+                "Máximo LOTE_MAX_IDS. Ej: 3,1,2",
+    type=openapi.TYPE_STRING,
+    required=False
+)
+
+respuesta_lote = openapi.Response(
+    description="Registros encontrados en el orden pedido y los ids que no existen",
+    examples={"application/json": {"resultados": [{"id": 3}, {"id": 1}], "no_encontrados": [2]}}
+)
+
+
+def _validar_ids(valores, campo):
+    ids = []
+    for valor in valores:
+        texto = str(valor).strip()
+        # Enteros de 1 a ENTERO_MAX: uno mayor no cabe en la columna y el IN fallaría con un 500
+        if not (texto.isascii() and texto.isdigit()) or not 0 < int(texto) <= ENTERO_MAX:
+            raise ValidationError({campo: [f"Id no válido: {valor!r}. Deben ser enteros entre 1 y {ENTERO_MAX}."]})
+        ids.append(int(texto))
+    ids = list(dict.fromkeys(ids))  # sin repetidos, en el orden pedido
+    if not ids:
+        raise ValidationError({campo: ["Indica al menos un id."]})
+    if len(ids) > settings.LOTE_MAX_IDS:
+        raise ValidationError({campo: [f"Como máximo {settings.LOTE_MAX_IDS} ids por petición."]})
+    return ids
+
+
+class LoteMixin:
+    """Añade ?ids= al listado y la acción POST batch_get/ a un ModelViewSet."""
+
+    def _respuesta_lote(self, ids):
+        encontrados = self.get_queryset().in_bulk(ids)
+        return Response({
+            "resultados": self.get_serializer([encontrados[i] for i in ids if i in encontrados], many=True).data,
+            "no_encontrados": [i for i in ids if i not in encontrados],
+        })
+
+    def list(self, request, *args, **kwargs):
+        ids = request.query_params.get('ids')
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        return self._respuesta_lote(_validar_ids(ids.split(','), 'ids'))
+
+    @swagger_auto_schema(
+        operation_description="Obtiene varios registros por id en una sola consulta, en el orden pedido",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['ids'],
+            properties={'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER))},
+            example={"ids": [3, 1, 2]}
+        ),
+        responses={200: respuesta_lote, 400: "Ids no válidos o demasiados"}
+    )
+    @action(detail=False, methods=['post'], url_path='batch_get')
+    def batch_get(self, request):
+        ids = request.data.get('ids') if hasattr(request.data, 'get') else None
+        if not isinstance(ids, list):
+            raise ValidationError({"ids": ["Debe ser una lista de ids."]})
+        return self._respuesta_lote(_validar_ids(ids, 'ids'))
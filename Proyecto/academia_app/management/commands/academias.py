@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from academia_app import contadores
+from academia_app.academias import alias_de, aliases, con_academia
+from academia_app.models import Curso, Estudiante, Matricula
+
+
+class Command(BaseCommand):
+    help = (
+        "Operaciones sobre todas las academias (cada una con su base de datos): "
+        "migrar, estadisticas (totales por academia y globales) o ejecutar un comando en cada una."
+    )
+
+    def add_arguments(self, parser):
+        acciones = parser.add_subparsers(dest='accion', required=True)
+        migrar = acciones.add_parser('migrar', help="Aplica las migraciones en todas las bases de datos")
+        estadisticas = acciones.add_parser('estadisticas', help="Totales por academia y de todas")
+        estadisticas.add_argument('--json', action='store_true')
+        ejecutar = acciones.add_parser('ejecutar', help="Ejecuta un comando de gestión en cada academia")
+        ejecutar.add_argument('comando', nargs=argparse.REMAINDER, help="Comando y sus argumentos")
+        for accion in (migrar, estadisticas, ejecutar):
+            accion.add_argument('--academia', action='append',
+                                help="Solo esta academia ('default' para la principal); se puede repetir")
+
+    def handle(self, *args, **options):
+        seleccion = self._seleccion(options['academia'])
+        getattr(self, f"accion_{options['accion']}")(seleccion, options)
+
+    def _seleccion(self, nombres):
+        if not nombres:
+            return aliases()
+        elegidos = []
+        for nombre in nombres:
+            alias = DEFAULT_DB_ALIAS if nombre == DEFAULT_DB_ALIAS else alias_de(nombre)
+            if alias not in aliases():
+                raise CommandError(f"Academia desconocida: {nombre}")
+            elegidos.append(alias)
+        return elegidos
+
+    def accion_migrar(self, seleccion, options):
+        """Aplica las migraciones en cada base de datos (en las academias solo las tablas de academia_app)."""
+        for alias in seleccion:
+            Path(connections[alias].settings_dict['NAME']).parent.mkdir(parents=True, exist_ok=True)
+            self.stdout.write(f"== {alias}")
+            with con_academia(alias):
+                call_command('migrate', database=alias, interactive=False,
+                             verbosity=options['verbosity'], stdout=self.stdout, stderr=self.stderr)
+
+    def accion_ejecutar(self, seleccion, options):
+        """Ejecuta un comando de gestión una vez por academia, p. ej. `academias ejecutar reconciliar_contadores`."""
+        if not options['comando']:
+            raise CommandError("Indica el comando a ejecutar.")
+        nombre, *argumentos = options['comando']
+        for alias in seleccion:
+            self.stdout.write(f"== {alias}")
+            # También en el entorno: los procesos hijos del comando (p. ej. procesar_reportes) heredan la academia
+            anterior = os.environ.get('ACADEMIA')
+            os.environ['ACADEMIA'] = alias.removeprefix('academia_') if alias != DEFAULT_DB_ALIAS else ''
+            try:
+                with con_academia(alias):
+                    call_command(nombre, *argumentos, stdout=self.stdout, stderr=self.stderr)
+            finally:
+                if anterior is None:
+                    os.environ.pop('ACADEMIA', None)
+                else:
+                    os.environ['ACADEMIA'] = anterior
+
+    def accion_estadisticas(self, seleccion, options):
+        """Totales de cada academia leídos de sus contadores de filas (sin COUNT) y el total de todas."""
+        filas = {}
+        for alias in seleccion:
+            ruta = Path(connections[alias].settings_dict['NAME'])
+            filas[alias] = {
+                "estudiantes": contadores.valor(contadores.clave(Estudiante), using=alias),
+                "cursos": contadores.valor(contadores.clave(Curso), using=alias),
+                "cursos_activos": contadores.valor(contadores.clave(Curso, 'activo', True), using=alias),
+                "matriculas": contadores.valor(contadores.clave(Matricula), using=alias),
+                "bytes": ruta.stat().st_size if ruta.is_file() else 0,
+            }
+        total = {campo: sum(fila[campo] for fila in filas.values()) for campo in next(iter(filas.values()))}
+        if options['json']:
+            self.stdout.write(json.dumps({"academias": filas, "total": total}, indent=2))
+            return
+        campos = list(total)
+        self.stdout.write(f"{'academia':<24}" + ''.join(f"{campo:>16}" for campo in campos))
+        for alias, fila in [*filas.items(), ('TOTAL', total)]:
+            self.stdout.write(f"{alias:<24}" + ''.join(f"{fila[campo]:>16}" for campo in campos))
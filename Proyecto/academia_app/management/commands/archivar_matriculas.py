@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from academia_app.archivo import TAMANO_LOTE, archivar_matriculas
+
+
+class Command(BaseCommand):
+    help = "Mueve las matrículas de cursos terminados o inactivos a la tabla de archivo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Matrículas movidas por transacción")
+
+    def handle(self, *args, **options):
+        total = archivar_matriculas(
+            tamano_lote=options['lote'],
+            progreso=lambda movidas: self.stdout.write(f"{movidas} matrículas archivadas"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archivo terminado: {total} matrículas movidas"))
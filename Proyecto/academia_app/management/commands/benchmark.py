@@ -0,0 +1,206 @@
+import statistics
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.test import APIRequestFactory
+
+from academia_app.archivo import archivar_matriculas
+from academia_app.autocompletado import IndiceAutocompletado
+from academia_app.models import Curso, Estudiante, Matricula, MatriculaArchivada
+from academia_app.serializers import MatriculaSerializer
+from academia_app.views import CursoViewSet, MatriculaViewSet
+
+
+def _medir(funcion, repeticiones):
+    # Devuelve la mediana en milisegundos; la primera ejecución calienta cachés y no cuenta
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def _vista(viewset, accion, ruta, **kwargs):
+    # Llama a la vista directamente (sin middleware) y renderiza, como haría la respuesta real
+    vista = viewset.as_view({'get': accion})
+    peticion = APIRequestFactory().get(ruta)
+
+    def ejecutar():
+        respuesta = vista(peticion, **kwargs)
+        respuesta.render()
+        return respuesta
+    return ejecutar
+
+
+def _admin(model_admin, vista, ruta):
+    # Vista del admin con un superusuario en memoria (sin login ni sesión)
+    peticion = RequestFactory().get(ruta)
+    peticion.user = get_user_model()(username='benchmark', is_staff=True, is_superuser=True, is_active=True)
+
+    def ejecutar():
+        respuesta = getattr(model_admin, vista)(peticion)
+        respuesta.render()
+        return respuesta
+    return ejecutar
+
+
+class _MatriculaSerializerCompleto(MatriculaSerializer):
+    # Validación de antes: el UniqueTogetherValidator de DRF además de las reglas del modelo
+    class Meta(MatriculaSerializer.Meta):
+        validators = None
+
+
+def _consultas(funcion):
+    # Con un contador propio: CaptureQueriesContext deja de contar cuando el registro de consultas llega a su límite
+    ejecutadas = 0
+
+    def contar(execute, sql, params, many, context):
+        nonlocal ejecutadas
+        ejecutadas += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(contar):
+        funcion()
+    return ejecutadas
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks sobre la base de datos configurada. Siembra antes los datos con "
+        "`python manage.py sembrar_datos` (por ejemplo --matriculas 5000000)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('escenario', choices=['archivo', 'admin', 'calificar', 'autocompletado'])
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--matriculas', type=int, default=2000, help="Matrículas a calificar (escenario calificar)")
+
+    def handle(self, *args, **options):
+        getattr(self, f"escenario_{options['escenario']}")(options)
+
+    def escenario_archivo(self, options):
+        """Latencia de listados sobre la tabla caliente antes y después de archivar."""
+        curso = Curso.objects.filter(activo=True).order_by('-fecha_inicio').first()
+        estudiante = Estudiante.objects.order_by('id').first()
+        if curso is None or estudiante is None:
+            raise CommandError("No hay datos. Ejecuta antes `python manage.py sembrar_datos`.")
+
+        consultas = {
+            # Primera página del listado por defecto (-fecha_matricula)
+            "pagina_listado": lambda: list(Matricula.objects.order_by('-fecha_matricula')[:50]),
+            "busqueda": _vista(MatriculaViewSet, 'list', f"/api/matriculas/?search={estudiante.email}"),
+            "estudiantes_curso": _vista(CursoViewSet, 'estudiantes', f"/api/cursos/{curso.id}/estudiantes/", pk=curso.id),
+        }
+
+        def medir_todo():
+            return {nombre: _medir(funcion, options['repeticiones']) for nombre, funcion in consultas.items()}
+
+        filas_antes = Matricula.objects.count()
+        antes = medir_todo()
+        inicio = time.perf_counter()
+        movidas = archivar_matriculas()
+        segundos_archivo = time.perf_counter() - inicio
+        despues = medir_todo()
+
+        self.stdout.write(f"Matrículas vigentes: {filas_antes} -> {Matricula.objects.count()} "
+                          f"(archivadas en total: {MatriculaArchivada.objects.count()})")
+        self.stdout.write(f"Archivadas {movidas} en {segundos_archivo:.1f}s")
+        self.stdout.write(f"{'consulta':<20}{'antes (ms)':>12}{'después (ms)':>14}")
+        for nombre in consultas:
+            self.stdout.write(f"{nombre:<20}{antes[nombre]:>12.2f}{despues[nombre]:>14.2f}")
+
+    def escenario_admin(self, options):
+        """Listado y alta de matrículas en el admin: ModelAdmin por defecto frente a MatriculaAdmin."""
+        estudiante = Estudiante.objects.order_by('id').first()
+        if estudiante is None:
+            raise CommandError("No hay datos. Ejecuta antes `python manage.py sembrar_datos`.")
+        por_defecto = admin.ModelAdmin(Matricula, admin.site)
+        optimizado = admin.site._registry[Matricula]
+        ruta = '/admin/academia_app/matricula/'
+        # vista, ruta con el ModelAdmin por defecto, ruta con MatriculaAdmin (el filtro por tramos solo existe en este)
+        pruebas = {
+            "listado": ('changelist_view', ruta, ruta),
+            "busqueda": ('changelist_view', f'{ruta}?q={estudiante.email}', f'{ruta}?q={estudiante.email}'),
+            "filtro": ('changelist_view', f'{ruta}?calificacion__isnull=True', f'{ruta}?tramo=sin'),
+            "alta": ('add_view', f'{ruta}add/', f'{ruta}add/'),
+        }
+
+        self.stdout.write(f"Matrículas: {Matricula.objects.count()}, estudiantes: {Estudiante.objects.count()}")
+        self.stdout.write(f"{'vista':<12}{'defecto (ms)':>14}{'consultas':>11}{'optimizado (ms)':>17}{'consultas':>11}")
+        for nombre, (vista, ruta_defecto, ruta_optimizado) in pruebas.items():
+            defecto = _admin(por_defecto, vista, ruta_defecto)
+            mejorado = _admin(optimizado, vista, ruta_optimizado)
+            self.stdout.write(
+                f"{nombre:<12}{_medir(defecto, options['repeticiones']):>14.1f}{_consultas(defecto):>11}"
+                f"{_medir(mejorado, options['repeticiones']):>17.1f}{_consultas(mejorado):>11}"
+            )
+
+    def escenario_calificar(self, options):
+        """PATCH de la calificación: todas las reglas de Matricula.clean() frente a solo las de los campos cambiados."""
+        n = options['matriculas']
+        vista = MatriculaViewSet.as_view({'patch': 'partial_update'})
+        todas = [regla for _, regla in Matricula.REGLAS]
+        with transaction.atomic():
+            # Datos propios que se deshacen al terminar; el curso aún no ha empezado para que la validación
+            # completa también acepte las notas
+            curso = Curso.objects.create(titulo='Benchmark calificar', descripcion='-',
+                                         fecha_inicio=date.today() + timedelta(days=30))
+            estudiantes = Estudiante.objects.bulk_create(
+                [Estudiante(nombre=f'Calificar {i}', email=f'calificar{i}@benchmark.invalid') for i in range(n)]
+            )
+            ids = [m.pk for m in Matricula.objects.bulk_create([Matricula(estudiante=e, curso=curso) for e in estudiantes])]
+
+            def calificar(nota, ids=ids):
+                def ejecutar():
+                    for id_ in ids:
+                        respuesta = vista(APIRequestFactory().patch(f'/api/matriculas/{id_}/', {'calificacion': nota},
+                                                                    format='json'), pk=id_)
+                        if respuesta.status_code != 200:
+                            raise CommandError(f"PATCH {id_}: {respuesta.status_code} {respuesta.data}")
+                return ejecutar
+
+            resultados = {}
+            with mock.patch.object(Matricula, 'reglas_afectadas', lambda matricula: todas), \
+                    mock.patch.object(MatriculaViewSet, 'serializer_class', _MatriculaSerializerCompleto):
+                resultados['todas las reglas'] = (_medir(calificar('6.00'), options['repeticiones']),
+                                                  _consultas(calificar('6.50', ids[:1])))
+            resultados['campos cambiados'] = (_medir(calificar('7.00'), options['repeticiones']),
+                                              _consultas(calificar('7.50', ids[:1])))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"PATCH de calificación sobre {n} matrículas")
+        self.stdout.write(f"{'validación':<20}{'PATCH/s':>10}{'ms/PATCH':>10}{'consultas/PATCH':>17}")
+        for nombre, (ms, consultas) in resultados.items():
+            self.stdout.write(f"{nombre:<20}{n / ms * 1000:>10.0f}{ms / n:>10.3f}{consultas:>17}")
+
+    def escenario_autocompletado(self, options):
+        """Construcción, memoria y latencia de búsqueda del índice de autocompletado con los datos actuales."""
+        estudiante = Estudiante.objects.order_by('id').first()
+        if estudiante is None:
+            raise CommandError("No hay datos. Ejecuta antes `python manage.py sembrar_datos`.")
+        indice = IndiceAutocompletado(reconstruir=float('inf'))
+        indice.construir()
+        estadisticas = indice.estadisticas()
+        self.stdout.write(f"Entradas: {estadisticas['entradas']}, palabras: {estadisticas['palabras']}, "
+                          f"{estadisticas['bytes'] / 1024 / 1024:.1f} MB, construido en {estadisticas['ultima_construccion_ms']} ms")
+        nombre = estudiante.nombre.split()
+        consultas = {
+            "una letra": nombre[0][:1],
+            "prefijo": nombre[0][:3],
+            "nombre completo": estudiante.nombre,
+            "dos palabras": ' '.join(palabra[:2] for palabra in nombre[:2]),
+            "email": estudiante.email[:6],
+        }
+        busquedas = 1000
+        self.stdout.write(f"{'consulta':<18}{'µs/búsqueda':>13}{'resultados':>12}")
+        for nombre_consulta, consulta in consultas.items():
+            ms = _medir(lambda: [indice.buscar(consulta) for _ in range(busquedas)], options['repeticiones'])
+            self.stdout.write(f"{nombre_consulta:<18}{ms * 1000 / busquedas:>13.1f}{len(indice.buscar(consulta)):>12}")
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from academia_app.webhooks import despachar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Entrega a WEBHOOK_URLS los eventos pendientes de la bandeja de salida, con reintentos y backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help="Sigue ejecutándose y revisa la bandeja periódicamente")
+        parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos de espera cuando no hay pendientes")
+        parser.add_argument('--lote', type=int, default=settings.WEBHOOK_LOTE)
+        parser.add_argument('--hilos', type=int, default=settings.WEBHOOK_HILOS)
+
+    def handle(self, *args, **options):
+        while True:
+            entregados, fallidos = despachar_pendientes(lote=options['lote'], hilos=options['hilos'])
+            if entregados or fallidos:
+                self.stdout.write(f"{entregados} eventos entregados, {fallidos} fallidos")
+            if not options['continuo']:
+                if not (entregados or fallidos):
+                    self.stdout.write("No hay eventos pendientes")
+                return
+            if not (entregados or fallidos):
+                time.sleep(options['intervalo'])
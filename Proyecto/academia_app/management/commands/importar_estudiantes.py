@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academia_app.importacion import FORMATOS, TAMANO_LOTE, CodificacionNoValida, detectar_formato, importar_estudiantes
+
+
+class Command(BaseCommand):
+    help = "Importa estudiantes desde un fichero CSV o NDJSON haciendo upsert por email."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help="Ruta del fichero (.csv, .ndjson o .jsonl)")
+        parser.add_argument('--formato', choices=FORMATOS, help="Formato del fichero. Por defecto se deduce de la extensión")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por lote de inserción")
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or detectar_formato(options['ruta'])
+        inicio = time.monotonic()
+
+        def progreso(informe):
+            segundos = time.monotonic() - inicio
+            self.stdout.write(
+                f"{informe.procesadas} filas procesadas "
+                f"({informe.procesadas / segundos if segundos else 0:.0f} filas/s), "
+                f"{informe.total_errores} errores"
+            )
+
+        try:
+            with open(options['ruta'], 'rb') as fichero:
+                informe = importar_estudiantes(fichero, formato, tamano_lote=options['lote'], progreso=progreso)
+        except OSError as e:
+            raise CommandError(f"No se puede leer el fichero: {e}")
+        except CodificacionNoValida as e:
+            raise CommandError(f"{e} Se han importado {e.informe.procesadas} filas antes del error.")
+
+        for error in informe.errores:
+            self.stderr.write(f"Línea {error['linea']}: {error['error']} ({error['email'] or '-'})")
+        if informe.errores_omitidos:
+            self.stderr.write(f"... y {informe.errores_omitidos} errores más")
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {informe.creados} creados, {informe.actualizados} actualizados, "
+            f"{informe.total_errores} errores en {time.monotonic() - inicio:.2f}s"
+        ))
@@ -0,0 +1,21 @@
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from academia_app.instantaneas import crear_instantanea, instantanea_actual
+
+
+class Command(BaseCommand):
+    help = ("Crea una instantánea coherente de estudiantes, cursos y matrículas (SQLite comprimido con gzip) "
+            "en INSTANTANEAS_DIR, o reutiliza la del seq actual si ya existe.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', help="Copia además la instantánea a este fichero")
+        parser.add_argument('--forzar', action='store_true', help="Crea una nueva aunque ya exista la del seq actual")
+
+    def handle(self, *args, **options):
+        seq, ruta = crear_instantanea() if options['forzar'] else instantanea_actual()
+        if options['salida']:
+            shutil.copyfile(ruta, options['salida'])
+            ruta = options['salida']
+        self.stdout.write(self.style.SUCCESS(f"Instantánea del seq {seq}: {ruta}"))
@@ -0,0 +1,311 @@
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Prueba de carga de bucle abierto: las peticiones llegan a la tasa pedida (constante o Poisson)
+# aunque el servidor se retrase, y la latencia se mide desde el instante planificado, así las
+# colas por bloqueos (p. ej. escrituras de matrículas frente a lecturas de reportes en SQLite) se ven.
+# Solo biblioteca estándar: hilos para las peticiones y urllib como cliente.
+
+MEZCLA_POR_DEFECTO = 'alta_estudiante=1,matricula=3,calificar=1,reporte=3,busqueda=2'
+PERCENTILES = (50, 90, 99)
+
+
+class Cliente:
+    def __init__(self, url, host=None, timeout=10):
+        self.url = url.rstrip('/')
+        self.cabeceras = {'Content-Type': 'application/json'}
+        if host:
+            self.cabeceras['Host'] = host
+        self.timeout = timeout
+
+    def peticion(self, metodo, ruta, datos=None):
+        """(estado, cuerpo) de la petición. Los errores HTTP se devuelven; los de red se lanzan."""
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+        peticion = urllib.request.Request(self.url + ruta, data=cuerpo, method=metodo, headers=self.cabeceras)
+        try:
+            with urllib.request.urlopen(peticion, timeout=self.timeout) as respuesta:
+                return respuesta.status, respuesta.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+
+class Escenario:
+    """Estado compartido de la carga (ids creados) y los flujos que componen la mezcla."""
+
+    def __init__(self, cliente, semilla):
+        self.cliente = cliente
+        self.lock = threading.Lock()
+        self.aleatorio = random.Random(semilla)
+        self.prefijo = f"carga{int(time.time())}"
+        self.siguiente_email = 0
+        self.estudiantes = []
+        self.cursos = []
+        self.matriculados = []   # (estudiante, curso)
+
+    def _elegir(self, lista):
+        with self.lock:
+            return self.aleatorio.choice(lista) if lista else None
+
+    def _comprobar(self, estado, cuerpo, esperado):
+        if estado != esperado:
+            raise ErrorPeticion(estado, cuerpo)
+        return json.loads(cuerpo) if cuerpo else None
+
+    def preparar(self, cursos, estudiantes):
+        inicio = (date.today() + timedelta(days=30)).isoformat()
+        for i in range(cursos):
+            curso = self._comprobar(*self.cliente.peticion('POST', '/api/cursos/', {
+                'titulo': f"Carga {self.prefijo} {i}", 'descripcion': "Curso de la prueba de carga", 'fecha_inicio': inicio,
+            }), 201)
+            self.cursos.append(curso['id'])
+        for _ in range(estudiantes):
+            self.alta_estudiante()
+
+    # Flujos de la mezcla
+
+    def alta_estudiante(self):
+        with self.lock:
+            n = self.siguiente_email
+            self.siguiente_email += 1
+        estudiante = self._comprobar(*self.cliente.peticion('POST', '/api/estudiantes/', {
+            'nombre': f"Alumno {n}", 'email': f"{self.prefijo}.{n}@carga.test",
+        }), 201)
+        with self.lock:
+            self.estudiantes.append(estudiante['id'])
+
+    def matricula(self):
+        estudiante, curso = self._elegir(self.estudiantes), self._elegir(self.cursos)
+        estado, cuerpo = self.cliente.peticion('POST', '/api/matriculas/', {'estudiante': estudiante, 'curso': curso})
+        self._comprobar(estado, cuerpo, 201)
+        with self.lock:
+            self.matriculados.append((estudiante, curso))
+
+    def calificar(self):
+        par = self._elegir(self.matriculados)
+        if par is None:
+            return self.matricula()
+        estudiante, curso = par
+        nota = f"{self.aleatorio.uniform(0, 10):.1f}"  # como texto: el DecimalField rechaza floats de JSON
+        self._comprobar(*self.cliente.peticion('POST', f'/api/cursos/{curso}/calificaciones/', {estudiante: nota}), 200)
+
+    def reporte(self):
+        estudiante = self._elegir(self.estudiantes)
+        estado, cuerpo = self.cliente.peticion('GET', f'/api/estudiantes/{estudiante}/reporte/')
+        if estado not in (200, 404):  # 404: el estudiante todavía no tiene matrículas
+            raise ErrorPeticion(estado, cuerpo)
+
+    def busqueda(self):
+        termino = f"Alumno {self.aleatorio.randint(0, max(self.siguiente_email - 1, 0))}"
+        self._comprobar(*self.cliente.peticion(
+            'GET', f'/api/matriculas/?search={urllib.parse.quote(termino)}&ordering=estudiante__nombre'
+        ), 200)
+
+
+class ErrorPeticion(Exception):
+    def __init__(self, estado, cuerpo):
+        super().__init__(estado)
+        self.estado = estado
+        self.cuerpo = cuerpo
+
+
+def clasificar_error(error):
+    """Clase de error para el informe: 'database is locked', el código HTTP, 'timeout' o 'conexion'."""
+    if isinstance(error, ErrorPeticion):
+        if 'database is locked' in error.cuerpo:
+            return 'database is locked'
+        return str(error.estado)
+    if isinstance(error, TimeoutError) or 'timed out' in str(error):
+        return 'timeout'
+    return f"conexion ({type(error).__name__})"
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def resumir(resultados, segundos):
+    """Rendimiento, percentiles de latencia (ms) y clases de error por flujo y en total."""
+    def bloque(filas):
+        latencias = sorted(f['latencia'] for f in filas if f['error'] is None)
+        errores = {}
+        for f in filas:
+            if f['error'] is not None:
+                errores[f['error']] = errores.get(f['error'], 0) + 1
+        return {
+            "peticiones": len(filas),
+            "correctas": len(latencias),
+            "por_segundo": round(len(latencias) / segundos, 2),
+            **{f"p{p}_ms": round(percentil(latencias, p) * 1000, 1) if latencias else None for p in PERCENTILES},
+            "max_ms": round(latencias[-1] * 1000, 1) if latencias else None,
+            "errores": errores,
+        }
+    flujos = sorted({f['flujo'] for f in resultados})
+    return {
+        "total": bloque(resultados),
+        "flujos": {flujo: bloque([f for f in resultados if f['flujo'] == flujo]) for flujo in flujos},
+    }
+
+
+def _mezcla(texto):
+    pesos = {}
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if not hasattr(Escenario, nombre) or nombre in ('preparar',) or nombre.startswith('_'):
+            raise CommandError(f"Flujo desconocido en --mezcla: {nombre}")
+        try:
+            pesos[nombre] = float(peso or 1)
+        except ValueError:
+            raise CommandError(f"Peso no válido en --mezcla: {parte}")
+    return pesos
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga de bucle abierto con una mezcla de flujos (altas, matrículas, calificaciones, reportes y "
+        "búsquedas). Sin --url arranca `runserver` en local sobre la base de datos configurada: úsese con una de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Servidor ya arrancado (p. ej. gunicorn). Si no, se arranca runserver")
+        parser.add_argument('--puerto', type=int, default=8765, help="Puerto del runserver que se arranca")
+        parser.add_argument('--host', help="Cabecera Host a enviar (por defecto el primer ALLOWED_HOSTS si no admite localhost)")
+        parser.add_argument('--tasa', type=float, default=20.0, help="Llegadas por segundo")
+        parser.add_argument('--llegadas', choices=['poisson', 'constante'], default='poisson')
+        parser.add_argument('--duracion', type=float, default=30.0, help="Segundos de carga")
+        parser.add_argument('--mezcla', default=MEZCLA_POR_DEFECTO, help="flujo=peso separados por comas")
+        parser.add_argument('--hilos', type=int, default=32, help="Peticiones simultáneas como máximo")
+        parser.add_argument('--timeout', type=float, default=10.0)
+        parser.add_argument('--cursos', type=int, default=5, help="Cursos que se crean antes de empezar")
+        parser.add_argument('--estudiantes', type=int, default=50, help="Estudiantes que se crean antes de empezar")
+        parser.add_argument('--semilla', type=int, default=None)
+        parser.add_argument('--salida', help="Fichero JSON de resultados (por defecto loadtest/<fecha>.json)")
+        parser.add_argument('--comparar', help="Resultados anteriores con los que comparar")
+
+    def handle(self, *args, **options):
+        pesos = _mezcla(options['mezcla'])
+        servidor = None
+        url = options['url']
+        host = options['host']
+        if url is None:
+            url = f"http://127.0.0.1:{options['puerto']}"
+            host = host or _host_local()
+            servidor = self._arrancar_servidor(options['puerto'])
+        try:
+            cliente = Cliente(url, host=host, timeout=options['timeout'])
+            if servidor is not None:
+                self._esperar_servidor(cliente, servidor)
+            escenario = Escenario(cliente, options['semilla'])
+            escenario.preparar(options['cursos'], options['estudiantes'])
+            resultados, segundos = self._cargar(escenario, pesos, options)
+        finally:
+            if servidor is not None:
+                servidor.terminate()
+                servidor.wait(timeout=10)
+
+        informe = {
+            "fecha": timezone.now().isoformat(),
+            "parametros": {k: options[k] for k in ('url', 'tasa', 'llegadas', 'duracion', 'mezcla', 'hilos', 'semilla')},
+            "segundos": round(segundos, 2),
+            **resumir(resultados, segundos),
+        }
+        self._imprimir(informe)
+        salida = Path(options['salida'] or Path(settings.BASE_DIR) / 'loadtest' / f"{timezone.now():%Y%m%dT%H%M%S}.json")
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Resultados guardados en {salida}")
+        if options['comparar']:
+            self._comparar(json.loads(Path(options['comparar']).read_text(encoding='utf-8')), informe)
+
+    def _arrancar_servidor(self, puerto):
+        return subprocess.Popen(
+            [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'runserver', f"127.0.0.1:{puerto}", '--noreload'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def _esperar_servidor(self, cliente, servidor, segundos=30):
+        limite = time.monotonic() + segundos
+        while time.monotonic() < limite:
+            if servidor.poll() is not None:
+                raise CommandError("El servidor no ha podido arrancar (¿puerto ocupado o migraciones pendientes?).")
+            try:
+                if cliente.peticion('GET', '/api/cursos/?ids=1')[0] == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError("El servidor no responde.")
+
+    def _cargar(self, escenario, pesos, options):
+        nombres, valores = list(pesos), list(pesos.values())
+        resultados = []
+        lock = threading.Lock()
+        aleatorio = random.Random(options['semilla'])
+
+        def ejecutar(flujo, planificado):
+            error = None
+            try:
+                getattr(escenario, flujo)()
+            except Exception as e:  # cada fallo se clasifica; la carga sigue
+                error = clasificar_error(e)
+            fila = {"flujo": flujo, "latencia": time.perf_counter() - planificado, "error": error}
+            with lock:
+                resultados.append(fila)
+
+        with ThreadPoolExecutor(max_workers=options['hilos']) as pool:
+            inicio = time.perf_counter()
+            siguiente = inicio
+            while siguiente - inicio < options['duracion']:
+                espera = siguiente - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                # La latencia cuenta desde el instante planificado: si el servidor se atasca, la espera en cola también
+                pool.submit(ejecutar, aleatorio.choices(nombres, valores)[0], siguiente)
+                if options['llegadas'] == 'poisson':
+                    siguiente += aleatorio.expovariate(options['tasa'])
+                else:
+                    siguiente += 1 / options['tasa']
+        return resultados, time.perf_counter() - inicio
+
+    def _imprimir(self, informe):
+        self.stdout.write(f"{'flujo':<17}{'pet.':>7}{'ok/s':>8}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}  errores")
+        for nombre, datos in [*informe['flujos'].items(), ('TOTAL', informe['total'])]:
+            ms = ''.join(f"{datos[c] if datos[c] is not None else '-':>8}" for c in ('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'))
+            errores = ', '.join(f"{clase}: {n}" for clase, n in sorted(datos['errores'].items())) or '-'
+            self.stdout.write(f"{nombre:<17}{datos['peticiones']:>7}{datos['por_segundo']:>8}{ms}  {errores}")
+
+    def _comparar(self, anterior, actual):
+        self.stdout.write("Comparación con la ejecución anterior (anterior -> actual):")
+        for nombre in sorted(set(anterior['flujos']) | set(actual['flujos'])):
+            a, b = anterior['flujos'].get(nombre), actual['flujos'].get(nombre)
+            if not a or not b:
+                continue
+            errores_a, errores_b = sum(a['errores'].values()), sum(b['errores'].values())
+            self.stdout.write(
+                f"{nombre:<17}ok/s {a['por_segundo']} -> {b['por_segundo']}  p50 {a['p50_ms']} -> {b['p50_ms']}  "
+                f"p99 {a['p99_ms']} -> {b['p99_ms']}  errores {errores_a} -> {errores_b}"
+            )
+
+
+def _host_local():
+    # runserver solo acepta los ALLOWED_HOSTS; si no incluyen localhost se usa el primero como cabecera Host
+    permitidos = settings.ALLOWED_HOSTS
+    if not permitidos or {'*', '127.0.0.1', 'localhost'} & set(permitidos):
+        return None
+    return permitidos[0]
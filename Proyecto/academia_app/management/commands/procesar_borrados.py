@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from academia_app.borrado import reanudar
+
+
+class Command(BaseCommand):
+    help = ("Termina los borrados en segundo plano pendientes, interrumpidos (p. ej. por un reinicio del servidor) o con "
+            "error: los que llevan BORRADO_CADUCIDAD segundos sin avanzar. Cada uno sigue donde se quedó.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"{reanudar()} borrados terminados"))
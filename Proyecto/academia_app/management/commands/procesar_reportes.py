@@ -0,0 +1,25 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from academia_app.reportes import procesar_cola
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de reportes masivos: procesa los trabajos pendientes y reanuda los interrumpidos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help="Procesos para los fragmentos")
+        parser.add_argument('--continuo', action='store_true', help="Sigue esperando trabajos nuevos")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos de espera cuando no hay trabajos")
+
+    def handle(self, *args, **options):
+        while True:
+            procesados = procesar_cola(procesos=options['procesos'])
+            if procesados:
+                self.stdout.write(f"{procesados} trabajos procesados")
+            if not options['continuo']:
+                return
+            if not procesados:
+                time.sleep(options['intervalo'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from academia_app.contadores import reconciliar
+
+
+class Command(BaseCommand):
+    help = ("Compara los contadores de filas con un COUNT real y corrige los que no cuadran. "
+            "Pensado para ejecutarse periódicamente (p. ej. cada noche desde cron).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-comprobar', action='store_true', help="Informa de las diferencias sin corregirlas")
+
+    def handle(self, *args, **options):
+        diferencias = reconciliar(corregir=not options['solo_comprobar'])
+        for clave, guardado, real in diferencias:
+            self.stdout.write(f"{clave}: guardado {guardado}, real {real}")
+        accion = "encontradas" if options['solo_comprobar'] else "corregidas"
+        self.stdout.write(self.style.SUCCESS(f"{len(diferencias)} diferencias {accion}"))
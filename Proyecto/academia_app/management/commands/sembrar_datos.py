@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from academia_app.datos_prueba import sembrar
+
+
+class Command(BaseCommand):
+    help = "Siembra datos sintéticos (estudiantes, cursos y matrículas) para benchmarks. No usar en producción."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--estudiantes', type=int, default=10000)
+        parser.add_argument('--cursos', type=int, default=200)
+        parser.add_argument('--matriculas', type=int, default=100000)
+        parser.add_argument('--anios', type=int, default=5, help="Años de histórico de cursos pasados")
+
+    def handle(self, *args, **options):
+        try:
+            creado = sembrar(
+                estudiantes=options['estudiantes'],
+                cursos=options['cursos'],
+                matriculas=options['matriculas'],
+                anios=options['anios'],
+                progreso=lambda mensaje: self.stdout.write(mensaje),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Sembrados {creado['estudiantes']} estudiantes, {creado['cursos']} cursos y {creado['matriculas']} matrículas"
+        ))
@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import ExitStack
+from pathlib import Path
+
+try:
+    import fcntl  # bloqueo del directorio al consolidar ficheros; no existe en Windows
+except ImportError:
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections
+
+from .cache_cursos import elegibilidad
+from .idempotencia import almacen as idempotencia
+
+# Métricas en formato Prometheus (GET /metrics) válidas con varios workers de gunicorn.
+# Cada proceso acumula en memoria (registrar cuesta unos microsegundos: un lock y unas sumas) y vuelca
+# sus totales a su propio fichero en METRICAS_DIR como mucho cada METRICAS_INTERVALO segundos.
+# /metrics suma los ficheros de todos los procesos, también los de workers ya terminados, para que
+# los contadores no retrocedan: los de procesos muertos se consolidan en un único fichero. El directorio se
+# vacía al arrancar gunicorn (gunicorn.conf.py).
+# Solo escriben ficheros los procesos del servidor (activar_volcado() en wsgi.py y asgi.py): tests, shell o
+# makemigrations acumulan en memoria pero no dejan ficheros.
+
+BUCKETS_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# nombre -> (tipo, ayuda, buckets)
+METRICAS = {
+    'academia_peticiones_total': ('counter', "Peticiones atendidas por ruta, método y estado", None),
+    'academia_peticion_duracion_segundos': ('histogram', "Latencia de las peticiones por ruta", BUCKETS_DURACION),
+    'academia_respuesta_bytes': ('histogram', "Tamaño del cuerpo de las respuestas por ruta", BUCKETS_BYTES),
+    'academia_consultas_bd_total': ('counter', "Consultas a la base de datos por ruta", None),
+    'academia_consultas_bd_segundos_total': ('counter', "Tiempo en consultas a la base de datos por ruta", None),
+    'academia_matriculas_total': ('counter', "Altas de matrícula por resultado (201, 400, 409)", None),
+    'academia_cache_total': ('counter', "Aciertos y fallos de las cachés en proceso", None),
+    'academia_coalescencia_total': ('counter', "Lecturas ejecutadas y coalescidas con una idéntica en curso, por ruta", None),
+    'academia_idempotencia_total': ('counter', "Reintentos con Idempotency-Key respondidos con la respuesta guardada", None),
+}
+
+
+FINALIZADOS = 'metricas_finalizados.json'  # totales de los procesos que ya han terminado
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.activo = False  # vuelca a METRICAS_DIR; lo activa el arranque del servidor
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._contadores = {}     # (nombre, etiquetas) -> valor
+        self._histogramas = {}    # (nombre, etiquetas) -> [cuenta por bucket..., +Inf, suma]
+        self._fichero = f"metricas_{os.getpid()}_{uuid.uuid4().hex[:8]}.json"
+        self._ultimo_volcado = time.monotonic()
+
+    def sumar(self, nombre, etiquetas, valor=1):
+        clave = (nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, etiquetas, valor):
+        clave = (nombre, etiquetas)
+        buckets = METRICAS[nombre][2]
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = [0] * (len(buckets) + 2)
+            histograma[bisect_left(buckets, valor)] += 1
+            histograma[-1] += valor
+
+    def volcar_si_toca(self):
+        if self.activo and time.monotonic() - self._ultimo_volcado >= settings.METRICAS_INTERVALO:
+            self.volcar()
+
+    def datos(self):
+        """Totales de este proceso: {"contadores": [[nombre, etiquetas, valor]...], "histogramas": [...]}."""
+        with self._lock:
+            contadores = dict(self._contadores)
+            # Las cachés llevan sus propios totales del proceso: se copian tal cual
+            caches = elegibilidad.todas()
+            contadores[('academia_cache_total', (('cache', 'elegibilidad'), ('resultado', 'acierto')))] = sum(c.aciertos for c in caches)
+            contadores[('academia_cache_total', (('cache', 'elegibilidad'), ('resultado', 'fallo')))] = sum(c.fallos for c in caches)
+            contadores[('academia_idempotencia_total', (('resultado', 'repetida'),))] = idempotencia.repetidas
+            contadores[('academia_idempotencia_total', (('resultado', 'esperada'),))] = idempotencia.esperadas
+            return {
+                "contadores": [[n, e, v] for (n, e), v in contadores.items()],
+                "histogramas": [[n, e, list(h)] for (n, e), h in self._histogramas.items()],
+            }
+
+    def volcar(self):
+        """Escribe los totales de este proceso en su fichero (escritura atómica)."""
+        self._ultimo_volcado = time.monotonic()
+        _escribir(Path(settings.METRICAS_DIR) / self._fichero, self.datos())
+
+
+registro = RegistroMetricas()
+os.register_at_fork(after_in_child=registro._reiniciar)  # un worker no hereda ni reescribe lo del proceso padre
+
+
+def activar_volcado():
+    """Los procesos del servidor vuelcan sus totales a METRICAS_DIR (cada METRICAS_INTERVALO y al salir)."""
+    registro.activo = True
+
+
+@atexit.register
+def _volcar_al_salir():
+    if not registro.activo:
+        return
+    try:
+        registro.volcar()
+    except Exception:
+        pass
+
+
+def _escribir(ruta, datos):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    temporal.write_text(json.dumps(datos), encoding='utf-8')
+    os.replace(temporal, ruta)
+
+
+def _sumar(contadores, histogramas, datos):
+    for nombre, etiquetas, valor in datos['contadores']:
+        clave = (nombre, tuple(map(tuple, etiquetas)))
+        contadores[clave] = contadores.get(clave, 0) + valor
+    for nombre, etiquetas, valores in datos['histogramas']:
+        clave = (nombre, tuple(map(tuple, etiquetas)))
+        acumulado = histogramas.setdefault(clave, [0] * len(valores))
+        for i, valor in enumerate(valores):
+            acumulado[i] += valor
+
+
+def _leer(ruta):
+    try:
+        return json.loads(ruta.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def _proceso_vivo(ruta):
+    # metricas_<pid>_<sufijo>.json; None si el nombre no lleva pid (p. ej. el de finalizados)
+    pid = ruta.stem.split('_')[1]
+    if not (pid.isascii() and pid.isdigit()):
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # existe, aunque sea de otro usuario
+    return True
+
+
+def _consolidar(carpeta):
+    # Suma los ficheros de procesos muertos a FINALIZADOS y los borra, así el directorio no crece con cada
+    # worker reciclado. Con el directorio bloqueado: ningún lector ve a la vez el fichero y su suma
+    muertos = [ruta for ruta in carpeta.glob('metricas_*.json') if _proceso_vivo(ruta) is False]
+    if not muertos:
+        return
+    contadores, histogramas = {}, {}
+    for ruta in [carpeta / FINALIZADOS, *muertos]:
+        datos = _leer(ruta)
+        if datos is not None:
+            _sumar(contadores, histogramas, datos)
+    _escribir(carpeta / FINALIZADOS, {
+        "contadores": [[n, e, v] for (n, e), v in contadores.items()],
+        "histogramas": [[n, e, h] for (n, e), h in histogramas.items()],
+    })
+    for ruta in muertos:
+        ruta.unlink(missing_ok=True)
+
+
+def agregar():
+    """Suma los totales de este proceso y los ficheros de los demás. Devuelve (contadores, histogramas)."""
+    contadores, histogramas = {}, {}
+    _sumar(contadores, histogramas, registro.datos())
+    carpeta = Path(settings.METRICAS_DIR)
+    if not carpeta.is_dir():
+        return contadores, histogramas
+    with ExitStack() as pila:
+        if fcntl is not None:
+            bloqueo = pila.enter_context(open(carpeta / '.bloqueo', 'a'))
+            fcntl.flock(bloqueo, fcntl.LOCK_EX)
+            _consolidar(carpeta)
+        for ruta in carpeta.glob('metricas_*.json'):
+            if ruta.name == registro._fichero:
+                continue  # ya sumado desde memoria, más reciente que el fichero
+            datos = _leer(ruta)
+            if datos is not None:
+                _sumar(contadores, histogramas, datos)
+    return contadores, histogramas
+
+
+def _etiquetas(etiquetas, extra=()):
+    pares = [*etiquetas, *extra]
+    if not pares:
+        return ''
+    escapar = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exponer():
+    """Texto en formato de exposición de Prometheus (versión 0.0.4)."""
+    contadores, histogramas = agregar()
+    lineas = []
+    for nombre, (tipo, ayuda, buckets) in METRICAS.items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        if tipo == 'counter':
+            for (n, etiquetas), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+            continue
+        for (n, etiquetas), valores in sorted(histogramas.items()):
+            if n != nombre:
+                continue
+            acumulado = 0
+            for limite, cuenta in zip([*buckets, '+Inf'], valores[:-1]):
+                acumulado += cuenta
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, [('le', limite)])} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(valores[-1])}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {acumulado}")
+    return '\n'.join(lineas) + '\n'
+
+
+def limpiar_directorio():
+    """Borra los ficheros de métricas (al arrancar el servidor, antes de crear los workers)."""
+    for ruta in Path(settings.METRICAS_DIR).glob('metricas_*.json*'):
+        ruta.unlink(missing_ok=True)
+
+
+class MetricasMiddleware:
+    """
+    Registra latencia, tamaño de respuesta y consultas por ruta (nombre de la URL del router de DRF).
+    Las consultas se cuentan en todas las bases de datos ('default' y academias) del hilo de la petición.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consultas = [0, 0.0]
+
+        def medir_consulta(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                consultas[0] += 1
+                consultas[1] += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medir_consulta))
+            respuesta = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = request.resolver_match
+        ruta = (('ruta', coincidencia.url_name or coincidencia.route) if coincidencia else ('ruta', 'sin_ruta'),)
+        registro.sumar('academia_peticiones_total', (*ruta, ('metodo', request.method), ('estado', str(respuesta.status_code))))
+        registro.observar('academia_peticion_duracion_segundos', ruta, duracion)
+        if not respuesta.streaming:
+            registro.observar('academia_respuesta_bytes', ruta, len(respuesta.content))
+        if consultas[0]:
+            registro.sumar('academia_consultas_bd_total', ruta, consultas[0])
+            registro.sumar('academia_consultas_bd_segundos_total', ruta, consultas[1])
+        if ruta[0][1] == 'matricula-list' and request.method == 'POST':
+            registro.sumar('academia_matriculas_total', (('resultado', str(respuesta.status_code)),))
+        registro.volcar_si_toca()
+        return respuesta
@@ -6,6 +6,7 @@ def insert_initial_data(apps, schema_editor):
     Estudiante = apps.get_model('academia_app', 'Estudiante')
     Curso = apps.get_model('academia_app', 'Curso')
     Matricula = apps.get_model('academia_app', 'Matricula')
+    db = schema_editor.connection.alias  # con varias academias se migra cada base de datos por separado
 
     # Crear estudiantes iniciales
     estudiantes = [
@@ -15,7 +16,7 @@ def insert_initial_data(apps, schema_editor):
         Estudiante(nombre="Ana Ruiz", email="ana.ruiz@email.com"),
         Estudiante(nombre="Miguel Herrera", email="miguel.herrera@email.com"),
     ]
-    Estudiante.objects.bulk_create(estudiantes)
+    Estudiante.objects.using(db).bulk_create(estudiantes)
 
     # Crear cursos iniciales (algunos activos, otros no)
     hoy = date.today()
@@ -45,11 +46,11 @@ def insert_initial_data(apps, schema_editor):
             activo=True
         )
     ]
-    Curso.objects.bulk_create(cursos)
+    Curso.objects.using(db).bulk_create(cursos)
 
     # Obtener instancias ya guardadas
-    estudiantes = list(Estudiante.objects.all())
-    cursos = list(Curso.objects.filter(activo=True))
+    estudiantes = list(Estudiante.objects.using(db).all())
+    cursos = list(Curso.objects.using(db).filter(activo=True))
 
     # Crear algunas matrículas válidas
     matriculas = [
@@ -60,17 +61,18 @@ def insert_initial_data(apps, schema_editor):
         Matricula(estudiante=estudiantes[4], curso=cursos[1], calificacion=6.8),
     ]
     # Solo matriculamos en cursos activos y futuros para cumplir validaciones
-    Matricula.objects.bulk_create([m for m in matriculas if m.curso.activo and m.curso.fecha_inicio >= hoy])
+    Matricula.objects.using(db).bulk_create([m for m in matriculas if m.curso.activo and m.curso.fecha_inicio >= hoy])
 
 def reverse_initial_data(apps, schema_editor):
     Estudiante = apps.get_model('academia_app', 'Estudiante')
     Curso = apps.get_model('academia_app', 'Curso')
     Matricula = apps.get_model('academia_app', 'Matricula')
+    db = schema_editor.connection.alias
 
     # Borrar en orden inverso por integridad referencial
-    Matricula.objects.all().delete()
-    Curso.objects.all().delete()
-    Estudiante.objects.all().delete()
+    Matricula.objects.using(db).all().delete()
+    Curso.objects.using(db).all().delete()
+    Estudiante.objects.using(db).all().delete()
 
 class Migration(migrations.Migration):
 
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:52
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0002_insert_initial_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatriculaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_matricula', models.DateField()),
+                ('calificacion', models.DecimalField(blank=True, decimal_places=2, max_digits=4, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)])),
+                ('anio', models.PositiveSmallIntegerField(db_index=True)),
+                ('curso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matriculas_archivadas', to='academia_app.curso')),
+                ('estudiante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matriculas_archivadas', to='academia_app.estudiante')),
+            ],
+            options={
+                'unique_together': {('estudiante', 'curso')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:56
+
+from django.db import migrations, models
+
+
+def numerar_filas_existentes(apps, schema_editor):
+    # Las filas anteriores reciben un seq (pk más un desplazamiento por modelo) para que ?since=0 las devuelva todas
+    SecuenciaCambios = apps.get_model('academia_app', 'SecuenciaCambios')
+    db = schema_editor.connection.alias
+    desplazamiento = 0
+    for nombre in ('Estudiante', 'Curso', 'Matricula'):
+        modelo = apps.get_model('academia_app', nombre)
+        modelo.objects.using(db).update(seq=models.F('pk') + desplazamiento)
+        desplazamiento += modelo.objects.using(db).aggregate(maximo=models.Max('pk'))['maximo'] or 0
+    SecuenciaCambios.objects.using(db).create(pk=1, valor=desplazamiento)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0003_matriculaarchivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaCambios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='estudiante',
+            name='seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='matricula',
+            name='seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('seq', models.BigIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelo', 'seq'], name='academia_ap_modelo_5a32f9_idx')],
+            },
+        ),
+        migrations.RunPython(numerar_filas_existentes, migrations.RunPython.noop),
+    ]
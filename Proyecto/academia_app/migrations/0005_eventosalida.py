@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0004_secuencia_cambios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoSalida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('destino', models.URLField(max_length=500)),
+                ('payload', models.JSONField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('entregado', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entregado', 'proximo_intento'], name='academia_ap_entrega_d24bb3_idx')],
+            },
+        ),
+    ]
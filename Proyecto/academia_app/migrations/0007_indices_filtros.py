@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0006_trabajos_reporte'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='curso',
+            index=models.Index(fields=['activo', 'fecha_inicio'], name='academia_ap_activo_4f43af_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='curso',
+            index=models.Index(fields=['fecha_inicio'], name='academia_ap_fecha_i_637d17_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estudiante',
+            index=models.Index(fields=['fecha_registro'], name='academia_ap_fecha_r_235c61_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matricula',
+            index=models.Index(fields=['curso', 'calificacion'], name='academia_ap_curso_i_a03452_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matricula',
+            index=models.Index(fields=['curso', 'fecha_matricula'], name='academia_ap_curso_i_e51620_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matricula',
+            index=models.Index(fields=['estudiante', 'fecha_matricula'], name='academia_ap_estudia_8d4c63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matricula',
+            index=models.Index(fields=['calificacion'], name='academia_ap_calific_c7d4bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matricula',
+            index=models.Index(fields=['fecha_matricula'], name='academia_ap_fecha_m_c148a3_idx'),
+        ),
+    ]
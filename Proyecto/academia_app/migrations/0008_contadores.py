@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:08
+
+from django.db import migrations, models
+
+
+def contar_filas_existentes(apps, schema_editor):
+    # Valores iniciales de los contadores con un COUNT real (mismas claves que academia_app/contadores.py)
+    Contador = apps.get_model('academia_app', 'Contador')
+    db = schema_editor.connection.alias
+    particiones = {'estudiante': (), 'curso': ('activo',), 'matricula': ('curso_id', 'estudiante_id')}
+    filas = []
+    for nombre, campos in particiones.items():
+        modelo = apps.get_model('academia_app', nombre)
+        filas.append(Contador(clave=nombre, valor=modelo.objects.using(db).count()))
+        for campo in campos:
+            for valor, n in modelo.objects.using(db).order_by().values_list(campo).annotate(n=models.Count('pk')):
+                filas.append(Contador(clave=f"{nombre}:{campo}:{valor}", valor=n))
+    Contador.objects.using(db).bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0007_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(contar_filas_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0008_contadores'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='estudiante',
+            name='nombre',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
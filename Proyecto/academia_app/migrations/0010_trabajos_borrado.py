@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0009_indice_nombre_estudiante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('curso', 'Curso'), ('estudiante', 'Estudiante')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completado', 'Completado'), ('error', 'Error')], db_index=True, default='pendiente', max_length=12)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('borradas', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
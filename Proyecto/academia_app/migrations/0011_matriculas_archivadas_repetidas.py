@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0010_trabajos_borrado'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='matriculaarchivada',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='matriculaarchivada',
+            index=models.Index(fields=['estudiante', 'curso'], name='academia_ap_estudia_2da178_idx'),
+        ),
+    ]
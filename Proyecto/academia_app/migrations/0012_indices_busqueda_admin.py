@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:24
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academia_app', '0011_matriculas_archivadas_repetidas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='curso',
+            index=models.Index(django.db.models.functions.comparison.Collate('titulo', 'NOCASE'), name='curso_titulo_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='estudiante',
+            index=models.Index(django.db.models.functions.comparison.Collate('nombre', 'NOCASE'), name='estudiante_nombre_nocase'),
+        ),
+    ]
@@ -1,18 +1,118 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
+from django.db.models.functions import Collate
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 # Create your models here.
 
-class Estudiante(models.Model):
-    nombre = models.CharField(max_length=100)
+# Secuencia global de cambios para la sincronización incremental (?since=<seq>).
+# Una sola fila cuyo valor crece con cada alta, modificación o borrado.
+class SecuenciaCambios(models.Model):
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.valor)
+
+
+def reservar_seq(cantidad=1, using=None):
+    """
+    Reserva `cantidad` números de secuencia y devuelve el último.
+    El UPDATE bloquea la fila hasta el commit, así dos escrituras nunca comparten número
+    y ningún lector ve un valor mayor que el de un cambio aún sin confirmar.
+    """
+    using = using or router.db_for_write(SecuenciaCambios)
+    with transaction.atomic(using=using):
+        secuencias = SecuenciaCambios.objects.using(using)
+        if not secuencias.filter(pk=1).update(valor=F('valor') + cantidad):
+            secuencias.create(pk=1, valor=cantidad)
+        return secuencias.values_list('valor', flat=True).get(pk=1)
+
+
+def seq_actual(using=None):
+    """Último número de secuencia confirmado (marca de agua para ?since=)."""
+    using = using or router.db_for_read(SecuenciaCambios)
+    return SecuenciaCambios.objects.using(using).values_list('valor', flat=True).filter(pk=1).first() or 0
+
+
+# Base de los modelos sincronizables: cada save asigna un seq nuevo dentro de la misma transacción
+class ModeloSincronizado(models.Model):
+    seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    # Guarda los valores leídos de la BD para saber qué campos cambian al guardar (p. ej. la calificación)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._originales = dict(zip(field_names, values))
+        return instancia
+
+    def campo_modificado(self, attname):
+        """True si el campo (attname, p. ej. 'curso_id') difiere del valor leído de la BD. Las instancias nuevas cuentan como modificadas."""
+        originales = self.__dict__.get('_originales')
+        if originales is None:
+            return True
+        if attname not in originales:
+            return attname in self.__dict__
+        return originales[attname] != self.__dict__.get(attname)
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'seq'}
+        with transaction.atomic(using=using):
+            self.seq = reservar_seq(using=using)
+            super().save(*args, **kwargs)  # las señales post_save todavía ven los valores originales
+        self._originales = {f.attname: self.__dict__[f.attname] for f in self._meta.concrete_fields if f.attname in self.__dict__}
+
+
+# Marca de borrado (tombstone) para que los clientes de ?since= sepan qué filas desaparecieron
+class Eliminacion(models.Model):
+    modelo = models.CharField(max_length=20)  # estudiante, curso o matricula
+    objeto_id = models.BigIntegerField()
+    seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['modelo', 'seq'])]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} (seq {self.seq})"
+
+
+def registrar_eliminaciones(modelo, ids, using=None):
+    """Crea las marcas de borrado de varias filas con un solo bloque de secuencia. Devuelve el último seq."""
+    ids = list(ids)
+    if not ids:
+        return None
+    using = using or router.db_for_write(Eliminacion)
+    ultimo = reservar_seq(len(ids), using=using)
+    primero = ultimo - len(ids) + 1
+    Eliminacion.objects.using(using).bulk_create(
+        [Eliminacion(modelo=modelo._meta.model_name, objeto_id=id_, seq=primero + i) for i, id_ in enumerate(ids)]
+    )
+    return ultimo
+
+
+class Estudiante(ModeloSincronizado):
+    nombre = models.CharField(max_length=100, db_index=True)  # orden por defecto del listado
     email = models.EmailField(unique=True)
     fecha_registro = models.DateField(auto_now_add=True)
 
+    # Índices de los filtros del listado (filtros.py) y de la búsqueda por prefijo del admin: en SQLite
+    # istartswith es un LIKE, que no distingue mayúsculas y solo usa un índice con COLLATE NOCASE
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_registro']),
+            models.Index(Collate('nombre', 'NOCASE'), name='estudiante_nombre_nocase'),
+        ]
+
     def __str__(self):
         return self.nombre
 
-class Curso(models.Model):
+class Curso(ModeloSincronizado):
     titulo = models.CharField(max_length=100)
     descripcion = models.TextField()
     fecha_inicio = models.DateField()
@@ -22,34 +122,70 @@ class Curso(models.Model):
     # acceso a estudiantes a traves de matriculas : curso.matricula_set.all() o curso.matricula_set.count()
     # tambien... estudiantes = Estudiante.objects.filter(matricula__curso=curso)
 
+    # Índices de los filtros del listado (filtros.py): activo solo o con rango de fechas, y rango de fechas solo.
+    # El de titulo con COLLATE NOCASE es el de la búsqueda por prefijo (LIKE) del admin
+    class Meta:
+        indexes = [
+            models.Index(fields=['activo', 'fecha_inicio']),
+            models.Index(fields=['fecha_inicio']),
+            models.Index(Collate('titulo', 'NOCASE'), name='curso_titulo_nocase'),
+        ]
+
     def __str__(self):
         return self.titulo
 
-class Matricula(models.Model):
+class Matricula(ModeloSincronizado):
     estudiante = models.ForeignKey(Estudiante, on_delete=models.CASCADE)
     curso = models.ForeignKey(Curso, on_delete=models.CASCADE)
     fecha_matricula = models.DateField(auto_now_add=True)
     calificacion = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0), MaxValueValidator(10)])
 
     # 2.Layer Model level -- validador de campos
-    # metodo especial de Django para validaciones personalizadas en los modelos 
-    def clean(self):
+    # Cada regla de negocio es un método y REGLAS dice de qué campos depende. En una matrícula leída de la BD
+    # solo se comprueban las reglas con algún campo modificado (campo_modificado): cambiar la calificación no
+    # consulta el curso ni busca duplicados, y se puede calificar en un curso que ya comenzó o se desactivó.
+    # Una matrícula nueva las comprueba todas.
+    def _validar_curso(self):
+        # activo y fecha_inicio salen de la caché en proceso de cursos (cache_cursos.py), sin consultar la BD
+        from .cache_cursos import elegibilidad  # import local: cache_cursos importa este módulo
+        datos_curso = elegibilidad.datos_curso(self.curso_id) if self.curso_id is not None else None
+        if datos_curso is None:
+            activo, fecha_inicio = self.curso.activo, self.curso.fecha_inicio  # sin curso lanza el error de siempre
+        else:
+            activo, fecha_inicio = datos_curso
+
         # Regla 1: No permitir matrícula en curso inactivo
         # evalúa si el campo activo del curso está en False.
-        if not self.curso.activo:
+        if not activo:
             raise ValidationError("No se puede matricular en un curso inactivo.")
 
         # Regla 2: No permitir matrícula en curso ya iniciado
         # Compara la fecha de inicio del curso con la fecha actual.
-        if self.curso.fecha_inicio < timezone.now().date():
+        if fecha_inicio < timezone.now().date():
             raise ValidationError("No se puede matricular en un curso que ya comenzó.")
 
+    def _validar_duplicado(self):
         # Regla 3: Evitar matrícula duplicada (ya cubierta en unique_together)
         # Busca si ya existe una matrícula con el mismo estudiante y curso.
         # si ya hay matricula con ese primary key, lanza error
-        if Matricula.objects.filter(estudiante=self.estudiante, curso=self.curso).exclude(pk=self.pk).exists():
+        if Matricula.objects.filter(estudiante_id=self.estudiante_id, curso_id=self.curso_id).exclude(pk=self.pk).exists():
             raise ValidationError("El estudiante ya está matriculado en este curso.")
 
+    # (campos de los que depende, regla)
+    REGLAS = (
+        (('curso_id',), _validar_curso),
+        (('estudiante_id', 'curso_id'), _validar_duplicado),
+    )
+
+    def reglas_afectadas(self):
+        """Reglas que hay que comprobar: las que dependen de algún campo modificado desde que se leyó."""
+        return [regla for campos, regla in self.REGLAS if any(self.campo_modificado(campo) for campo in campos)]
+
+    # metodo especial de Django para validaciones personalizadas en los modelos
+    def clean(self):
+        for regla in self.reglas_afectadas():
+            regla(self)
+
     # 3.Validación a través de señal o hook de Django (App Layer / Signal Layer) 
      # señal logica previa a guardar, save de modelo sobreescrito .   
     def save(self, *args, **kwargs):
@@ -58,8 +194,141 @@ class Matricula(models.Model):
 
     # 1.Layer de Database #valida registros de BD
     # evita que guarden duplicados incluso si se hace una operacion de insert directo con SQL  
+    # Índices de los filtros del listado (filtros.py). estudiante (y estudiante + curso) usa el de unique_together;
+    # curso y estudiante se combinan con calificación o fecha, y también se filtra por calificación o fecha sola
     class Meta:
         unique_together = ('estudiante', 'curso') 
+        indexes = [
+            models.Index(fields=['curso', 'calificacion']),
+            models.Index(fields=['curso', 'fecha_matricula']),
+            models.Index(fields=['estudiante', 'fecha_matricula']),
+            models.Index(fields=['calificacion']),
+            models.Index(fields=['fecha_matricula']),
+        ]
+
+    def __str__(self):
+        return f"{self.estudiante.nombre} - {self.curso.titulo}"
+
+# Archivo de matrículas de cursos terminados o inactivos (tabla fría).
+# Misma forma que Matricula más el año de inicio del curso, indexado para leer por años sin recorrer todo el histórico.
+# Las vistas normales solo leen Matricula (tabla caliente).
+class MatriculaArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # conserva el id original de la matrícula
+    estudiante = models.ForeignKey(Estudiante, on_delete=models.CASCADE, related_name='matriculas_archivadas')
+    curso = models.ForeignKey(Curso, on_delete=models.CASCADE, related_name='matriculas_archivadas')
+    fecha_matricula = models.DateField()
+    calificacion = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0), MaxValueValidator(10)])
+    anio = models.PositiveSmallIntegerField(db_index=True)
+
+    # Sin unique_together: tras reactivar un curso el mismo estudiante puede volver a matricularse y archivarse
+    class Meta:
+        indexes = [models.Index(fields=['estudiante', 'curso'])]
+
+    def __str__(self):
+        return f"{self.estudiante.nombre} - {self.curso.titulo} ({self.anio})"
+
+
+# Bandeja de salida (outbox) de eventos para webhooks externos, p. ej. facturación.
+# Se escribe en la misma transacción que el cambio que la origina y la entrega la hace
+# en segundo plano el comando despachar_webhooks (academia_app/webhooks.py). Una fila por destino.
+class EventoSalida(models.Model):
+    tipo = models.CharField(max_length=50)
+    destino = models.URLField(max_length=500)
+    payload = models.JSONField()
+    creado = models.DateTimeField(auto_now_add=True)
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    entregado = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['entregado', 'proximo_intento'])]
+
+    def __str__(self):
+        return f"{self.tipo} -> {self.destino} ({'entregado' if self.entregado else f'{self.intentos} intentos'})"
+
+
+# Cola de trabajos de reportes masivos (expedientes de todos los estudiantes).
+# El trabajo se parte en fragmentos por rango de id de estudiante que los workers procesan por separado
+# (academia_app/reportes.py); un fragmento completado no se repite al reanudar tras una caída.
+ESTADOS_TRABAJO = [
+    ('pendiente', 'Pendiente'),
+    ('en_curso', 'En curso'),
+    ('completado', 'Completado'),
+    ('error', 'Error'),
+]
+
+
+class TrabajoReporte(models.Model):
+    FORMATOS = [('json', 'JSON'), ('csv', 'CSV')]
+
+    formato = models.CharField(max_length=4, choices=FORMATOS, default='json')
+    estado = models.CharField(max_length=12, choices=ESTADOS_TRABAJO, default='pendiente', db_index=True)
+    total = models.PositiveIntegerField(default=0)        # estudiantes a procesar
+    procesados = models.PositiveIntegerField(default=0)
+    archivo = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Reporte {self.id} ({self.formato}, {self.estado})"
+
+
+class FragmentoReporte(models.Model):
+    trabajo = models.ForeignKey(TrabajoReporte, on_delete=models.CASCADE, related_name='fragmentos')
+    numero = models.PositiveIntegerField()
+    desde_id = models.BigIntegerField()   # rango de ids de estudiante, ambos incluidos
+    hasta_id = models.BigIntegerField()
+    estado = models.CharField(max_length=12, choices=ESTADOS_TRABAJO, default='pendiente')
+    estudiantes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('trabajo', 'numero')
+        ordering = ['numero']
+
+    def __str__(self):
+        return f"Fragmento {self.numero} del reporte {self.trabajo_id}"
+
+
+# Borrado en segundo plano de un curso o estudiante con muchas matrículas (academia_app/borrado.py)
+class TrabajoBorrado(models.Model):
+    MODELOS = [('curso', 'Curso'), ('estudiante', 'Estudiante')]
+
+    modelo = models.CharField(max_length=10, choices=MODELOS)
+    objeto_id = models.BigIntegerField()
+    estado = models.CharField(max_length=12, choices=ESTADOS_TRABAJO, default='pendiente', db_index=True)
+    total = models.PositiveIntegerField(default=0)        # matrículas a borrar (estimado al encolar)
+    borradas = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Borrado de {self.modelo} {self.objeto_id} ({self.estado})"
+
+
+# Contadores mantenidos de filas: totales por modelo y por partición frecuente (academia_app/contadores.py).
+# Claves: "matricula", "matricula:curso_id:5", "curso:activo:True"... Se actualizan en la misma transacción que
+# el cambio y el comando reconciliar_contadores los corrige contra un COUNT real.
+class Contador(models.Model):
+    clave = models.CharField(max_length=100, unique=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.clave} = {self.valor}"
+
+
+# Respuestas de los POST con Idempotency-Key (academia_app/idempotencia.py). En la base de datos y no en memoria
+# para que un reintento que llega a otro worker vea la clave: la restricción única de `clave` hace que solo una
+# petición la reserve; las demás esperan su respuesta.
+class ClaveIdempotencia(models.Model):
+    clave = models.CharField(max_length=64, unique=True)   # sha256 de ruta, usuario e Idempotency-Key
+    huella = models.CharField(max_length=64)               # sha256 del cuerpo de la petición
+    estado = models.PositiveSmallIntegerField(null=True)   # código HTTP; None mientras la original está en curso
+    content_type = models.CharField(max_length=255, blank=True)
+    cuerpo = models.BinaryField(default=b'')
+    caduca = models.DateTimeField(db_index=True)
 
     def __str__(self):
-        return f"{self.estudiante.nombre} - {self.curso.titulo}"
\ No newline at end of file
+        return f"{self.clave[:12]} ({self.estado or 'en curso'})"
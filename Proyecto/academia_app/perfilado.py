@@ -0,0 +1,184 @@
+import cProfile
+import json
+import pstats
+import random
+import time
+import uuid
+from contextlib import ExitStack
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import connections
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+# Perfilado de peticiones concretas en producción.
+#  - A demanda: ?_profile=1 por un usuario staff (sesión) o con la cabecera X-Perfil-Token = PERFILADO_TOKEN.
+#    La respuesta es la normal más la cabecera X-Perfil con el id del perfil.
+#  - Muestreo: una fracción PERFILADO_MUESTREO de las peticiones se perfila sin avisar al cliente.
+# Cada perfil se guarda en PERFILADO_DIR (<id>.json con el resumen y <id>.prof para pstats/snakeviz)
+# y se consulta en GET /api/perfiles/. El tiempo se reparte por el tiempo propio de cada función
+# según su módulo, así las partes suman el total sin contar nada dos veces.
+
+PARAMETRO = '_profile'
+
+# parte -> fragmentos de ruta (o del nombre de una función interna) que la identifican; se comprueban en orden
+PARTES = (
+    ('orm', ('/django/db/', 'sqlite3', 'psycopg')),
+    ('serializacion', ('/rest_framework/serializers.py', '/rest_framework/fields.py', '/rest_framework/relations.py',
+                       '/rest_framework/utils/serializer_helpers.py', '/academia_app/serializers.py')),
+    ('renderizado', ('/rest_framework/renderers.py', '/rest_framework/utils/encoders.py', '/django/template/',
+                     '/json/', '_json')),
+    ('middleware', ('/django/middleware/', '/corsheaders/', '/whitenoise/', '/django/contrib/sessions/',
+                    '/django/contrib/auth/middleware.py', '/django/contrib/messages/', '/academia_app/perfilado.py')),
+)
+
+
+def _parte(funcion):
+    fichero, _, nombre = funcion
+    texto = (fichero if fichero != '~' else nombre).replace('\\', '/')
+    for parte, fragmentos in PARTES:
+        if any(fragmento in texto for fragmento in fragmentos):
+            return parte
+    return 'vista_y_otros'
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 2)
+
+
+def resumir(perfil, top=None):
+    """Reparto del tiempo por partes y funciones con más tiempo acumulado de un cProfile.Profile."""
+    estadisticas = pstats.Stats(perfil)
+    reparto = {parte: 0.0 for parte, _ in PARTES}
+    reparto['vista_y_otros'] = 0.0
+    for funcion, (_, llamadas, propio, acumulado, _) in estadisticas.stats.items():
+        reparto[_parte(funcion)] += propio
+    funciones = sorted(estadisticas.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return {
+        "reparto_ms": {parte: _ms(segundos) for parte, segundos in reparto.items()},
+        "funciones": [
+            {
+                "funcion": pstats.func_std_string(funcion),
+                "llamadas": llamadas,
+                "propio_ms": _ms(propio),
+                "acumulado_ms": _ms(acumulado),
+            }
+            for funcion, (_, llamadas, propio, acumulado, _) in funciones[:top or settings.PERFILADO_TOP_FUNCIONES]
+        ],
+    }
+
+
+def _carpeta():
+    return Path(settings.PERFILADO_DIR)
+
+
+def guardar(resumen, perfil):
+    carpeta = _carpeta()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    perfil.dump_stats(carpeta / f"{resumen['id']}.prof")
+    temporal = carpeta / f"{resumen['id']}.json.tmp"
+    temporal.write_text(json.dumps(resumen, ensure_ascii=False), encoding='utf-8')
+    temporal.replace(carpeta / f"{resumen['id']}.json")
+    # Solo se conservan los últimos PERFILADO_MAX_PERFILES
+    for antiguo in sorted(carpeta.glob('*.json'))[:-settings.PERFILADO_MAX_PERFILES]:
+        antiguo.unlink(missing_ok=True)
+        antiguo.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def listar():
+    """Resúmenes de los perfiles guardados (sin la lista de funciones), los más recientes primero."""
+    perfiles = []
+    for ruta in sorted(_carpeta().glob('*.json'), reverse=True):
+        try:
+            resumen = json.loads(ruta.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue  # borrado o a medio escribir por otro proceso
+        resumen.pop('funciones', None)
+        perfiles.append(resumen)
+    return perfiles
+
+
+def ruta_perfil(perfil_id, extension='json'):
+    """Ruta del fichero del perfil o None si no existe (el id se valida para no salir de la carpeta)."""
+    if not perfil_id.replace('-', '').isalnum():
+        return None
+    ruta = _carpeta() / f"{perfil_id}.{extension}"
+    return ruta if ruta.is_file() else None
+
+
+def leer(perfil_id):
+    ruta = ruta_perfil(perfil_id)
+    return json.loads(ruta.read_text(encoding='utf-8')) if ruta else None
+
+
+def _autorizado(request):
+    token = settings.PERFILADO_TOKEN
+    if token and constant_time_compare(request.headers.get('X-Perfil-Token', ''), token):
+        return True
+    # Este middleware va el primero (para medir también al resto), antes de SessionMiddleware:
+    # se carga aquí la sesión solo para comprobar que el usuario es staff
+    motor = import_module(settings.SESSION_ENGINE)
+    request.session = motor.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    return get_user(request).is_staff
+
+
+class PerfiladorMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        a_demanda = request.GET.get(PARAMETRO) == '1'
+        if a_demanda:
+            if not _autorizado(request):
+                return self.get_response(request)
+        elif not (settings.PERFILADO_MUESTREO and random.random() < settings.PERFILADO_MUESTREO):
+            return self.get_response(request)
+        return self._perfilar(request, a_demanda)
+
+    def _perfilar(self, request, a_demanda):
+        consultas = []
+
+        def medir_consulta(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                consultas.append(time.perf_counter() - inicio)
+
+        perfil = cProfile.Profile()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(medir_consulta))
+            inicio = time.perf_counter()
+            try:
+                perfil.enable()
+            except ValueError:
+                return self.get_response(request)  # ya hay otro perfilador activo en este hilo
+            try:
+                respuesta = self.get_response(request)
+            finally:
+                perfil.disable()
+            total = time.perf_counter() - inicio
+
+        resumen = {
+            "id": f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}",
+            "fecha": timezone.now().isoformat(),
+            "metodo": request.method,
+            "ruta": request.get_full_path(),
+            "estado": respuesta.status_code,
+            "muestreado": not a_demanda,
+            "total_ms": _ms(total),
+            "consultas": len(consultas),
+            "consultas_ms": _ms(sum(consultas)),
+            **resumir(perfil),
+        }
+        try:
+            guardar(resumen, perfil)
+        except OSError:
+            return respuesta  # sin disco para el perfil la petición sigue funcionando
+        if a_demanda:
+            respuesta['X-Perfil'] = resumen['id']
+        return respuesta
@@ -0,0 +1,200 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Avg, F, Max, Min, Q
+from django.utils import timezone
+
+from .academias import alias_actual
+from .models import Estudiante, FragmentoReporte, Matricula, TrabajoReporte
+
+# Worker de la cola de reportes masivos: el expediente (nombre, cursos, media) de todos los estudiantes.
+# Cada fragmento se calcula con dos consultas agregadas sobre su rango de ids y se escribe en su propio
+# fichero; al terminar todos se unen en el fichero final. Los fragmentos se pueden repartir en procesos.
+
+CABECERA_CSV = ['id', 'nombre', 'email', 'cursos', 'media_calificacion']
+
+
+def _carpeta(trabajo_id):
+    # Los ids de trabajo se repiten entre academias: cada una tiene su subcarpeta
+    alias = alias_actual()
+    base = Path(settings.REPORTES_DIR) if alias == DEFAULT_DB_ALIAS else Path(settings.REPORTES_DIR) / alias
+    return base / f"trabajo_{trabajo_id}"
+
+
+def _fichero_fragmento(fragmento, formato):
+    return _carpeta(fragmento.trabajo_id) / f"fragmento_{fragmento.numero:05d}.{formato}"
+
+
+def _escribir_atomico(ruta, contenido):
+    # Escribe en un temporal y renombra: tras una caída no queda nunca un fichero a medias
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_suffix(ruta.suffix + '.tmp')
+    temporal.write_text(contenido, encoding='utf-8')
+    os.replace(temporal, ruta)
+
+
+def expedientes(desde_id, hasta_id):
+    """Expedientes de los estudiantes con id en [desde_id, hasta_id], en dos consultas."""
+    estudiantes = (
+        Estudiante.objects.filter(id__range=(desde_id, hasta_id))
+        .annotate(media=Avg('matricula__calificacion'))
+        .order_by('id')
+        .values_list('id', 'nombre', 'email', 'media')
+    )
+    titulos = (
+        Matricula.objects.filter(estudiante_id__gte=desde_id, estudiante_id__lte=hasta_id)
+        .order_by('estudiante_id', 'id')
+        .values_list('estudiante_id', 'curso__titulo')
+    )
+    cursos = {estudiante_id: [t for _, t in filas] for estudiante_id, filas in groupby(titulos, key=lambda f: f[0])}
+    for id_, nombre, email, media in estudiantes:
+        yield {
+            "id": id_,
+            "nombre": nombre,
+            "email": email,
+            "cursos": cursos.get(id_, []),
+            "media_calificacion": round(float(media), 2) if media is not None else None,
+        }
+
+
+def _serializar(filas, formato):
+    if formato == 'json':
+        return ",\n".join(json.dumps(fila, ensure_ascii=False) for fila in filas)
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    for fila in filas:
+        escritor.writerow([fila['id'], fila['nombre'], fila['email'], '; '.join(fila['cursos']), fila['media_calificacion']])
+    return salida.getvalue()
+
+
+def procesar_fragmento(fragmento_id):
+    """Genera el fichero de un fragmento y suma su avance al trabajo. Devuelve los estudiantes procesados."""
+    fragmento = FragmentoReporte.objects.select_related('trabajo').get(pk=fragmento_id)
+    if fragmento.estado == 'completado':
+        return 0
+    FragmentoReporte.objects.filter(pk=fragmento.pk).update(estado='en_curso')
+    filas = list(expedientes(fragmento.desde_id, fragmento.hasta_id))
+    _escribir_atomico(_fichero_fragmento(fragmento, fragmento.trabajo.formato), _serializar(filas, fragmento.trabajo.formato))
+    with transaction.atomic(using=router.db_for_write(FragmentoReporte)):
+        # Condicional: si otro worker reclamó el trabajo por caducado y ya completó este fragmento, no se suma dos veces
+        if not FragmentoReporte.objects.filter(pk=fragmento.pk).exclude(estado='completado').update(
+                estado='completado', estudiantes=len(filas)):
+            return 0
+        # update() no toca auto_now; actualizado es además el latido que mira _reclamar
+        TrabajoReporte.objects.filter(pk=fragmento.trabajo_id).update(
+            procesados=F('procesados') + len(filas), actualizado=timezone.now())
+    return len(filas)
+
+
+def _procesar_en_hijo(fragmento_id):
+    # Cada proceso hijo abre su propia conexión a la base de datos
+    try:
+        return procesar_fragmento(fragmento_id)
+    finally:
+        connections.close_all()
+
+
+def _preparar(trabajo):
+    # Parte el rango de ids en fragmentos; solo la primera vez (al reanudar ya existen)
+    if trabajo.fragmentos.exists():
+        return
+    limites = Estudiante.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+    tamano = settings.REPORTES_TAMANO_FRAGMENTO
+    fragmentos = []
+    if limites['minimo'] is not None:
+        for numero, desde in enumerate(range(limites['minimo'], limites['maximo'] + 1, tamano)):
+            fragmentos.append(FragmentoReporte(trabajo=trabajo, numero=numero, desde_id=desde, hasta_id=desde + tamano - 1))
+    with transaction.atomic(using=router.db_for_write(FragmentoReporte)):
+        FragmentoReporte.objects.bulk_create(fragmentos)
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            total=Estudiante.objects.count(), procesados=0, actualizado=timezone.now())
+
+
+def _unir(trabajo):
+    # Fichero final: cabecera/corchetes más los fragmentos en orden, leídos de uno en uno
+    ruta = _carpeta(trabajo.id) / f"reporte_{trabajo.id}.{trabajo.formato}"
+    temporal = ruta.with_suffix(ruta.suffix + '.tmp')
+    with open(temporal, 'w', encoding='utf-8', newline='') as salida:
+        if trabajo.formato == 'csv':
+            csv.writer(salida).writerow(CABECERA_CSV)
+        else:
+            salida.write('[\n')
+        primero = True
+        for fragmento in trabajo.fragmentos.all():
+            contenido = _fichero_fragmento(fragmento, trabajo.formato).read_text(encoding='utf-8')
+            if not contenido:
+                continue
+            if trabajo.formato == 'json' and not primero:
+                salida.write(',\n')
+            salida.write(contenido)
+            primero = False
+        if trabajo.formato == 'json':
+            salida.write('\n]\n')
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def procesar_trabajo(trabajo, procesos=1):
+    """
+    Procesa los fragmentos pendientes del trabajo (en paralelo si procesos > 1) y genera el fichero final.
+    El trabajo tiene que estar reclamado por este worker (_reclamar); cualquier fallo lo deja en error.
+    """
+    try:
+        _preparar(trabajo)
+        # Fragmentos en curso de un trabajo recién reclamado: los dejó a medias un worker que se cayó o que
+        # dejó de dar señales durante REPORTES_CADUCIDAD segundos
+        trabajo.fragmentos.filter(estado='en_curso').update(estado='pendiente')
+        pendientes = list(trabajo.fragmentos.exclude(estado='completado').values_list('id', flat=True))
+        if procesos > 1 and len(pendientes) > 1:
+            connections.close_all()  # no heredar la conexión abierta en los procesos hijos
+            with ProcessPoolExecutor(max_workers=procesos, mp_context=get_context('fork')) as pool:
+                list(pool.map(_procesar_en_hijo, pendientes))
+        else:
+            for fragmento_id in pendientes:
+                procesar_fragmento(fragmento_id)
+        ruta = _unir(trabajo)
+    except Exception as e:
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(estado='error', error=str(e), actualizado=timezone.now())
+        raise
+    TrabajoReporte.objects.filter(pk=trabajo.pk).update(estado='completado', archivo=str(ruta), actualizado=timezone.now())
+
+
+def _reclamables(ahora):
+    caducado = ahora - timedelta(seconds=settings.REPORTES_CADUCIDAD)
+    return Q(estado='pendiente') | Q(estado='en_curso', actualizado__lt=caducado)
+
+
+def _reclamar(trabajo_id):
+    # UPDATE condicional: un trabajo pendiente, o uno en curso que lleva REPORTES_CADUCIDAD segundos sin avanzar
+    # (su worker se cayó). Si dos workers van a por el mismo, solo a uno le cambia la fila
+    ahora = timezone.now()
+    return TrabajoReporte.objects.filter(_reclamables(ahora), pk=trabajo_id).update(estado='en_curso', actualizado=ahora) == 1
+
+
+def procesar_cola(procesos=1):
+    """
+    Procesa por orden de llegada los trabajos pendientes y los interrumpidos (en curso sin avanzar desde hace
+    REPORTES_CADUCIDAD segundos). Devuelve cuántos ha procesado este worker.
+    """
+    procesados = 0
+    while True:
+        trabajo_id = (TrabajoReporte.objects.filter(_reclamables(timezone.now()))
+                      .order_by('id').values_list('id', flat=True).first())
+        if trabajo_id is None:
+            return procesados
+        if not _reclamar(trabajo_id):
+            continue  # se lo ha llevado otro worker
+        try:
+            procesar_trabajo(TrabajoReporte.objects.get(pk=trabajo_id), procesos=procesos)
+        except Exception:
+            pass  # el error queda guardado en el trabajo; seguimos con el siguiente
+        procesados += 1
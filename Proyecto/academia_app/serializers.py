@@ -1,6 +1,8 @@
+import copy
+
 from django.core.exceptions import ValidationError
 from rest_framework import serializers
-from .models import Estudiante, Curso, Matricula
+from .models import Estudiante, Curso, Matricula, MatriculaArchivada, TrabajoBorrado, TrabajoReporte
 
 class EstudianteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,17 +20,24 @@ class MatriculaSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['fecha_matricula']  # protege fecha, que no sea modificable con POST o PUT. No se va a incluir en validated_data aunque venga en request.data.
         #ignora el campo matricula si el user lo envia. Usa el auto_now_add=True en vez del enviado ha hacer serializer.save.
+        # Sin el UniqueTogetherValidator de DRF: el duplicado lo comprueba la regla 3 de Matricula.clean() solo si
+        # cambian estudiante o curso (el de DRF repetía la consulta y en un PATCH leía estudiante y curso de la BD)
+        validators = []
 
         # sobreescritura de validate de DRF o hook/gancho que forma parte del ciclo de vida del serializer. 
         # Permite validacion personalizada sobre objetos (varios campos a la vez)
         # integra el clean al flujo validacion de DRF
     def validate(self, data):   #drf devuelve un 400 Bad request mediante el def clean.
+        if self.instance is not None:
+            # Actualización (PUT o PATCH parcial): copia de la matrícula leída con los datos recibidos encima.
+            # Conserva pk y los valores originales, así clean() sabe qué campos cambian y solo comprueba sus
+            # reglas; la instancia real no se toca hasta serializer.save().
+            instance = copy.copy(self.instance)
+            for campo, valor in data.items():
+                setattr(instance, campo, valor)
+        else:
             # Crear una instancia temporal con los datos recibidos en DRF serializer.is_valid(campo o objeto) que llama internamente a este validate.
-        instance = Matricula(**data)
-            #esta instancia no tiene .pk , django trata como nueva instancia. En clean al filtrar matricula puede fallar actualizacion. 
-            # pk es necesario para diferenciar crear de actualizar en el clean. Conservamos antes de pasar al clean. Evita FALSOS POSITIVOS. 
-        if self.instance:
-            instance.pk = self.instance.pk
+            instance = Matricula(**data)
         try:
             instance.clean()  # Ejecuta reglas de negocio definidas en el modelo
         except ValidationError as e:
@@ -40,3 +49,35 @@ class MatriculaSerializer(serializers.ModelSerializer):
         return data
         #validate daba un string plano, y DRF espera un dict con listas de errores por campo.
         # eso lanza un AttributeError, porque e no tiene message_dict si el error fue creado con un string.
+
+
+# Solo lectura: las matrículas archivadas no se crean ni se editan desde la API
+class MatriculaArchivadaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MatriculaArchivada
+        fields = '__all__'
+        read_only_fields = ['id', 'estudiante', 'curso', 'fecha_matricula', 'calificacion', 'anio']
+
+
+# Estado de un trabajo de reporte masivo; solo se elige el formato al crearlo
+class TrabajoReporteSerializer(serializers.ModelSerializer):
+    progreso = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TrabajoReporte
+        fields = ['id', 'formato', 'estado', 'total', 'procesados', 'progreso', 'error', 'creado', 'actualizado']
+        read_only_fields = ['estado', 'total', 'procesados', 'error', 'creado', 'actualizado']
+
+    def get_progreso(self, trabajo):
+        # Porcentaje completado (0-100)
+        if trabajo.estado == 'completado':
+            return 100
+        return round(100 * trabajo.procesados / trabajo.total, 1) if trabajo.total else 0
+
+
+# Estado de un borrado en segundo plano de un curso o estudiante con muchas matrículas
+class TrabajoBorradoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrabajoBorrado
+        fields = ['id', 'modelo', 'objeto_id', 'estado', 'total', 'borradas', 'error', 'creado', 'actualizado']
+        read_only_fields = fields
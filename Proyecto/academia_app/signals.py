@@ -0,0 +1,135 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import contadores
+from .autocompletado import indice as autocompletado
+from .borrado import matriculas_eliminadas
+from .cache_cursos import elegibilidad
+from .eventos import Evento, publicar_al_confirmar, publicar_varios_al_confirmar
+from .models import Curso, Estudiante, Matricula, registrar_eliminaciones
+from .webhooks import encolar_evento
+
+# Receptores de señales de los modelos. Se conectan en AppConfig.ready().
+
+
+# Borrado: deja una marca con seq para la sincronización incremental.
+# post_delete se ejecuta dentro de la transacción del borrado (también en cascada).
+@receiver(post_delete, sender=Estudiante)
+@receiver(post_delete, sender=Curso)
+@receiver(post_delete, sender=Matricula)
+def marcar_eliminacion(sender, instance, using, **kwargs):
+    seq = registrar_eliminaciones(sender, [instance.pk], using=using)
+    if sender is Matricula:
+        publicar_al_confirmar(seq, 'matricula.eliminada', instance.curso_id, {
+            "matricula": instance.pk, "estudiante": instance.estudiante_id, "curso": instance.curso_id,
+        }, using=using)
+
+
+# Borrado por lotes de las matrículas de un curso o estudiante (borrado.py) y archivo (archivo.py): lo mismo que
+# hacen los post_delete de Matricula (marca de borrado, evento SSE y contadores), una vez por lote y no por fila
+@receiver(matriculas_eliminadas, sender=Matricula)
+def registrar_lote_eliminado(sender, filas, using, **kwargs):
+    ultimo = registrar_eliminaciones(Matricula, [id_ for id_, _, _ in filas], using=using)
+    primero = ultimo - len(filas) + 1
+    publicar_varios_al_confirmar([
+        Evento(primero + i, 'matricula.eliminada', curso_id, {
+            "matricula": id_, "estudiante": estudiante_id, "curso": curso_id,
+        })
+        for i, (id_, estudiante_id, curso_id) in enumerate(filas)
+    ], using=using)
+    contadores.ajustar(contadores.deltas_creacion(
+        Matricula, [{'estudiante_id': estudiante_id, 'curso_id': curso_id} for _, estudiante_id, curso_id in filas], signo=-1
+    ), using=using)
+
+
+# Eventos SSE de matrículas: alta y cambio de calificación
+@receiver(post_save, sender=Matricula)
+def publicar_matricula(sender, instance, created, using, **kwargs):
+    if created:
+        tipo = 'matricula.creada'
+    elif instance.campo_modificado('calificacion'):
+        tipo = 'matricula.calificada'
+    else:
+        return
+    publicar_al_confirmar(instance.seq, tipo, instance.curso_id, {
+        "matricula": instance.pk, "estudiante": instance.estudiante_id, "curso": instance.curso_id,
+        "calificacion": instance.calificacion,
+    }, using=using)
+
+
+# Eventos SSE de cursos: solo cuando se activa o desactiva
+@receiver(post_save, sender=Curso)
+def publicar_activacion_curso(sender, instance, created, using, **kwargs):
+    if created or not instance.campo_modificado('activo'):
+        return
+    publicar_al_confirmar(instance.seq, 'curso.activacion', instance.pk, {
+        "curso": instance.pk, "activo": instance.activo,
+    }, using=using)
+
+
+# Outbox para facturación: se escribe dentro de la transacción de Matricula.save()
+@receiver(post_save, sender=Matricula)
+def encolar_matricula_creada(sender, instance, created, using, **kwargs):
+    if not created:
+        return
+    encolar_evento('matricula.creada', {
+        "matricula": instance.pk, "estudiante": instance.estudiante_id, "curso": instance.curso_id,
+        "fecha_matricula": instance.fecha_matricula.isoformat(),
+    }, using=using)
+
+
+# Caché de elegibilidad de cursos: se invalida al guardar y otra vez al confirmar,
+# para que una lectura concurrente no vuelva a guardar el valor anterior al commit
+@receiver(post_save, sender=Curso)
+@receiver(post_delete, sender=Curso)
+def invalidar_cache_curso(sender, instance, using, **kwargs):
+    curso_id = instance.pk
+    cache = elegibilidad.para(using)
+    cache.invalidar(curso_id)
+    transaction.on_commit(lambda: cache.invalidar(curso_id), using=using)
+
+
+# Contadores de filas: se ajustan en la misma transacción que el alta, el cambio de partición o el borrado
+@receiver(post_save, sender=Estudiante)
+@receiver(post_save, sender=Curso)
+@receiver(post_save, sender=Matricula)
+def contar_guardado(sender, instance, created, using, **kwargs):
+    if created:
+        contadores.ajustar(contadores.deltas_creacion(sender, [instance]), using=using)
+        return
+    # Solo se puede mover de partición si se conoce el valor leído; si no, lo arregla la reconciliación
+    originales = instance.__dict__.get('_originales') or {}
+    deltas = {}
+    for attname in contadores.PARTICIONES[sender]:
+        if attname in originales and originales[attname] != getattr(instance, attname):
+            deltas[contadores.clave(sender, attname, originales[attname])] = -1
+            deltas[contadores.clave(sender, attname, getattr(instance, attname))] = 1
+    contadores.ajustar(deltas, using=using)
+
+
+@receiver(post_delete, sender=Estudiante)
+@receiver(post_delete, sender=Curso)
+@receiver(post_delete, sender=Matricula)
+def contar_borrado(sender, instance, using, **kwargs):
+    contadores.ajustar(contadores.deltas_creacion(sender, [instance], signo=-1), using=using)
+
+
+# Índice de autocompletado: se actualiza al confirmar, así un alta que se deshace no llega a sugerirse
+@receiver(post_save, sender=Estudiante)
+@receiver(post_save, sender=Curso)
+def indexar_autocompletado(sender, instance, using, **kwargs):
+    indice = autocompletado.para(using)
+    if sender is Estudiante:
+        cambio = ('poner', 'estudiante', instance.pk, instance.nombre, instance.email)
+    else:
+        cambio = ('poner', 'curso', instance.pk, instance.titulo, '')
+    transaction.on_commit(lambda: indice.cambiar(*cambio), using=using)
+
+
+@receiver(post_delete, sender=Estudiante)
+@receiver(post_delete, sender=Curso)
+def desindexar_autocompletado(sender, instance, using, **kwargs):
+    indice = autocompletado.para(using)
+    cambio = ('quitar', 'estudiante' if sender is Estudiante else 'curso', instance.pk)
+    transaction.on_commit(lambda: indice.cambiar(*cambio), using=using)
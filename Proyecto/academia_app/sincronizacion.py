@@ -0,0 +1,44 @@
+from drf_yasg import openapi
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Eliminacion, seq_actual
+
+# Sincronización incremental: GET /<recurso>/?since=<seq> devuelve solo lo que cambió después de ese seq.
+# El cliente guarda el "seq" de la respuesta y lo envía en la siguiente llamada.
+
+parametro_since = openapi.Parameter(
+    'since',
+    openapi.IN_QUERY,
+    description="Devuelve solo los cambios posteriores a este número de secuencia, más los ids borrados "
+                "y el nuevo seq a usar en la siguiente llamada. Ej: 0 para la primera sincronización",
+    type=openapi.TYPE_INTEGER,
+    required=False
+)
+
+
+class SincronizacionMixin:
+    """Añade el modo ?since=<seq> al listado de un ModelViewSet de un ModeloSincronizado."""
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is None:
+            return super().list(request, *args, **kwargs)
+        if not (since.isascii() and since.isdigit()):  # solo 0-9 ('²' también es un dígito para isdigit())
+            raise ValidationError({"since": ["Debe ser un entero mayor o igual que 0."]})
+        since = int(since)
+
+        # La marca de agua se lee antes que los cambios: lo que se confirme después llegará en la siguiente llamada
+        hasta = seq_actual()
+        queryset = self.get_queryset()
+        cambios = queryset.filter(seq__gt=since, seq__lte=hasta).order_by('seq')
+        eliminados = (
+            Eliminacion.objects.filter(modelo=queryset.model._meta.model_name, seq__gt=since, seq__lte=hasta)
+            .order_by('seq')
+            .values_list('objeto_id', flat=True)
+        )
+        return Response({
+            "seq": hasta,
+            "cambios": self.get_serializer(cambios, many=True).data,
+            "eliminados": list(eliminados),
+        })
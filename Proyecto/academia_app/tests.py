@@ -1,5 +1,20 @@
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
-from django.test import TestCase, TransactionTestCase
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
 from django.utils import timezone
@@ -7,7 +22,13 @@ from datetime import date, timedelta
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from decimal import Decimal
-from .models import Estudiante, Curso, Matricula
+from .cache_cursos import elegibilidad
+from .eventos import Difusor, Evento, difusor
+from . import contadores, reportes
+from .models import Estudiante, Curso, Matricula, MatriculaArchivada, EventoSalida, TrabajoReporte, FragmentoReporte, ClaveIdempotencia
+from .contadores import PaginadorEstimado
+from .reportes import procesar_cola
+from .webhooks import despachar_pendientes
 from .serializers import EstudianteSerializer, CursoSerializer, MatriculaSerializer
 
 # TestCase es la clase de test mas comun y sencilla. Usa transacciones para aislar cada test y limpiar la BD.
@@ -704,5 +725,2005 @@ class IntegrationTest(APITestCase):
         self.assertEqual(response.data[0]['nombre'], 'Test Student')
 
 
+
+class ImportacionEstudiantesTest(APITestCase):
+    """Test cases for the bulk student import (command and endpoint)"""
+
+    def setUp(self):
+        """Set up an existing student to be upserted"""
+        Estudiante.objects.create(nombre='Nombre Antiguo', email='existente@test.com')
+
+    def test_import_csv_endpoint_upserts_by_email(self):
+        """Test POST /estudiantes/importar/ creates new rows, updates existing ones and reports bad rows"""
+        contenido = (
+            "nombre,email\n"
+            "Nuevo Alumno,nuevo@test.com\n"
+            "Nombre Nuevo,existente@test.com\n"
+            "Sin Email,no-es-un-email\n"
+        ).encode('utf-8')
+        fichero = SimpleUploadedFile('alumnos.csv', contenido, content_type='text/csv')
+        response = self.client.post('/api/estudiantes/importar/', {'fichero': fichero}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['procesadas'], 3)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(response.data['actualizados'], 1)
+        self.assertEqual(response.data['errores'][0]['linea'], 4)
+        self.assertEqual(Estudiante.objects.get(email='existente@test.com').nombre, 'Nombre Nuevo')
+        self.assertTrue(Estudiante.objects.filter(email='nuevo@test.com').exists())
+
+    def test_import_without_file_returns_400(self):
+        """Test POST /estudiantes/importar/ without file"""
+        response = self.client.post('/api/estudiantes/importar/', {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_non_utf8_file_returns_400(self):
+        """Test that a Latin-1 CSV is rejected with a 400 naming the expected encoding"""
+        contenido = 'nombre,email\nJosé Núñez,jose.latin1@test.com\n'.encode('latin-1')
+        fichero = SimpleUploadedFile('latin1.csv', contenido, content_type='text/csv')
+        response = self.client.post('/api/estudiantes/importar/', {'fichero': fichero}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('UTF-8', response.data['error'])
+        self.assertEqual(response.data['creados'], 0)
+        self.assertFalse(Estudiante.objects.filter(email='jose.latin1@test.com').exists())
+
+    def test_import_ndjson_command_in_chunks(self):
+        """Test the importar_estudiantes management command with NDJSON and small chunks"""
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False, encoding='utf-8') as f:
+            for i in range(5):
+                f.write(json.dumps({'nombre': f'Alumno {i}', 'email': f'alumno{i}@test.com'}) + '\n')
+            f.write('{roto\n')
+        self.addCleanup(os.remove, f.name)
+
+        salida = StringIO()
+        call_command('importar_estudiantes', f.name, '--lote', '2', stdout=salida, stderr=StringIO())
+
+        self.assertEqual(Estudiante.objects.filter(email__startswith='alumno').count(), 5)
+        self.assertIn('5 creados', salida.getvalue())
+        self.assertIn('1 errores', salida.getvalue())
+
+
+class CalificacionesCursoTest(APITestCase):
+    """Test cases for POST /cursos/{id}/calificaciones/ batch grade entry"""
+
+    def setUp(self):
+        """Set up a course with enrolled students"""
+        self.curso = Curso.objects.create(
+            titulo='Álgebra',
+            descripcion='Curso de álgebra',
+            fecha_inicio=date.today() + timedelta(days=10)
+        )
+        self.estudiantes = [
+            Estudiante.objects.create(nombre=f'Alumno {i}', email=f'alumno{i}@test.com') for i in range(3)
+        ]
+        for estudiante in self.estudiantes:
+            Matricula.objects.create(estudiante=estudiante, curso=self.curso)
+        self.url = f'/api/cursos/{self.curso.id}/calificaciones/'
+
+    def test_grades_saved_in_one_update(self):
+        """Test that all grades are written and stored"""
+        data = {str(e.id): nota for e, nota in zip(self.estudiantes, ['8.5', 6, None])}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['actualizadas'], 3)
+        notas = dict(Matricula.objects.filter(curso=self.curso).values_list('estudiante_id', 'calificacion'))
+        self.assertEqual(notas[self.estudiantes[0].id], Decimal('8.5'))
+        self.assertEqual(notas[self.estudiantes[1].id], Decimal('6'))
+        self.assertIsNone(notas[self.estudiantes[2].id])
+
+    def test_invalid_grade_rejects_whole_batch(self):
+        """Test that an out of range grade or unknown student saves nothing"""
+        otro = Estudiante.objects.create(nombre='No Matriculado', email='fuera@test.com')
+        data = {str(self.estudiantes[0].id): 7, str(self.estudiantes[1].id): 11, str(otro.id): 5}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.estudiantes[1].id), response.data['error'])
+        self.assertIn(str(otro.id), response.data['error'])
+        self.assertFalse(Matricula.objects.filter(curso=self.curso, calificacion__isnull=False).exists())
+
+    def test_out_of_range_ids_and_boolean_grades_are_rejected(self):
+        """Test that huge or non-ASCII student ids and true/false grades are a 400 that saves nothing"""
+        demasiado = str(2 ** 63)
+        data = {demasiado: 5, '٣': 5, str(self.estudiantes[0].id): True, str(self.estudiantes[1].id): False}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['error']), set(data))
+        self.assertFalse(Matricula.objects.filter(curso=self.curso, calificacion__isnull=False).exists())
+
+
+class ArchivoMatriculasTest(APITestCase):
+    """Test cases for the enrollment archive (hot/cold split)"""
+
+    def setUp(self):
+        """Set up enrollments in a finished course and in an upcoming one"""
+        Matricula.objects.all().delete()
+        self.estudiante = Estudiante.objects.create(nombre='Marta Vidal', email='marta@test.com')
+        self.curso_futuro = Curso.objects.create(
+            titulo='Django', descripcion='Curso de Django', fecha_inicio=date.today() + timedelta(days=10)
+        )
+        self.curso_viejo = Curso.objects.create(
+            titulo='Cobol', descripcion='Curso de Cobol', fecha_inicio=date.today() + timedelta(days=10)
+        )
+        Matricula.objects.create(estudiante=self.estudiante, curso=self.curso_futuro)
+        Matricula.objects.create(estudiante=self.estudiante, curso=self.curso_viejo, calificacion=Decimal('7.5'))
+        # El curso empezó hace dos años (se cambia después de matricular para saltar la validación)
+        Curso.objects.filter(pk=self.curso_viejo.pk).update(fecha_inicio=date.today() - timedelta(days=730))
+
+    def test_archive_moves_finished_course_enrollments(self):
+        """Test that archivar_matriculas moves only enrollments of finished courses"""
+        call_command('archivar_matriculas', '--lote', '1', stdout=StringIO())
+
+        self.assertEqual(list(Matricula.objects.values_list('curso_id', flat=True)), [self.curso_futuro.id])
+        archivada = MatriculaArchivada.objects.get()
+        self.assertEqual(archivada.curso, self.curso_viejo)
+        self.assertEqual(archivada.calificacion, Decimal('7.5'))
+        self.assertEqual(archivada.anio, (date.today() - timedelta(days=730)).year)
+
+    def test_reenrollment_after_reactivation_is_archived_again(self):
+        """Test that a re-enrollment in a reactivated course is archived next to the old one, with its SSE event"""
+        from .archivo import archivar_matriculas
+        curso = Curso.objects.create(titulo='Fortran', descripcion='Curso de Fortran',
+                                     fecha_inicio=date.today() + timedelta(days=10))
+        primera = Matricula.objects.create(estudiante=self.estudiante, curso=curso)
+        curso.activo = False
+        curso.save()
+        archivar_matriculas()
+        curso.activo = True
+        curso.save()
+        segunda = Matricula.objects.create(estudiante=self.estudiante, curso=curso, calificacion=Decimal('9'))
+        curso.activo = False
+        curso.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archivar_matriculas(), 1)
+
+        archivadas = MatriculaArchivada.objects.filter(estudiante=self.estudiante, curso=curso)
+        self.assertEqual(sorted(archivadas.values_list('id', flat=True)), [primera.id, segunda.id])
+        self.assertEqual(archivadas.get(pk=segunda.id).calificacion, Decimal('9'))
+        self.assertFalse(Matricula.objects.filter(curso=curso).exists())
+        eventos = [e.datos['matricula'] for e in difusor._historial if e.tipo == 'matricula.eliminada']
+        self.assertEqual(eventos[-1], segunda.id)
+        self.assertEqual(contadores.reconciliar(corregir=False), [])
+
+    def test_list_reads_hot_table_unless_include_archived(self):
+        """Test GET /matriculas/ with and without include_archived"""
+        call_command('archivar_matriculas', stdout=StringIO())
+
+        response = self.client.get('/api/matriculas/')
+        self.assertEqual(len(response.data), 1)
+
+        response = self.client.get('/api/matriculas/?include_archived=true&search=Cobol')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['curso'], self.curso_viejo.id)
+
+        response = self.client.get(f'/api/matriculas-archivadas/?anio={date.today().year - 2}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        for anio in ('dos mil', '²⁰²³'):
+            response = self.client.get('/api/matriculas-archivadas/', {'anio': anio})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SincronizacionTest(APITestCase):
+    """Test cases for the ?since=<seq> delta sync mode"""
+
+    def setUp(self):
+        """Set up a student and a course"""
+        self.estudiante = Estudiante.objects.create(nombre='Iker Sanz', email='iker@test.com')
+        self.curso = Curso.objects.create(
+            titulo='Redes', descripcion='Curso de redes', fecha_inicio=date.today() + timedelta(days=10)
+        )
+
+    def test_each_write_gets_a_higher_seq(self):
+        """Test that saves assign increasing change sequence numbers"""
+        seq_inicial = self.estudiante.seq
+        self.estudiante.nombre = 'Iker Sanz Ruiz'
+        self.estudiante.save()
+        self.assertGreater(self.estudiante.seq, seq_inicial)
+        self.assertGreater(self.curso.seq, seq_inicial)
+
+    def test_since_returns_only_changes_and_tombstones(self):
+        """Test GET /estudiantes/?since= returns changed rows, deleted ids and the new high-water mark"""
+        response = self.client.get('/api/estudiantes/?since=0')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        marca = response.data['seq']
+        self.assertIn(self.estudiante.id, [e['id'] for e in response.data['cambios']])
+
+        # Sin cambios no se devuelve nada
+        response = self.client.get(f'/api/estudiantes/?since={marca}')
+        self.assertEqual(response.data['cambios'], [])
+        self.assertEqual(response.data['eliminados'], [])
+
+        otro = Estudiante.objects.create(nombre='Nerea Gil', email='nerea@test.com')
+        borrado_id = self.estudiante.id
+        self.estudiante.delete()
+        response = self.client.get(f'/api/estudiantes/?since={marca}')
+        self.assertEqual([e['id'] for e in response.data['cambios']], [otro.id])
+        self.assertEqual(response.data['eliminados'], [borrado_id])
+        self.assertGreater(response.data['seq'], marca)
+
+    def test_bulk_grades_are_visible_to_since(self):
+        """Test that the batch grade endpoint bumps the seq of the graded enrollments"""
+        Matricula.objects.create(estudiante=self.estudiante, curso=self.curso)
+        marca = self.client.get('/api/matriculas/?since=0').data['seq']
+
+        self.client.post(f'/api/cursos/{self.curso.id}/calificaciones/', {str(self.estudiante.id): 9}, format='json')
+        response = self.client.get(f'/api/matriculas/?since={marca}')
+        self.assertEqual(len(response.data['cambios']), 1)
+        self.assertEqual(response.data['cambios'][0]['calificacion'], '9.00')
+
+    def test_since_rejects_invalid_value(self):
+        """Test that a non numeric since returns 400"""
+        response = self.client.get('/api/cursos/?since=ayer')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/estudiantes/?since=²')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EventosSSETest(TestCase):
+    """Test cases for the in-process broadcaster and the SSE stream"""
+
+    def setUp(self):
+        """Set up a course with one enrolled student"""
+        self.estudiante = Estudiante.objects.create(nombre='Olga Prieto', email='olga@test.com')
+        self.curso = Curso.objects.create(
+            titulo='Rust', descripcion='Curso de Rust', fecha_inicio=date.today() + timedelta(days=10)
+        )
+
+    def ultimos_eventos(self, n):
+        return [(e.tipo, e.curso_id) for e in list(difusor._historial)[-n:]]
+
+    def test_model_changes_publish_events_on_commit(self):
+        """Test enrollment create, regrade, delete and course activation events"""
+        with self.captureOnCommitCallbacks(execute=True):
+            matricula = Matricula.objects.create(estudiante=self.estudiante, curso=self.curso)
+        with self.captureOnCommitCallbacks(execute=True):
+            matricula.calificacion = Decimal('6.5')
+            matricula.save()
+            matricula.save()  # sin cambios de nota no hay evento
+        with self.captureOnCommitCallbacks(execute=True):
+            matricula.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.curso.activo = False
+            self.curso.save()
+
+        self.assertEqual(self.ultimos_eventos(4), [
+            ('matricula.creada', self.curso.id),
+            ('matricula.calificada', self.curso.id),
+            ('matricula.eliminada', self.curso.id),
+            ('curso.activacion', self.curso.id),
+        ])
+
+    def test_broadcaster_filters_by_curso_and_resumes(self):
+        """Test per-curso filtering, Last-Event-ID replay and history overflow"""
+        local = Difusor(historial=2)
+
+        async def escenario():
+            suscripcion, _, _ = local.suscribir(curso_id=1)
+            # Publicación desde otro hilo, como hacen las señales en un worker síncrono
+            hilo = threading.Thread(target=lambda: [local.publicar(Evento(i, 'x', i % 2, {})) for i in (1, 2, 3)])
+            hilo.start()
+            hilo.join()
+            recibidos = [(await suscripcion.cola.get()).id for _ in range(2)]
+            local.cancelar(suscripcion)
+            _, pendientes, completo = local.suscribir(ultimo_id=2)
+            _, _, completo_viejo = local.suscribir(ultimo_id=0)
+            return recibidos, [e.id for e in pendientes], completo, completo_viejo
+
+        recibidos, pendientes, completo, completo_viejo = asyncio.run(escenario())
+        self.assertEqual(recibidos, [1, 3])
+        self.assertEqual(pendientes, [3])
+        self.assertTrue(completo)
+        self.assertFalse(completo_viejo)  # el evento 1 ya salió del historial
+
+    async def test_sse_stream_sends_published_events(self):
+        """Test GET /api/eventos/ streams events for the requested curso"""
+        response = await self.async_client.get('/api/eventos/?curso=987654')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        flujo = response.streaming_content.__aiter__()
+        self.assertTrue((await flujo.__anext__()).startswith(b'retry:'))
+
+        difusor.publicar(Evento(10**9, 'curso.activacion', 987654, {"curso": 987654, "activo": False}))
+        evento = await asyncio.wait_for(flujo.__anext__(), timeout=5)
+        self.assertIn(b'event: curso.activacion', evento)
+        self.assertIn(f'id: {10**9}'.encode(), evento)
+        await flujo.aclose()
+
+    def test_sse_rejects_malformed_curso_or_last_event_id(self):
+        """Test that non-integer curso or Last-Event-ID (including non-ASCII digits) answer 400"""
+        self.assertEqual(self.client.get('/api/eventos/?curso=²').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/eventos/?curso=rust').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/eventos/', HTTP_LAST_EVENT_ID='³')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WebhookOutboxTest(APITestCase):
+    """Test cases for the enrollment outbox and the webhook dispatcher against a local HTTP stand-in"""
+
+    def setUp(self):
+        """Start a local HTTP server that fails the first request and then accepts"""
+        self.recibidos = []
+        self.respuestas = [500]
+        test = self
+
+        class Receptor(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers['Content-Length']))
+                codigo = test.respuestas.pop(0) if test.respuestas else 200
+                if codigo == 200:
+                    test.recibidos.append(json.loads(cuerpo))
+                self.send_response(codigo)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Receptor)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.url = f'http://127.0.0.1:{self.servidor.server_port}/hook'
+
+        self.estudiante = Estudiante.objects.create(nombre='Pablo Vega', email='pablo@test.com')
+        self.curso = Curso.objects.create(
+            titulo='Go', descripcion='Curso de Go', fecha_inicio=date.today() + timedelta(days=10)
+        )
+
+    def test_enrollment_writes_outbox_and_dispatcher_retries(self):
+        """Test POST /matriculas/ writes one outbox row and delivery retries after a failure"""
+        with override_settings(WEBHOOK_URLS=[self.url], WEBHOOK_BACKOFF_BASE=0):
+            response = self.client.post(
+                '/api/matriculas/', {'estudiante': self.estudiante.id, 'curso': self.curso.id}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            evento = EventoSalida.objects.get()
+            self.assertEqual(evento.tipo, 'matricula.creada')
+            self.assertEqual(evento.payload['matricula'], response.data['id'])
+
+            # Primer intento: el receptor responde 500 y el evento queda para reintentar
+            self.assertEqual(despachar_pendientes(), (0, 1))
+            evento.refresh_from_db()
+            self.assertEqual(evento.intentos, 1)
+            self.assertEqual(evento.ultimo_error, 'HTTP 500')
+
+            # El reintento se entrega (lo aparta _reclamar hasta que vence su próximo intento)
+            EventoSalida.objects.update(proximo_intento=timezone.now())
+            self.assertEqual(despachar_pendientes(), (1, 0))
+            self.assertEqual(self.recibidos[0]['eventos'][0]['id'], evento.id)
+            self.assertIsNotNone(EventoSalida.objects.get().entregado)
+            self.assertEqual(despachar_pendientes(), (0, 0))
+
+    def test_failed_enrollment_leaves_no_outbox_row(self):
+        """Test that a rejected enrollment does not enqueue any event"""
+        self.curso.activo = False
+        self.curso.save()
+        with override_settings(WEBHOOK_URLS=[self.url]):
+            self.client.post('/api/matriculas/', {'estudiante': self.estudiante.id, 'curso': self.curso.id}, format='json')
+        self.assertFalse(EventoSalida.objects.exists())
+
+
+class TrabajoReporteTest(APITestCase):
+    """Test cases for the bulk transcript job queue"""
+
+    def setUp(self):
+        """Use a temporary reports directory and small shards"""
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(REPORTES_DIR=directorio.name, REPORTES_TAMANO_FRAGMENTO=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.estudiante = Estudiante.objects.create(nombre='Rosa Lima', email='rosa@test.com')
+        curso = Curso.objects.create(titulo='SQL', descripcion='Curso de SQL', fecha_inicio=date.today() + timedelta(days=10))
+        Matricula.objects.create(estudiante=self.estudiante, curso=curso, calificacion=Decimal('7.25'))
+
+    def test_job_lifecycle_json(self):
+        """Test POST /reportes/jobs/, status and download of a JSON transcript"""
+        response = self.client.post('/api/reportes/jobs/', {'formato': 'json'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        url = f"/api/reportes/jobs/{response.data['id']}/"
+        self.assertEqual(self.client.get(url + 'descarga/').status_code, status.HTTP_409_CONFLICT)
+
+        procesar_cola(procesos=1)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['estado'], 'completado')
+        self.assertEqual(response.data['procesados'], Estudiante.objects.count())
+        self.assertEqual(response.data['progreso'], 100)
+
+        response = self.client.get(url + 'descarga/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        filas = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(filas), Estudiante.objects.count())
+        fila = next(f for f in filas if f['id'] == self.estudiante.id)
+        self.assertEqual(fila['cursos'], ['SQL'])
+        self.assertEqual(fila['media_calificacion'], 7.25)
+
+    def test_job_resumes_after_crash_csv(self):
+        """Test that completed shards are kept and interrupted ones are redone"""
+        trabajo = TrabajoReporte.objects.create(formato='csv')
+        reportes._preparar(trabajo)  # los fragmentos se crean al empezar
+        primero, segundo = list(trabajo.fragmentos.all()[:2])
+        reportes.procesar_fragmento(primero.id)
+        FragmentoReporte.objects.filter(pk=segundo.pk).update(estado='en_curso')  # el worker murió aquí
+        hace_rato = timezone.now() - timedelta(seconds=settings.REPORTES_CADUCIDAD + 1)
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(estado='en_curso', actualizado=hace_rato)
+
+        procesar_cola(procesos=1)
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual(trabajo.procesados, Estudiante.objects.count())
+        with open(trabajo.archivo, encoding='utf-8') as f:
+            filas = list(csv.DictReader(f))
+        self.assertEqual(sorted(int(f['id']) for f in filas), sorted(Estudiante.objects.values_list('id', flat=True)))
+
+    def test_failure_while_preparing_marks_job_as_error(self):
+        """Test that a failure creating the shards ends the job in error instead of looping on it"""
+        from django.db import OperationalError
+        trabajo = TrabajoReporte.objects.create(formato='json')
+        with mock.patch.object(reportes, '_preparar', side_effect=OperationalError('database is locked')) as preparar:
+            self.assertEqual(procesar_cola(procesos=1), 1)
+        self.assertEqual(preparar.call_count, 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'error')
+        self.assertIn('database is locked', trabajo.error)
+
+    def test_job_claimed_by_another_worker_is_left_alone(self):
+        """Test that a worker does not touch a job another worker is still making progress on"""
+        trabajo = TrabajoReporte.objects.create(formato='csv')
+        reportes._preparar(trabajo)
+        self.assertTrue(reportes._reclamar(trabajo.pk))
+        fragmento = trabajo.fragmentos.first()
+        FragmentoReporte.objects.filter(pk=fragmento.pk).update(estado='en_curso')
+
+        self.assertEqual(procesar_cola(procesos=1), 0)
+
+        fragmento.refresh_from_db()
+        self.assertEqual(fragmento.estado, 'en_curso')
+        self.assertFalse(reportes._reclamar(trabajo.pk))
+
+    def test_stale_job_is_taken_over_without_double_counting(self):
+        """Test that a second worker takes over a job with no heartbeat and the first one does not add its shard twice"""
+        for i in range(3):
+            Estudiante.objects.create(nombre=f'Pablo Soto {i}', email=f'pablo{i}@test.com')
+        trabajo = TrabajoReporte.objects.create(formato='json')
+        expedientes = reportes.expedientes
+        relevo = {}
+
+        def expedientes_del_primero(desde_id, hasta_id):
+            # El primer worker se queda parado en su primer fragmento; el trabajo caduca y lo termina el segundo
+            if 'procesados' not in relevo:
+                relevo['procesados'] = None
+                hace_rato = timezone.now() - timedelta(seconds=settings.REPORTES_CADUCIDAD + 1)
+                TrabajoReporte.objects.filter(pk=trabajo.pk).update(actualizado=hace_rato)
+                relevo['procesados'] = procesar_cola(procesos=1)
+            return expedientes(desde_id, hasta_id)
+
+        with mock.patch.object(reportes, 'expedientes', side_effect=expedientes_del_primero):
+            self.assertEqual(procesar_cola(procesos=1), 1)
+
+        self.assertEqual(relevo['procesados'], 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual(trabajo.procesados, Estudiante.objects.count())
+        with open(trabajo.archivo, encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), Estudiante.objects.count())
+
+    def test_download_of_missing_file_returns_410(self):
+        """Test that a completed job whose file was removed answers 410 instead of failing"""
+        trabajo = TrabajoReporte.objects.create(formato='csv')
+        procesar_cola(procesos=1)
+        trabajo.refresh_from_db()
+        os.remove(trabajo.archivo)
+
+        response = self.client.get(f'/api/reportes/jobs/{trabajo.id}/descarga/')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+class VersionadoETagTest(APITestCase):
+    """Test cases for ETag, If-None-Match and If-Match optimistic concurrency"""
+
+    def setUp(self):
+        """Set up a student"""
+        self.estudiante = Estudiante.objects.create(nombre='Teresa Ramos', email='teresa@test.com')
+        self.url = f'/api/estudiantes/{self.estudiante.id}/'
+
+    def test_if_none_match_returns_304_until_changed(self):
+        """Test GET detail emits an ETag and answers 304 while the row is unchanged"""
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.estudiante.nombre = 'Teresa Ramos Gil'
+        self.estudiante.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_match_rejects_stale_update(self):
+        """Test that the second PUT with the same ETag gets 412 and does not overwrite"""
+        etag = self.client.get(self.url)['ETag']
+        datos = {'nombre': 'Primera', 'email': 'teresa@test.com'}
+        response = self.client.put(self.url, datos, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        datos = {'nombre': 'Segunda', 'email': 'teresa@test.com'}
+        response = self.client.put(self.url, datos, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.estudiante.refresh_from_db()
+        self.assertEqual(self.estudiante.nombre, 'Primera')
+
+    def test_put_matricula_with_if_match(self):
+        """Test PUT on another resource honours If-Match too"""
+        curso = Curso.objects.create(titulo='PHP', descripcion='Curso de PHP', fecha_inicio=date.today() + timedelta(days=9))
+        matricula = Matricula.objects.create(estudiante=self.estudiante, curso=curso)
+        url = f'/api/matriculas/{matricula.id}/'
+        datos = {'estudiante': self.estudiante.id, 'curso': curso.id, 'calificacion': '5.00'}
+        response = self.client.put(url, datos, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.put(url, datos, format='json', HTTP_IF_MATCH=f'"{matricula.seq}"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_malformed_pk_and_versions(self):
+        """Test that a non-numeric pk or a non-ASCII digit version is a 404/412, not a server error"""
+        response = self.client.get('/api/estudiantes/abc/', HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"²"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        datos = {'nombre': 'Tercera', 'email': 'teresa@test.com'}
+        response = self.client.put(self.url, datos, format='json', HTTP_IF_MATCH='"²"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+
+class CacheElegibilidadTest(APITestCase):
+    """Test cases for the in-process course eligibility cache"""
+
+    def setUp(self):
+        """Start from an empty cache and an open course"""
+        elegibilidad.limpiar()
+        self.estudiantes = [Estudiante.objects.create(nombre=f'Alumno {i}', email=f'cache{i}@test.com') for i in range(3)]
+        self.curso = Curso.objects.create(
+            titulo='Kotlin', descripcion='Curso de Kotlin', fecha_inicio=date.today() + timedelta(days=3)
+        )
+
+    def test_enrollment_validation_uses_cache(self):
+        """Test that repeated validations for the same course do not fetch the course again"""
+        Matricula(estudiante=self.estudiantes[0], curso_id=self.curso.id).clean()
+        fallos = elegibilidad.fallos
+        with self.assertNumQueries(1):  # solo la comprobación de duplicados
+            Matricula(estudiante=self.estudiantes[1], curso_id=self.curso.id).clean()
+        self.assertEqual(elegibilidad.fallos, fallos)
+
+    def test_course_save_invalidates_entry(self):
+        """Test that deactivating the course is seen by the next validation"""
+        Matricula(estudiante=self.estudiantes[0], curso_id=self.curso.id).clean()
+        self.curso.activo = False
+        self.curso.save()
+        with self.assertRaises(ValidationError):
+            Matricula(estudiante=self.estudiantes[0], curso_id=self.curso.id).clean()
+
+    def test_date_rule_rolls_over_at_midnight(self):
+        """Test that cached data is evaluated against the current date"""
+        self.assertTrue(elegibilidad.admite_matriculas(self.curso.id))
+        self.assertFalse(elegibilidad.admite_matriculas(self.curso.id, hoy=date.today() + timedelta(days=4)))
+
+    def test_abiertos_endpoint(self):
+        """Test GET /cursos/abiertos/ lists open courses and exports hit counters"""
+        response = self.client.get('/api/cursos/abiertos/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(self.curso.id, [c['id'] for c in response.data])
+        response = self.client.get('/api/cursos/abiertos/')
+        self.assertIn('aciertos=1', response['X-Cache-Elegibilidad'])
+
+        Curso.objects.get(pk=self.curso.id).save()  # cualquier cambio de curso invalida la lista
+        self.curso.activo = False
+        self.curso.save()
+        response = self.client.get('/api/cursos/abiertos/')
+        self.assertNotIn(self.curso.id, [c['id'] for c in response.data])
+
+
+class FiltrosListadoTest(APITestCase):
+    """Test cases for the exact and range filters of the list endpoints"""
+
+    def setUp(self):
+        """Create two courses with graded enrollments on different dates"""
+        inicio = date.today() + timedelta(days=10)
+        self.curso1 = Curso.objects.create(titulo='SQL', descripcion='Curso de SQL', fecha_inicio=inicio)
+        self.curso2 = Curso.objects.create(titulo='NoSQL', descripcion='Curso de NoSQL', fecha_inicio=inicio + timedelta(days=30))
+        self.estudiantes = [Estudiante.objects.create(nombre=f'Filtro {i}', email=f'filtro{i}@test.com') for i in range(4)]
+        notas = [Decimal('4.00'), Decimal('6.50'), Decimal('8.00'), Decimal('9.50')]
+        for i, (estudiante, nota) in enumerate(zip(self.estudiantes, notas)):
+            matricula = Matricula.objects.create(estudiante=estudiante, curso=self.curso1, calificacion=nota)
+            Matricula.objects.filter(pk=matricula.pk).update(fecha_matricula=date(2025, 1, 1) + timedelta(days=30 * i))
+        Matricula.objects.create(estudiante=self.estudiantes[0], curso=self.curso2, calificacion=Decimal('7.00'))
+
+    def test_exact_and_range_filters_on_matriculas(self):
+        """Test that curso, estudiante and calificacion ranges are applied"""
+        response = self.client.get('/api/matriculas/', {'curso': self.curso1.id, 'calificacion__gte': '6.5', 'calificacion__lte': '9'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(m['calificacion'] for m in response.data), ['6.50', '8.00'])
+
+        response = self.client.get('/api/matriculas/', {'estudiante': self.estudiantes[0].id})
+        self.assertEqual({m['curso'] for m in response.data}, {self.curso1.id, self.curso2.id})
+
+    def test_date_ranges(self):
+        """Test fecha_matricula and fecha_inicio ranges"""
+        response = self.client.get('/api/matriculas/', {
+            'curso': self.curso1.id, 'fecha_matricula__gte': '2025-01-15', 'fecha_matricula__lte': '2025-03-15'
+        })
+        self.assertEqual(len(response.data), 2)
+
+        response = self.client.get('/api/cursos/', {'activo': 'true', 'fecha_inicio__gte': self.curso2.fecha_inicio.isoformat()})
+        self.assertEqual([c['id'] for c in response.data], [self.curso2.id])
+
+    def test_invalid_values_return_400(self):
+        """Test that malformed filter values are rejected instead of ignored"""
+        response = self.client.get('/api/matriculas/', {'curso': 'abc', 'fecha_matricula__gte': '31/01/2025'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('curso', response.data)
+        self.assertIn('fecha_matricula__gte', response.data)
+        response = self.client.get('/api/cursos/', {'activo': 'quizas'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_out_of_range_or_non_ascii_integers_return_400(self):
+        """Test that ids beyond 64 bits and non-ASCII digits are a 400, not a server error"""
+        for valor in (str(2 ** 63), '9' * 40, '٣', '²'):
+            response = self.client.get('/api/matriculas/', {'estudiante': valor})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, valor)
+            self.assertIn('estudiante', response.data)
+        response = self.client.get('/api/matriculas/', {'curso': str(2 ** 63 - 1)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_filters_use_indexes(self):
+        """Test that the documented filter combinations are resolved with an index"""
+        from django.db import connection
+        consultas = [
+            Matricula.objects.filter(curso_id=1, calificacion__gte=5),
+            Matricula.objects.filter(curso_id=1, fecha_matricula__gte=date(2025, 1, 1)),
+            Matricula.objects.filter(estudiante_id=1, fecha_matricula__lte=date(2025, 1, 1)),
+            Matricula.objects.filter(calificacion__lte=5),
+            Matricula.objects.filter(fecha_matricula__gte=date(2025, 1, 1)),
+            Curso.objects.filter(activo=True, fecha_inicio__gte=date(2025, 1, 1)),
+            Curso.objects.filter(fecha_inicio__lte=date(2025, 1, 1)),
+            Estudiante.objects.filter(fecha_registro__gte=date(2025, 1, 1)),
+        ]
+        for consulta in consultas:
+            sql, params = consulta.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+            self.assertIn('INDEX', plan, plan)
+
+
+class LoteIdsTest(APITestCase):
+    """Test cases for batch retrieval with ?ids= and POST batch_get/"""
+
+    def setUp(self):
+        """Create a few students"""
+        self.estudiantes = [Estudiante.objects.create(nombre=f'Lote {i}', email=f'lote{i}@test.com') for i in range(3)]
+
+    def test_ids_preserve_order_and_report_missing(self):
+        """Test that ?ids= returns the requested order in one query and lists missing ids"""
+        a, b, c = (e.id for e in self.estudiantes)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/estudiantes/', {'ids': f'{c},{a},999999,{c}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([e['id'] for e in response.data['resultados']], [c, a])
+        self.assertEqual(response.data['no_encontrados'], [999999])
+
+    def test_batch_get_on_all_viewsets(self):
+        """Test POST batch_get/ on estudiantes, cursos and matriculas"""
+        curso = Curso.objects.create(titulo='Go', descripcion='Curso de Go', fecha_inicio=date.today() + timedelta(days=5))
+        matricula = Matricula.objects.create(estudiante=self.estudiantes[0], curso=curso)
+        for url, id_ in (('/api/estudiantes/batch_get/', self.estudiantes[1].id),
+                         ('/api/cursos/batch_get/', curso.id),
+                         ('/api/matriculas/batch_get/', matricula.id)):
+            response = self.client.post(url, {'ids': [id_]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([r['id'] for r in response.data['resultados']], [id_])
+        response = self.client.get('/api/matriculas/', {'ids': str(matricula.id), 'include_archived': 'true'})
+        self.assertEqual(len(response.data['resultados']), 1)
+
+    @override_settings(LOTE_MAX_IDS=2)
+    def test_invalid_or_too_many_ids(self):
+        """Test that malformed ids and batches over LOTE_MAX_IDS are rejected"""
+        response = self.client.get('/api/cursos/', {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/cursos/', {'ids': '1,x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/cursos/', {'ids': '1,²'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/cursos/batch_get/', {'ids': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_out_of_range_ids_are_rejected_by_element(self):
+        """Test that ids beyond 64 bits or below 1 are a 400 naming the bad element on GET and POST"""
+        demasiado = 2 ** 63
+        response = self.client.get('/api/estudiantes/', {'ids': f'1,{demasiado}'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(demasiado), str(response.data['ids'][0]))
+        for malo in (demasiado, 0, -3, True):
+            response = self.client.post('/api/estudiantes/batch_get/', {'ids': [1, malo]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, malo)
+            self.assertIn(repr(malo), str(response.data['ids'][0]))
+        response = self.client.post('/api/estudiantes/batch_get/', {'ids': [2 ** 63 - 1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['no_encontrados'], [2 ** 63 - 1])
+
+
+class ExpedienteEstudianteTest(APITestCase):
+    """Test cases for the composite student dossier endpoint"""
+
+    def setUp(self):
+        """Create a student enrolled in two courses, one of them graded"""
+        self.estudiante = Estudiante.objects.create(nombre='Expediente', email='expediente@test.com')
+        inicio = date.today() + timedelta(days=7)
+        self.curso1 = Curso.objects.create(titulo='Redes', descripcion='Curso de redes', fecha_inicio=inicio)
+        self.curso2 = Curso.objects.create(titulo='Linux', descripcion='Curso de Linux', fecha_inicio=inicio + timedelta(days=1))
+        Matricula.objects.create(estudiante=self.estudiante, curso=self.curso1, calificacion=Decimal('7.50'))
+        Matricula.objects.create(estudiante=self.estudiante, curso=self.curso2)
+        self.url = f'/api/estudiantes/{self.estudiante.id}/expediente/'
+
+    def test_full_dossier_in_two_queries(self):
+        """Test that the whole dossier is built with two queries"""
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['estudiante']['email'], 'expediente@test.com')
+        self.assertEqual([m['curso']['titulo'] for m in response.data['matriculas']], ['Redes', 'Linux'])
+        self.assertEqual(response.data['matriculas'][0]['calificacion'], '7.50')
+        self.assertEqual(response.data['estadisticas']['total_cursos'], 2)
+        self.assertEqual(response.data['estadisticas']['calificadas'], 1)
+        self.assertEqual(response.data['estadisticas']['media_calificacion'], 7.5)
+
+    def test_field_selection_per_section(self):
+        """Test that each section returns only the requested fields"""
+        response = self.client.get(self.url, {
+            'campos_estudiante': 'nombre', 'campos_matricula': 'calificacion', 'campos_curso': 'titulo'
+        })
+        self.assertEqual(response.data['estudiante'], {'nombre': 'Expediente'})
+        self.assertEqual(response.data['matriculas'][0], {'calificacion': '7.50', 'curso': {'titulo': 'Redes'}})
+
+    def test_statistics_only(self):
+        """Test that statistics without the enrollment list use one aggregate query"""
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'secciones': 'estadisticas'})
+        self.assertEqual(list(response.data), ['estadisticas'])
+        self.assertEqual(response.data['estadisticas']['cursos_activos'], 2)
+        self.assertEqual(response.data['estadisticas']['mejor_calificacion'], '7.50')
+        self.assertEqual(response.data['estadisticas']['media_calificacion'], 7.5)
+
+    def test_invalid_section_or_field(self):
+        """Test that unknown sections and fields return 400"""
+        self.assertEqual(self.client.get(self.url, {'secciones': 'notas'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'campos_curso': 'precio'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/estudiantes/999999/expediente/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ContadoresTest(APITestCase):
+    """Test cases for the maintained row counters and ?count=true"""
+
+    def setUp(self):
+        """Create a course with two enrollments"""
+        self.curso = Curso.objects.create(titulo='Rust', descripcion='Curso de Rust', fecha_inicio=date.today() + timedelta(days=9))
+        self.estudiantes = [Estudiante.objects.create(nombre=f'Contador {i}', email=f'contador{i}@test.com') for i in range(3)]
+        for estudiante in self.estudiantes[:2]:
+            Matricula.objects.create(estudiante=estudiante, curso=self.curso)
+
+    def test_counters_follow_saves_and_deletes(self):
+        """Test that totals and partitions are kept exact on save, partition change and delete"""
+        clave_curso = contadores.clave(Matricula, 'curso_id', self.curso.id)
+        self.assertEqual(contadores.valor(clave_curso), 2)
+        self.assertEqual(contadores.valor('matricula'), Matricula.objects.count())
+
+        Matricula.objects.filter(estudiante=self.estudiantes[0], curso=self.curso).get().delete()
+        self.assertEqual(contadores.valor(clave_curso), 1)
+
+        activos = contadores.valor('curso:activo:True')
+        self.curso.activo = False
+        self.curso.save()
+        self.assertEqual(contadores.valor('curso:activo:True'), activos - 1)
+        self.assertEqual(contadores.reconciliar(corregir=False), [])
+
+    def test_list_count_uses_counters(self):
+        """Test that ?count=true reads the counter instead of counting the table"""
+        response = self.client.get('/api/matriculas/', {'count': 'true', 'curso': self.curso.id})
+        self.assertEqual(response['X-Total-Count'], '2')
+        self.assertEqual(response['X-Total-Exacto'], 'true')
+        response = self.client.get('/api/estudiantes/', {'count': 'true'})
+        self.assertEqual(int(response['X-Total-Count']), Estudiante.objects.count())
+
+    @override_settings(CONTADORES_LIMITE_EXACTO=1)
+    def test_search_falls_back_to_approximate_count(self):
+        """Test that arbitrary searches get a capped count flagged as not exact"""
+        response = self.client.get('/api/estudiantes/', {'count': 'true', 'search': 'Contador'})
+        self.assertEqual(response['X-Total-Count'], '1')
+        self.assertEqual(response['X-Total-Exacto'], 'false')
+        self.assertEqual(len(response.data), 3)
+
+    def test_reconciliation_fixes_drift(self):
+        """Test that bulk changes outside the signals are corrected by reconcile"""
+        Matricula.objects.filter(curso=self.curso)._raw_delete('default')
+        out = StringIO()
+        call_command('reconciliar_contadores', stdout=out)
+        self.assertIn('diferencias corregidas', out.getvalue())
+        self.assertEqual(contadores.valor(contadores.clave(Matricula, 'curso_id', self.curso.id)), 0)
+        self.assertEqual(contadores.reconciliar(corregir=False), [])
+
+
+class AdminMatriculasTest(TestCase):
+    """Test cases for the large-table friendly admin"""
+
+    def setUp(self):
+        """Log in as superuser and create a course with enrollments"""
+        from django.contrib.auth import get_user_model
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@test.com', 'clave-segura')
+        self.client.force_login(self.admin)
+        self.curso = Curso.objects.create(titulo='Elixir', descripcion='Curso de Elixir', fecha_inicio=date.today() + timedelta(days=4))
+
+    def _matricular(self, cantidad, desde=0):
+        for i in range(desde, desde + cantidad):
+            estudiante = Estudiante.objects.create(nombre=f'Admin {i}', email=f'admin{i}@test.com')
+            Matricula.objects.create(estudiante=estudiante, curso=self.curso, calificacion=Decimal(i % 10))
+
+    def _consultas_listado(self, ruta='/admin/academia_app/matricula/'):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(ruta)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in capturadas]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test that the changelist joins FKs and never runs a full COUNT(*)"""
+        self._matricular(2)
+        pocas = self._consultas_listado()
+        self._matricular(20, desde=2)
+        muchas = self._consultas_listado()
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertFalse([sql for sql in muchas if 'COUNT(*)' in sql and 'academia_app_matricula' in sql])
+
+    def test_search_and_filters(self):
+        """Test email, id and calificacion bucket searches"""
+        self._matricular(3)
+        matricula = Matricula.objects.get(estudiante__email='admin1@test.com')
+        response = self.client.get('/admin/academia_app/matricula/', {'q': 'admin1@test.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [matricula])
+        response = self.client.get('/admin/academia_app/matricula/', {'q': str(matricula.id)})
+        self.assertEqual(list(response.context['cl'].result_list), [matricula])
+        response = self.client.get('/admin/academia_app/matricula/', {'tramo': 'suspenso', 'q': 'Elixir'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get('/admin/academia_app/matricula/', {'q': '²'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_add_form_uses_autocomplete(self):
+        """Test that the add form does not render every student in a select"""
+        self._matricular(5)
+        response = self.client.get('/admin/academia_app/matricula/add/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'admin3@test.com')
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_estimated_paginator(self):
+        """Test that the paginator reads the row counter when the list is not filtered"""
+        self._matricular(2)
+        total = Matricula.objects.count()
+        paginador = PaginadorEstimado(Matricula.objects.order_by('-id'), 50)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginador.count, total)
+
+    def test_prefix_searches_use_an_index(self):
+        """Test that the student and course admin searches find rows case-insensitively through an index"""
+        from django.contrib import admin
+        from django.db import connection
+        from django.test import RequestFactory
+        self._matricular(2)
+        peticion = RequestFactory().get('/')
+        for modelo, termino, esperado in ((Estudiante, 'ADMIN', ['Admin 1', 'Admin 0']), (Curso, 'elix', ['Elixir'])):
+            modelo_admin = admin.site._registry[modelo]
+            queryset, _ = modelo_admin.get_search_results(peticion, modelo_admin.get_queryset(peticion), termino)
+            self.assertEqual([str(o) for o in queryset], esperado)
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+            self.assertNotIn('SCAN', plan, plan)
+
+
+class PerfiladoTest(APITestCase):
+    """Test cases for the on-demand request profiler"""
+
+    def setUp(self):
+        """Store profiles in a temporary directory"""
+        from django.contrib.auth import get_user_model
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(PERFILADO_DIR=self.directorio.name)
+        self.ajustes.enable()
+        self.staff = get_user_model().objects.create_user('ops', 'ops@test.com', 'clave-segura', is_staff=True)
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    def test_staff_profile_is_stored_and_listed(self):
+        """Test that ?_profile=1 by staff stores a profile split by layer"""
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/cursos/', {'_profile': '1', 'ordering': 'titulo'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        perfil_id = response['X-Perfil']
+
+        response = self.client.get('/api/perfiles/')
+        self.assertEqual([p['id'] for p in response.data], [perfil_id])
+        response = self.client.get(f'/api/perfiles/{perfil_id}/')
+        self.assertEqual(set(response.data['reparto_ms']), {'orm', 'serializacion', 'renderizado', 'middleware', 'vista_y_otros'})
+        self.assertGreater(response.data['reparto_ms']['serializacion'], 0)
+        self.assertGreater(response.data['consultas'], 0)
+        self.assertTrue(response.data['funciones'])
+        response = self.client.get(f'/api/perfiles/{perfil_id}/', {'formato': 'prof'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_anonymous_request_is_not_profiled(self):
+        """Test that the parameter is ignored for non staff users and the listing is forbidden"""
+        response = self.client.get('/api/cursos/', {'_profile': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Perfil', response)
+        self.assertEqual(os.listdir(self.directorio.name), [])
+        self.assertEqual(self.client.get('/api/perfiles/').status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(PERFILADO_MUESTREO=1.0)
+    def test_sampled_profiles_are_stored_silently(self):
+        """Test that sampled requests are stored without telling the client"""
+        response = self.client.get('/api/estudiantes/')
+        self.assertNotIn('X-Perfil', response)
+        perfiles = [n for n in os.listdir(self.directorio.name) if n.endswith('.json')]
+        self.assertEqual(len(perfiles), 1)
+
+    @override_settings(PERFILADO_TOKEN='secreto')
+    def test_token_header_authorizes(self):
+        """Test that X-Perfil-Token authorizes profiling without a session"""
+        response = self.client.get('/api/cursos/', {'_profile': '1'}, HTTP_X_PERFIL_TOKEN='secreto')
+        self.assertIn('X-Perfil', response)
+        response = self.client.get('/api/cursos/', {'_profile': '1'}, HTTP_X_PERFIL_TOKEN='otro')
+        self.assertNotIn('X-Perfil', response)
+
+
+def _sumar_en_otro_proceso():
+    # Worker simulado: registra una petición y vuelca su fichero al terminar
+    from .metricas import registro
+    registro.sumar('academia_matriculas_total', (('resultado', '201'),), 5)
+    registro.volcar()
+
+
+class MetricasTest(APITestCase):
+    """Test cases for the Prometheus /metrics endpoint"""
+
+    def setUp(self):
+        """Write the metric files to a temporary directory"""
+        from .metricas import registro
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(METRICAS_DIR=self.directorio.name)
+        self.ajustes.enable()
+        registro._reiniciar()
+        self.registro = registro
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    def test_route_histograms_and_enrollment_outcomes(self):
+        """Test that route latency, size, queries and enrollment results are exported"""
+        curso = Curso.objects.create(titulo='Scala', descripcion='Curso de Scala', fecha_inicio=date.today() + timedelta(days=3))
+        estudiante = Estudiante.objects.create(nombre='Metricas', email='metricas@test.com')
+        self.client.get('/api/cursos/')
+        datos = {'estudiante': estudiante.id, 'curso': curso.id}
+        self.assertEqual(self.client.post('/api/matriculas/', datos, format='json').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post('/api/matriculas/', {'curso': curso.id}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        texto = response.content.decode()
+        self.assertIn('academia_peticion_duracion_segundos_bucket{ruta="curso-list",le="+Inf"} 1', texto)
+        self.assertIn('academia_respuesta_bytes_count{ruta="curso-list"} 1', texto)
+        self.assertIn('academia_consultas_bd_total{ruta="curso-list"}', texto)
+        self.assertIn('academia_matriculas_total{resultado="201"} 1', texto)
+        self.assertIn('academia_matriculas_total{resultado="400"} 1', texto)
+        self.assertIn('academia_cache_total{cache="elegibilidad",resultado="acierto"}', texto)
+
+    def test_aggregates_across_processes(self):
+        """Test that totals from other worker processes are added up"""
+        from multiprocessing import get_context
+        self.registro.sumar('academia_matriculas_total', (('resultado', '201'),), 2)
+        proceso = get_context('fork').Process(target=_sumar_en_otro_proceso)
+        proceso.start()
+        proceso.join()
+        texto = self.client.get('/metrics').content.decode()
+        self.assertIn('academia_matriculas_total{resultado="201"} 7', texto)
+        # El fichero del proceso terminado se ha sumado a los finalizados; los totales no cambian
+        self.assertEqual([r.name for r in Path(self.directorio.name).glob('metricas_*.json')], ['metricas_finalizados.json'])
+        texto = self.client.get('/metrics').content.decode()
+        self.assertIn('academia_matriculas_total{resultado="201"} 7', texto)
+
+    def test_only_server_processes_write_files(self):
+        """Test that requests outside a server process keep metrics in memory and write no files"""
+        from .metricas import registro, _volcar_al_salir
+        self.assertFalse(registro.activo)
+        with override_settings(METRICAS_INTERVALO=0):
+            self.client.get('/api/cursos/')
+            _volcar_al_salir()
+        self.assertEqual(list(Path(self.directorio.name).iterdir()), [])
+        self.assertIn('academia_peticiones_total{ruta="curso-list",metodo="GET",estado="200"} 1',
+                      self.client.get('/metrics').content.decode())
+
+    def test_many_observations_aggregate_into_buckets(self):
+        """Test that repeated observations end up as cumulative buckets, sum and count"""
+        from .metricas import exponer
+        etiquetas = (('ruta', 'curso-list'),)
+        n = 1024
+        for _ in range(n):
+            self.registro.observar('academia_peticion_duracion_segundos', etiquetas, 2 ** -7)  # bucket 0.01
+            self.registro.sumar('academia_peticiones_total', etiquetas)
+        self.registro.observar('academia_peticion_duracion_segundos', etiquetas, 0.375)     # bucket 0.5
+        texto = exponer()
+        nombre = 'academia_peticion_duracion_segundos'
+        self.assertIn(f'{nombre}_bucket{{ruta="curso-list",le="0.005"}} 0', texto)
+        self.assertIn(f'{nombre}_bucket{{ruta="curso-list",le="0.01"}} {n}', texto)
+        self.assertIn(f'{nombre}_bucket{{ruta="curso-list",le="0.25"}} {n}', texto)
+        self.assertIn(f'{nombre}_bucket{{ruta="curso-list",le="0.5"}} {n + 1}', texto)
+        self.assertIn(f'{nombre}_bucket{{ruta="curso-list",le="+Inf"}} {n + 1}', texto)
+        self.assertIn(f'{nombre}_sum{{ruta="curso-list"}} 8.375', texto)
+        self.assertIn(f'{nombre}_count{{ruta="curso-list"}} {n + 1}', texto)
+        self.assertIn(f'academia_peticiones_total{{ruta="curso-list"}} {n}', texto)
+
+
+class LoadtestTest(LiveServerTestCase):
+    """Test cases for the loadtest management command"""
+
+    def test_error_classes_and_percentiles(self):
+        """Test that failures are grouped by class and percentiles pick the right sample"""
+        from .management.commands.loadtest import ErrorPeticion, clasificar_error, percentil
+        self.assertEqual(clasificar_error(ErrorPeticion(500, "OperationalError: database is locked")), 'database is locked')
+        self.assertEqual(clasificar_error(ErrorPeticion(409, "{}")), '409')
+        self.assertEqual(clasificar_error(TimeoutError("timed out")), 'timeout')
+        self.assertEqual(clasificar_error(ConnectionRefusedError()), 'conexion (ConnectionRefusedError)')
+        valores = [i / 100 for i in range(1, 101)]
+        self.assertEqual(percentil(valores, 50), 0.51)
+        self.assertEqual(percentil(valores, 99), 1.0)
+
+    def test_run_against_server_and_compare(self):
+        """Test that a short open-loop run writes a JSON report that can be compared"""
+        with tempfile.TemporaryDirectory() as carpeta:
+            anterior = os.path.join(carpeta, 'anterior.json')
+            actual = os.path.join(carpeta, 'actual.json')
+            argumentos = dict(url=self.live_server_url, duracion=1, tasa=20, hilos=2, estudiantes=5, cursos=2,
+                              semilla=3, stdout=StringIO())
+            call_command('loadtest', salida=anterior, **argumentos)
+            salida = StringIO()
+            argumentos['stdout'] = salida
+            call_command('loadtest', salida=actual, comparar=anterior, **argumentos)
+            with open(actual, encoding='utf-8') as f:
+                informe = json.load(f)
+        self.assertGreater(informe['total']['peticiones'], 0)
+        self.assertGreater(informe['total']['correctas'], 0)
+        self.assertIn('p99_ms', informe['total'])
+        self.assertNotIn('database is locked', informe['total']['errores'])
+        self.assertIn("Comparación con la ejecución anterior", salida.getvalue())
+
+    def test_unknown_flow_in_mix(self):
+        """Test that an unknown flow in --mezcla is rejected"""
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('loadtest', url=self.live_server_url, mezcla='borrar_todo=1')
+
+
+class IdempotenciaTest(APITestCase):
+    """Test cases for Idempotency-Key on POST /estudiantes/ and /matriculas/"""
+
+    def setUp(self):
+        self.curso = Curso.objects.create(titulo='Elixir', descripcion='Curso de Elixir', fecha_inicio=date.today() + timedelta(days=5))
+        self.estudiante = Estudiante.objects.create(nombre='Reintentos', email='reintentos@test.com')
+
+    def test_retry_returns_stored_response_with_one_query(self):
+        """Test that a retried student creation replays the original 201 with a single read of the stored response"""
+        datos = {'nombre': 'Ana Idem', 'email': 'ana.idem@test.com'}
+        primera = self.client.post('/api/estudiantes/', datos, format='json', HTTP_IDEMPOTENCY_KEY='clave-1')
+        self.assertEqual(primera.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):
+            repetida = self.client.post('/api/estudiantes/', datos, format='json', HTTP_IDEMPOTENCY_KEY='clave-1')
+        self.assertEqual(repetida.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(Estudiante.objects.filter(email='ana.idem@test.com').count(), 1)
+
+        # Sin la cabecera el reintento se valida de nuevo
+        sin_clave = self.client.post('/api/estudiantes/', datos, format='json')
+        self.assertEqual(sin_clave.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retried_enrollment_is_not_a_conflict(self):
+        """Test that retrying an enrollment with the same key replays 201 instead of 409"""
+        datos = {'estudiante': self.estudiante.id, 'curso': self.curso.id}
+        primera = self.client.post('/api/matriculas/', datos, format='json', HTTP_IDEMPOTENCY_KEY='m-1')
+        repetida = self.client.post('/api/matriculas/', datos, format='json', HTTP_IDEMPOTENCY_KEY='m-1')
+        self.assertEqual(primera.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida.json()['id'], primera.json()['id'])
+        self.assertEqual(Matricula.objects.filter(estudiante=self.estudiante).count(), 1)
+
+    def test_key_reused_with_other_body(self):
+        """Test that reusing a key with a different body answers 422 and invalid keys 400"""
+        self.client.post('/api/estudiantes/', {'nombre': 'Uno', 'email': 'uno.idem@test.com'}, format='json', HTTP_IDEMPOTENCY_KEY='k')
+        response = self.client.post('/api/estudiantes/', {'nombre': 'Dos', 'email': 'dos.idem@test.com'}, format='json', HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(Estudiante.objects.filter(email='dos.idem@test.com').exists())
+        response = self.client.post('/api/estudiantes/', {'nombre': 'Dos', 'email': 'dos.idem@test.com'}, format='json', HTTP_IDEMPOTENCY_KEY='x' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keys_are_per_route(self):
+        """Test that the same key on another route is independent"""
+        self.client.post('/api/estudiantes/', {'nombre': 'Ruta', 'email': 'ruta.idem@test.com'}, format='json', HTTP_IDEMPOTENCY_KEY='r')
+        response = self.client.post('/api/matriculas/', {'estudiante': self.estudiante.id, 'curso': self.curso.id}, format='json', HTTP_IDEMPOTENCY_KEY='r')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_key_is_shared_between_workers(self):
+        """Test that a key reserved by one worker is seen in flight and then replayed by another"""
+        from .idempotencia import AlmacenIdempotencia
+        worker_a, worker_b = AlmacenIdempotencia(ttl=60, bloqueo=60), AlmacenIdempotencia(ttl=60, bloqueo=60)
+        self.assertEqual(worker_a.reservar('c', 'h'), ('ejecutar', None))
+        self.assertEqual(worker_b.reservar('c', 'h'), ('en_curso', None))
+        self.assertEqual(worker_b.reservar('c', 'otra'), ('distinta', None))
+
+        worker_a.terminar('c', 'h', (201, 'application/json', b'{}'))
+        self.assertEqual(worker_b.reservar('c', 'h'), ('repetir', (201, 'application/json', b'{}')))
+
+    def test_in_flight_duplicate_waits_for_original(self):
+        """Test that a duplicate arriving while the original runs in another worker waits and replays its response"""
+        from . import idempotencia
+        cuerpo = json.dumps({'nombre': 'Espera Idem', 'email': 'espera.idem@test.com'})
+        clave = hashlib.sha256(json.dumps(['estudiante-list', None, 'w-1']).encode()).hexdigest()
+        huella = hashlib.sha256(cuerpo.encode()).hexdigest()
+        otro_worker = idempotencia.AlmacenIdempotencia()
+        self.assertEqual(otro_worker.reservar(clave, huella), ('ejecutar', None))
+
+        def responde_el_original(segundos):
+            otro_worker.terminar(clave, huella, (201, 'application/json', b'{"id": 1}'))
+
+        with mock.patch.object(idempotencia.time, 'sleep', side_effect=responde_el_original) as espera:
+            response = self.client.post('/api/estudiantes/', cuerpo, content_type='application/json',
+                                        HTTP_IDEMPOTENCY_KEY='w-1')
+        self.assertEqual(espera.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertFalse(Estudiante.objects.filter(email='espera.idem@test.com').exists())
+
+    def test_server_errors_are_not_stored_and_keys_expire(self):
+        """Test that 5xx responses can be retried and that expired or abandoned keys can be claimed again"""
+        from .idempotencia import AlmacenIdempotencia
+        almacen = AlmacenIdempotencia(ttl=60, bloqueo=60)
+        almacen.reservar('fallo', 'h')
+        almacen.terminar('fallo', 'h')
+        self.assertEqual(almacen.reservar('fallo', 'h'), ('ejecutar', None))
+
+        caducadas = AlmacenIdempotencia(ttl=0, bloqueo=60)
+        caducadas.reservar('t', 'h')
+        caducadas.terminar('t', 'h', (201, 'application/json', b'{}'))
+        self.assertEqual(caducadas.reservar('t', 'otra'), ('ejecutar', None))
+
+        # La original murió sin responder: pasado el bloqueo otra petición reclama la clave
+        abandonadas = AlmacenIdempotencia(ttl=60, bloqueo=0)
+        abandonadas.reservar('muerta', 'h')
+        self.assertEqual(abandonadas.reservar('muerta', 'h'), ('ejecutar', None))
+        self.assertEqual(ClaveIdempotencia.objects.filter(clave='muerta').count(), 1)
+
+
+class CoalescenciaTest(APITestCase):
+    """Test cases for single-flight coalescing of expensive reads"""
+
+    def _peticiones_simultaneas(self, n, calcular, clave=lambda i: 'misma'):
+        from .coalescencia import Coalescedor
+        coalescedor = Coalescedor()
+        resultados = [None] * n
+        def pedir(i):
+            resultados[i] = coalescedor.compartir(clave(i), calcular, espera=5)
+        hilos = [threading.Thread(target=pedir, args=(i,)) for i in range(n)]
+        for hilo in hilos:
+            hilo.start()
+        return hilos, resultados, coalescedor
+
+    def test_concurrent_identical_calls_share_one_computation(self):
+        """Test that concurrent calls with the same key run the computation once"""
+        llamadas = []
+        liberar = threading.Event()
+        def calcular():
+            llamadas.append(1)
+            liberar.wait(5)
+            return b'resultado'
+        hilos, resultados, coalescedor = self._peticiones_simultaneas(8, calcular)
+        while coalescedor.en_curso() == 0:
+            time.sleep(0.001)
+        time.sleep(0.05)  # los demás hilos llegan mientras el primero calcula
+        liberar.set()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(llamadas), 1)
+        self.assertTrue(all(r == b'resultado' for r, _ in resultados))
+        self.assertEqual(sum(coalescida for _, coalescida in resultados), 7)
+        self.assertEqual(coalescedor.en_curso(), 0)
+
+    def test_different_keys_and_failures_are_not_shared(self):
+        """Test that other keys compute on their own and a failed leader lets waiters retry"""
+        llamadas = []
+        def calcular():
+            llamadas.append(1)
+            return len(llamadas)
+        hilos, resultados, _ = self._peticiones_simultaneas(3, calcular, clave=lambda i: i)
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(llamadas), 3)
+
+        from .coalescencia import Coalescedor
+        coalescedor = Coalescedor()
+        def fallar():
+            raise RuntimeError("fallo")
+        with self.assertRaises(RuntimeError):
+            coalescedor.compartir('k', fallar, espera=1)
+        self.assertEqual(coalescedor.compartir('k', lambda: 'ok', espera=1), ('ok', False))
+
+    def test_middleware_copies_rendered_response(self):
+        """Test that waiting requests get a copy of the first rendered response"""
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from django.urls import resolve
+        from rest_framework.response import Response
+        from .coalescencia import CoalescenciaMiddleware
+        middleware = CoalescenciaMiddleware(lambda request: None)
+        liberar = threading.Event()
+        llamadas = []
+        def vista(request, pk):
+            llamadas.append(pk)
+            liberar.wait(5)
+            return Response({'pk': pk})
+
+        respuestas = []
+        def pedir():
+            request = RequestFactory().get('/api/cursos/1/estudiantes/', {'b': '2', 'a': '1'})
+            request.resolver_match = resolve('/api/cursos/1/estudiantes/')
+            request.user = AnonymousUser()
+            respuesta = middleware.process_view(request, lambda r, pk: _renderizable(vista(r, pk)), (), {'pk': '1'})
+            respuestas.append(respuesta)
+        hilos = [threading.Thread(target=pedir) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(0.1)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(llamadas, ['1'])
+        self.assertEqual(sorted(r.get('X-Coalescida', 'no') for r in respuestas), ['no', 'true', 'true', 'true'])
+        self.assertTrue(all(json.loads(r.content) == {'pk': '1'} for r in respuestas))
+
+    def test_routes_still_answer_normally(self):
+        """Test that coalesced routes keep their normal responses and other routes are untouched"""
+        curso = Curso.objects.create(titulo='Haskell', descripcion='Curso de Haskell', fecha_inicio=date.today() + timedelta(days=5))
+        estudiante = Estudiante.objects.create(nombre='Coalescida', email='coalescida@test.com')
+        Matricula.objects.create(estudiante=estudiante, curso=curso)
+        response = self.client.get(f'/api/cursos/{curso.id}/estudiantes/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([e['email'] for e in response.json()], ['coalescida@test.com'])
+        self.assertNotIn('X-Coalescida', response)
+        self.assertEqual(self.client.get(f'/api/estudiantes/{estudiante.id}/reporte/').status_code, status.HTTP_200_OK)
+
+
+def _renderizable(datos):
+    # Respuesta de DRF lista para renderizar fuera de una vista (como la deja finalize_response)
+    from rest_framework.renderers import JSONRenderer
+    datos.accepted_renderer = JSONRenderer()
+    datos.accepted_media_type = 'application/json'
+    datos.renderer_context = {}
+    return datos
+
+
+class AcademiasTest(APITestCase):
+    """Test cases for per-academy databases selected by header or host"""
+    databases = '__all__'  # incluye las academias, registradas antes de preparar la clase
+
+    @classmethod
+    def setUpClass(cls):
+        from .academias import registrar_academia
+        cls.directorio = tempfile.TemporaryDirectory()
+        cls.ajustes = override_settings(ACADEMIAS={}, ALLOWED_HOSTS=['testserver', 'norte.test', 'sur.test'])
+        cls.ajustes.enable()
+        cls.aliases = [
+            registrar_academia('norte', hosts=['norte.test'], ruta=os.path.join(cls.directorio.name, 'norte.sqlite3')),
+            registrar_academia('sur', hosts=['sur.test'], ruta=os.path.join(cls.directorio.name, 'sur.sqlite3')),
+        ]
+        call_command('academias', 'migrar', '--academia', 'norte', '--academia', 'sur', verbosity=0, stdout=StringIO())
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.db import connections
+        super().tearDownClass()
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.ajustes.disable()
+        cls.directorio.cleanup()
+
+    def test_header_and_host_select_the_database(self):
+        """Test that each academy reads and writes only its own database"""
+        datos = {'nombre': 'Norteña', 'email': 'nortena@test.com'}
+        response = self.client.post('/api/estudiantes/', datos, format='json', HTTP_X_ACADEMIA='norte')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        estudiante_id = response.json()['id']
+
+        self.assertTrue(Estudiante.objects.using('academia_norte').filter(email='nortena@test.com').exists())
+        self.assertFalse(Estudiante.objects.using('academia_sur').filter(email='nortena@test.com').exists())
+        self.assertFalse(Estudiante.objects.filter(email='nortena@test.com').exists())
+
+        norte = self.client.get(f'/api/estudiantes/{estudiante_id}/', HTTP_HOST='norte.test')
+        sur = self.client.get(f'/api/estudiantes/{estudiante_id}/', HTTP_HOST='sur.test')
+        self.assertEqual(norte.json()['email'], 'nortena@test.com')
+        self.assertEqual(sur.status_code, status.HTTP_404_NOT_FOUND)
+        # El mismo email se puede dar de alta en otra academia
+        response = self.client.post('/api/estudiantes/', datos, format='json', HTTP_HOST='sur.test')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_enrollment_flow_inside_an_academy(self):
+        """Test that enrollments, counters and grading work against an academy database"""
+        cabecera = {'HTTP_X_ACADEMIA': 'sur'}
+        curso = self.client.post('/api/cursos/', {'titulo': 'Sur', 'descripcion': 'Curso del sur', 'fecha_inicio': str(date.today() + timedelta(days=9))}, format='json', **cabecera).json()
+        estudiante = self.client.post('/api/estudiantes/', {'nombre': 'Sureño', 'email': 'sureno@test.com'}, format='json', **cabecera).json()
+        response = self.client.post('/api/matriculas/', {'estudiante': estudiante['id'], 'curso': curso['id']}, format='json', **cabecera)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(f"/api/cursos/{curso['id']}/calificaciones/", {str(estudiante['id']): '8.5'}, format='json', **cabecera)
+        self.assertEqual(response.json(), {'actualizadas': 1})
+        response = self.client.get(f"/api/matriculas/?curso={curso['id']}&count=true", **cabecera)
+        self.assertEqual(response['X-Total-Count'], '1')
+        self.assertFalse(Matricula.objects.filter(curso_id=curso['id'], estudiante_id=estudiante['id']).exists())
+
+    def test_unknown_academy(self):
+        """Test that an unknown academy header answers 404 and an unknown host uses the default database"""
+        response = self.client.get('/api/estudiantes/', HTTP_X_ACADEMIA='oeste')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/estudiantes/').status_code, status.HTTP_200_OK)
+
+    def test_in_memory_state_is_per_academy(self):
+        """Test that idempotency keys and the course cache are namespaced by academy"""
+        datos = {'nombre': 'Clave', 'email': 'clave.academia@test.com'}
+        norte = self.client.post('/api/estudiantes/', datos, format='json', HTTP_X_ACADEMIA='norte', HTTP_IDEMPOTENCY_KEY='compartida')
+        sur = self.client.post('/api/estudiantes/', datos, format='json', HTTP_X_ACADEMIA='sur', HTTP_IDEMPOTENCY_KEY='compartida')
+        self.assertEqual(sur.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', sur)
+        self.assertEqual(norte.json()['id'], sur.json()['id'])  # mismos ids, bases de datos distintas
+        self.assertIsNot(elegibilidad.para('academia_norte'), elegibilidad.para('academia_sur'))
+
+    def test_shards_only_have_app_tables(self):
+        """Test that academy databases only get the academia_app tables"""
+        from django.db import connections
+        tablas = connections['academia_norte'].introspection.table_names()
+        self.assertIn('academia_app_matricula', tablas)
+        self.assertNotIn('auth_user', tablas)
+
+    def test_cross_academy_statistics_and_commands(self):
+        """Test the aggregate statistics and running a command in every academy"""
+        self.client.post('/api/estudiantes/', {'nombre': 'Uno', 'email': 'uno.stats@test.com'}, format='json', HTTP_X_ACADEMIA='norte')
+        salida = StringIO()
+        call_command('academias', 'estadisticas', '--json', stdout=salida)
+        datos = json.loads(salida.getvalue())
+        self.assertEqual(datos['academias']['academia_norte']['estudiantes'], datos['academias']['academia_sur']['estudiantes'] + 1)
+        self.assertEqual(datos['total']['estudiantes'], sum(a['estudiantes'] for a in datos['academias'].values()))
+
+        salida = StringIO()
+        call_command('academias', 'ejecutar', '--academia', 'norte', 'reconciliar_contadores', '--solo-comprobar', stdout=salida)
+        self.assertIn('== academia_norte', salida.getvalue())
+        self.assertIn('0 diferencias encontradas', salida.getvalue())
+
+
+class AutocompletadoTest(APITestCase):
+    """Test cases for the in-memory prefix autocomplete index"""
+
+    def setUp(self):
+        """Set up test data"""
+        from .autocompletado import indice
+        self.indice = indice
+        self.indice.limpiar()
+        self.zoe = Estudiante.objects.create(nombre='Zoé Núñez', email='zoe.nunez@test.com')
+        Estudiante.objects.create(nombre='Zoilo García', email='zoilo@test.com')
+        Estudiante.objects.create(nombre='Ana Zorrilla', email='ana.zorrilla@test.com')
+        self.curso = Curso.objects.create(titulo='Zoología Marina', descripcion='Curso', fecha_inicio=date.today() + timedelta(days=10))
+        self.url = '/api/autocomplete/'
+
+    def tearDown(self):
+        self.indice.limpiar()
+
+    def _textos(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [r['texto'] for r in response.data['resultados']]
+
+    def test_accent_and_case_insensitive_multiword_prefix(self):
+        """Test that 'zoe nu' finds Zoé Núñez and accented queries match unaccented input"""
+        self.assertEqual(self._textos('zoe nu'), ['Zoé Núñez'])
+        self.assertEqual(self._textos('ZOÉ'), ['Zoé Núñez'])
+        self.assertEqual(self._textos('zoologia'), ['Zoología Marina'])
+
+    def test_prefix_matches_any_word_and_email(self):
+        """Test that a prefix matches any word of the name and the full email"""
+        self.assertEqual(sorted(self._textos('zo', tipo='estudiante')), ['Ana Zorrilla', 'Zoilo García', 'Zoé Núñez'])
+        response = self.client.get(self.url, {'q': 'zoe.nun'})
+        self.assertEqual(response.data['resultados'], [
+            {'tipo': 'estudiante', 'id': self.zoe.id, 'texto': 'Zoé Núñez', 'detalle': 'zoe.nunez@test.com'}
+        ])
+        self.assertEqual(self._textos('unez'), [])
+
+    def test_tipo_and_limite(self):
+        """Test filtering by type, limiting results and validating parameters"""
+        self.assertEqual(self._textos('z', tipo='curso'), ['Zoología Marina'])
+        self.assertEqual(len(self._textos('z', limite=2)), 2)
+        self.assertEqual(self.client.get(self.url, {'q': 'z', 'tipo': 'profesor'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'q': 'z', 'limite': '0'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'q': 'z', 'limite': '²'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._textos(''), [])
+
+    def test_signals_keep_index_up_to_date(self):
+        """Test that creations, renames and deletions are reflected after commit without rebuilding"""
+        self._textos('zo')  # construye el índice
+        construcciones = self.indice.construcciones
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Estudiante.objects.create(nombre='Zacarías Martín', email='zacarias@test.com')
+        self.assertEqual(self._textos('zaca'), ['Zacarías Martín'])
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo.nombre, nuevo.email = 'Pedro Martín', 'pedro.martin@test.com'
+            nuevo.save()
+        self.assertEqual(self._textos('zaca'), [])
+        self.assertEqual(self._textos('pedro mar'), ['Pedro Martín'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.curso.delete()
+        self.assertEqual(self._textos('zoologia'), [])
+        self.assertEqual(self.indice.construcciones, construcciones)
+
+    def test_uncommitted_changes_are_not_indexed(self):
+        """Test that a creation rolled back never reaches the index"""
+        self._textos('zo')
+        with self.captureOnCommitCallbacks(execute=False):
+            Estudiante.objects.create(nombre='Zoraida Borja', email='zoraida@test.com')
+        self.assertEqual(self._textos('zora'), [])
+
+    def test_import_marks_index_for_rebuild(self):
+        """Test that a bulk import (no signals) triggers a rebuild on the next search"""
+        from .autocompletado import IndiceAutocompletado
+        indice = IndiceAutocompletado(reconstruir=3600)
+        indice.buscar('zo')
+        Estudiante.objects.bulk_create([Estudiante(nombre='Zuriñe Pons', email='zurine@test.com', seq=0)])
+        self.assertEqual(len(indice.buscar('zurine')), 0)
+        indice.caducar()
+        indice._reconstruir_en_segundo_plano = indice.construir  # en el test, en el mismo hilo y transacción
+        self.assertEqual([r['texto'] for r in indice.buscar('zurine')], ['Zuriñe Pons'])
+        self.assertEqual(indice.construcciones, 2)
+
+    def test_changes_during_rebuild_are_replayed(self):
+        """Test that changes arriving while the index is being rebuilt are applied after the swap"""
+        from .autocompletado import IndiceAutocompletado
+        indice = IndiceAutocompletado()
+        leer = indice._leer
+        def leer_con_cambio():
+            yield from leer()
+            indice.poner('estudiante', 999, 'Zenón Paz', 'zenon@test.com')
+        indice._leer = leer_con_cambio
+        indice.construir()
+        self.assertEqual([r['id'] for r in indice.buscar('zenon')], [999])
+
+    def test_search_over_large_index_and_memory(self):
+        """Test a multiword lookup over thousands of entries: no queries, right matches and memory reported"""
+        from .autocompletado import IndiceAutocompletado
+        indice = IndiceAutocompletado()
+        indice._leer = lambda: (('estudiante', i, f'Nombre{i % 97} Apellido{i}', f'alumno{i}@test.com') for i in range(20000))
+        indice.construir()
+        with self.assertNumQueries(0):
+            resultados = indice.buscar('nombre5 apellido1')
+        self.assertTrue(all(r['texto'].startswith('Nombre5') and ' Apellido1' in r['texto'] for r in resultados))
+        self.assertEqual(len(resultados), 10)
+        stats = indice.estadisticas()
+        self.assertEqual(stats['entradas'], 20000)
+        self.assertGreater(stats['bytes'], 20000 * 100)
+        response = self.client.get(self.url, {'q': 'zo'})
+        self.assertRegex(response['X-Autocompletado'], r'microsegundos=\d+; entradas=\d+; bytes=\d+')
+
+
+class ColumnasTest(APITestCase):
+    """Test cases for the columnar list format"""
+
+    def setUp(self):
+        """Set up test data"""
+        Matricula.objects.all().delete()  # sin las de los datos de ejemplo
+        self.cursos = [
+            Curso.objects.create(titulo=f'Curso {i}', descripcion='Curso', fecha_inicio=date.today() + timedelta(days=10))
+            for i in range(2)
+        ]
+        self.estudiantes = [Estudiante.objects.create(nombre=f'Alumno {i}', email=f'alumno{i}@test.com') for i in range(3)]
+        for estudiante in self.estudiantes:
+            for curso in self.cursos:
+                Matricula.objects.create(estudiante=estudiante, curso=curso)
+        Matricula.objects.filter(estudiante=self.estudiantes[0]).update(calificacion=Decimal('8.5'))
+        self.url = '/api/matriculas/'
+
+    def _como_filas(self, datos):
+        """Rebuild the row representation from the columnar one"""
+        filas = []
+        for i in range(datos['filas']):
+            fila = {}
+            for columna in datos['columnas']:
+                valor = datos['datos'][columna][i]
+                if columna in datos['diccionarios'] and valor is not None:
+                    valor = datos['diccionarios'][columna][valor]
+                fila[columna] = valor
+            filas.append(fila)
+        return filas
+
+    def test_columns_format_matches_row_format(self):
+        """Test that ?format=columns carries exactly the same data, in the same order, as the normal list"""
+        normal = self.client.get(self.url, {'ordering': 'calificacion'}).json()
+        response = self.client.get(self.url, {'ordering': 'calificacion', 'format': 'columns'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.academia.columns+json')
+        datos = response.json()
+        self.assertEqual(datos['filas'], 6)
+        self.assertEqual(self._como_filas(datos), normal)
+
+    def test_repeated_values_are_dictionary_encoded(self):
+        """Test that dates and grades go to dictionaries while ids stay as plain arrays"""
+        datos = self.client.get(self.url, {'format': 'columns'}).json()
+        self.assertEqual(datos['diccionarios']['fecha_matricula'], [date.today().isoformat()])
+        self.assertEqual(datos['datos']['fecha_matricula'], [0] * 6)
+        self.assertEqual(datos['diccionarios']['calificacion'], ['8.50'])
+        self.assertEqual(sorted(datos['datos']['calificacion'], key=lambda v: v is not None), [None] * 4 + [0, 0])
+        self.assertNotIn('estudiante', datos['diccionarios'])
+
+    def test_accept_header_and_filters(self):
+        """Test negotiation through Accept and that filters apply as in the normal list"""
+        response = self.client.get(self.url, {'curso': self.cursos[0].id}, HTTP_ACCEPT='application/vnd.academia.columns+json')
+        datos = response.json()
+        self.assertEqual(datos['filas'], 3)
+        self.assertEqual(set(datos['datos']['curso']), {self.cursos[0].id})
+        vacio = self.client.get(self.url, {'curso': 999999, 'format': 'columns'}).json()
+        self.assertEqual(vacio['filas'], 0)
+        self.assertEqual(vacio['datos']['id'], [])
+
+    def test_columns_with_archived_enrolments(self):
+        """Test that include_archived adds archived rows with null for the fields they lack"""
+        matricula = Matricula.objects.first()
+        MatriculaArchivada.objects.create(id=10**6, estudiante=matricula.estudiante, curso=matricula.curso,
+                                          fecha_matricula=date(2020, 1, 1), calificacion=Decimal('5'), anio=2020)
+        datos = self.client.get(self.url, {'format': 'columns', 'include_archived': 'true'}).json()
+        self.assertEqual(datos['filas'], 7)
+        self.assertEqual(datos['datos']['id'][-1], 10**6)
+        self.assertIsNone(datos['datos']['seq'][-1])
+
+    def test_other_endpoints_accept_columns(self):
+        """Test that students and courses also support the columnar format"""
+        datos = self.client.get('/api/estudiantes/', {'format': 'columns', 'search': 'Alumno'}).json()
+        self.assertEqual(sorted(datos['datos']['email']), [f'alumno{i}@test.com' for i in range(3)])
+        self.assertEqual(self.client.get('/api/cursos/', {'format': 'columns'}).json()['columnas'],
+                         ['id', 'seq', 'titulo', 'descripcion', 'fecha_inicio', 'activo'])
+
+
+class InstantaneaTest(APITestCase):
+    """Test cases for the point-in-time database snapshot"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(INSTANTANEAS_DIR=self.directorio.name)
+        self.ajustes.enable()
+        self.estudiante = Estudiante.objects.create(nombre='Ana Instantánea', email='ana.instantanea@test.com')
+        self.url = '/api/instantanea/'
+        from django.contrib.auth import get_user_model
+        self.staff = get_user_model().objects.create_user('backup', 'backup@test.com', 'clave-segura', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    def _abrir(self, contenido):
+        """Decompress a downloaded snapshot into a temporary SQLite file and open it"""
+        import gzip, sqlite3
+        ruta = os.path.join(self.directorio.name, 'descargada.sqlite3')
+        with open(ruta, 'wb') as fichero:
+            fichero.write(gzip.decompress(contenido))
+        conexion = sqlite3.connect(ruta)
+        self.addCleanup(conexion.close)
+        return conexion
+
+    def test_snapshot_requires_staff(self):
+        """Test that anonymous and non-staff users cannot download or trigger a snapshot"""
+        from django.contrib.auth import get_user_model
+        with mock.patch('academia_app.instantaneas.crear_instantanea') as crear:
+            self.client.logout()
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+            self.client.force_login(get_user_model().objects.create_user('alumno', 'alumno@test.com', 'clave-segura'))
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        crear.assert_not_called()
+
+    def test_snapshot_contains_only_academia_tables_at_current_seq(self):
+        """Test that the download is a gzipped SQLite file with the data tables and its watermark (ORM copy inside a transaction)"""
+        from .models import seq_actual
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['X-Instantanea-Seq'], str(seq_actual()))
+        conexion = self._abrir(b''.join(response.streaming_content))
+        tablas = {nombre for (nombre,) in conexion.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertEqual(tablas - {'sqlite_sequence'}, {
+            'academia_app_estudiante', 'academia_app_curso', 'academia_app_matricula',
+            'academia_app_matriculaarchivada', 'instantanea',
+        })
+        self.assertEqual(conexion.execute('SELECT COUNT(*) FROM academia_app_estudiante').fetchone()[0], Estudiante.objects.count())
+        self.assertEqual(conexion.execute('SELECT nombre FROM academia_app_estudiante WHERE id = ?', (self.estudiante.id,)).fetchone(),
+                         ('Ana Instantánea',))
+        self.assertEqual(conexion.execute('SELECT seq, academia FROM instantanea').fetchone(), (seq_actual(), 'default'))
+
+    def test_unchanged_data_reuses_snapshot_and_honours_etag(self):
+        """Test that without changes the same file is served and If-None-Match answers 304"""
+        primera = self.client.get(self.url)
+        b''.join(primera.streaming_content)
+        with mock.patch('academia_app.instantaneas.crear_instantanea') as crear:
+            segunda = self.client.get(self.url)
+            b''.join(segunda.streaming_content)
+            crear.assert_not_called()
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(INSTANTANEAS_CONSERVAR=2)
+    def test_changes_produce_new_snapshot_and_old_ones_are_purged(self):
+        """Test that a write moves the watermark, invalidates the ETag and old snapshots are removed"""
+        etags = []
+        for i in range(3):
+            Estudiante.objects.create(nombre=f'Nuevo {i}', email=f'nuevo{i}@test.com')
+            response = self.client.get(self.url)
+            b''.join(response.streaming_content)
+            etags.append(response['ETag'])
+            response.close()
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[0]).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(list(Path(self.directorio.name).glob('instantanea_*.sqlite3.gz'))), 2)
+
+    def test_read_transaction_copy_for_other_backends(self):
+        """Test the ORM copy used for non-SQLite backends produces the same tables and rows"""
+        import sqlite3
+        from django.db import connection
+        from .instantaneas import _copiar_por_orm
+        from .models import seq_actual
+        Matricula.objects.create(estudiante=self.estudiante, curso=Curso.objects.filter(activo=True, fecha_inicio__gte=date.today()).first()
+                                 or Curso.objects.create(titulo='Curso', descripcion='Curso', fecha_inicio=date.today() + timedelta(days=5)),
+                                 calificacion=Decimal('7.25'))
+        ruta = os.path.join(self.directorio.name, 'orm.sqlite3')
+        self.assertEqual(_copiar_por_orm(connection, ruta), seq_actual())
+        conexion = sqlite3.connect(ruta)
+        self.addCleanup(conexion.close)
+        self.assertEqual(conexion.execute('SELECT COUNT(*) FROM academia_app_matricula').fetchone()[0], Matricula.objects.count())
+        self.assertIn(('7.25',), conexion.execute('SELECT CAST(calificacion AS TEXT) FROM academia_app_matricula').fetchall())
+
+    def test_management_command_writes_snapshot(self):
+        """Test the instantanea command copies the snapshot to --salida"""
+        salida = os.path.join(self.directorio.name, 'copia.sqlite3.gz')
+        out = StringIO()
+        call_command('instantanea', '--salida', salida, stdout=out)
+        self.assertIn('Instantánea del seq', out.getvalue())
+        with open(salida, 'rb') as fichero:
+            conexion = self._abrir(fichero.read())
+        self.assertEqual(conexion.execute('SELECT COUNT(*) FROM academia_app_estudiante').fetchone()[0], Estudiante.objects.count())
+
+
+class InstantaneaBackupTest(TransactionTestCase):
+    """Test cases for the snapshot taken with the SQLite online backup API"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(INSTANTANEAS_DIR=self.directorio.name, INSTANTANEAS_PAGINAS_POR_PASO=1)
+        self.ajustes.enable()
+        Estudiante.objects.bulk_create([Estudiante(nombre=f'Copia {i}', email=f'copia{i}@test.com') for i in range(200)])
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    def _leer(self, ruta):
+        import gzip, sqlite3
+        descomprimida = os.path.join(self.directorio.name, 'leida.sqlite3')
+        with gzip.open(ruta) as origen, open(descomprimida, 'wb') as destino:
+            destino.write(origen.read())
+        conexion = sqlite3.connect(descomprimida)
+        self.addCleanup(conexion.close)
+        return conexion
+
+    def test_online_backup_copies_data_tables(self):
+        """Test that the backup keeps only the data tables and records the seq of the copy"""
+        from .instantaneas import crear_instantanea
+        from .models import seq_actual
+        seq, ruta = crear_instantanea()
+        self.assertEqual(seq, seq_actual())
+        conexion = self._leer(ruta)
+        self.assertEqual(conexion.execute('SELECT COUNT(*) FROM academia_app_estudiante').fetchone()[0], Estudiante.objects.count())
+        self.assertIsNone(conexion.execute("SELECT name FROM sqlite_master WHERE name = 'auth_user'").fetchone())
+
+    @override_settings(INSTANTANEAS_MAX_REINICIOS=1)
+    def test_repeated_restarts_fall_back_to_single_step_copy(self):
+        """Test that when writes keep restarting the stepped backup it is redone in a single step"""
+        from django.db import connection
+        from .instantaneas import _copiar_sqlite
+        connection.ensure_connection()
+        llamadas = []
+
+        class OrigenConEscrituras:
+            """Source whose stepped backup is restarted by concurrent writes"""
+            def backup(self, destino, pages, progress=None):
+                llamadas.append(pages)
+                if progress is not None:
+                    for restantes in (5, 3, 8, 2, 9):  # dos reinicios
+                        progress(0, restantes, 10)
+                connection.connection.backup(destino, pages=pages)
+
+        class Conexion:
+            def ensure_connection(self):
+                pass
+            connection = OrigenConEscrituras()
+
+        ruta = os.path.join(self.directorio.name, 'copia.sqlite3')
+        _copiar_sqlite(Conexion(), ruta)
+        self.assertEqual(llamadas, [1, -1])
+
+
+class BorradoTest(APITestCase):
+    """Test cases for batched deletion of courses and students"""
+
+    def setUp(self):
+        self.client = APIClient(HTTP_HOST='academia-django.onrender.com')
+        self.curso = Curso.objects.create(titulo='Topología Borrable', descripcion='d', fecha_inicio=date.today() + timedelta(days=30))
+        self.otro = Curso.objects.create(titulo='Geometría Superviviente', descripcion='d', fecha_inicio=date.today() + timedelta(days=30))
+        self.estudiantes = [
+            Estudiante.objects.create(nombre=f'Borrable {i}', email=f'borrable{i}@test.com') for i in range(5)
+        ]
+        self.matriculas = [Matricula.objects.create(estudiante=e, curso=self.curso) for e in self.estudiantes]
+        Matricula.objects.create(estudiante=self.estudiantes[0], curso=self.otro)
+
+    def test_delete_course_removes_enrolments_in_batches(self):
+        """Deleting a course removes its enrolments batch by batch without per-row post_delete"""
+        from django.db.models.signals import post_delete
+        from .borrado import matriculas_eliminadas
+        lotes, por_fila = [], []
+        matriculas_eliminadas.connect(lambda sender, filas, **kw: lotes.append(len(filas)), sender=Matricula, weak=False,
+                                      dispatch_uid='test_lotes')
+        post_delete.connect(lambda sender, **kw: por_fila.append(1), sender=Matricula, weak=False, dispatch_uid='test_fila')
+        try:
+            with self.settings(BORRADO_TAMANO_LOTE=2), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(f'/api/cursos/{self.curso.id}/')
+        finally:
+            matriculas_eliminadas.disconnect(sender=Matricula, dispatch_uid='test_lotes')
+            post_delete.disconnect(sender=Matricula, dispatch_uid='test_fila')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(lotes, [2, 2, 1])
+        self.assertEqual(por_fila, [])
+        self.assertFalse(Curso.objects.filter(pk=self.curso.pk).exists())
+        self.assertFalse(Matricula.objects.filter(curso_id=self.curso.pk).exists())
+        self.assertEqual(Matricula.objects.filter(curso=self.otro).count(), 1)
+
+    def test_batched_delete_keeps_counters_tombstones_and_events(self):
+        """Counters, deletion marks and SSE events match what per-row deletes would produce"""
+        from .models import Eliminacion
+        ids = sorted(m.id for m in self.matriculas)
+        previos = {id(e) for e in difusor._historial}  # el historial es del proceso: trae eventos de otros tests
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/cursos/{self.curso.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(contadores.reconciliar(corregir=False), [])
+        self.assertEqual(contadores.valor(contadores.clave(Matricula, 'curso_id', self.curso.pk)), 0)
+        self.assertEqual(contadores.valor(contadores.clave(Matricula, 'estudiante_id', self.estudiantes[0].pk)), 1)
+        marcas = Eliminacion.objects.filter(modelo='matricula', objeto_id__in=ids)
+        self.assertEqual(sorted(marcas.values_list('objeto_id', flat=True)), ids)
+        self.assertEqual(len(set(marcas.values_list('seq', flat=True))), len(ids))
+        self.assertTrue(Eliminacion.objects.filter(modelo='curso', objeto_id=self.curso.pk).exists())
+        eventos = [e for e in difusor._historial if id(e) not in previos and e.tipo == 'matricula.eliminada']
+        self.assertEqual(sorted(e.datos['matricula'] for e in eventos), ids)
+
+    def test_delete_student_removes_enrolments_and_archived(self):
+        """Deleting a student also removes its archived enrolments and updates per-course counters"""
+        estudiante = self.estudiantes[0]
+        MatriculaArchivada.objects.create(id=10**6, estudiante=estudiante, curso=self.curso,
+                                          fecha_matricula=date(2020, 1, 1), anio=2020)
+        response = self.client.delete(f'/api/estudiantes/{estudiante.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Matricula.objects.filter(estudiante_id=estudiante.pk).exists())
+        self.assertFalse(MatriculaArchivada.objects.filter(estudiante_id=estudiante.pk).exists())
+        self.assertEqual(contadores.valor(contadores.clave(Matricula, 'curso_id', self.curso.pk)), 4)
+        self.assertEqual(contadores.valor(contadores.clave(Matricula, 'curso_id', self.otro.pk)), 0)
+
+    @override_settings(BORRADO_LIMITE_SINCRONO=2)
+    def test_large_delete_runs_as_background_job(self):
+        """Over the synchronous limit DELETE answers 202 with a job that can be polled"""
+        from . import borrado
+        tareas = []
+        with mock.patch.object(borrado, '_en_segundo_plano', tareas.append), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/cursos/{self.curso.id}/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        trabajo_id = response.data['id']
+        self.assertEqual(response['Location'], f'/api/borrados/{trabajo_id}/')
+        self.assertEqual(response.data['estado'], 'pendiente')
+        self.assertEqual(response.data['total'], 5)
+        self.assertEqual(len(tareas), 1)
+        self.assertTrue(Curso.objects.filter(pk=self.curso.pk).exists())
+
+        # Un segundo DELETE mientras tanto devuelve el mismo trabajo
+        with mock.patch.object(borrado, '_en_segundo_plano', tareas.append):
+            repetido = self.client.delete(f'/api/cursos/{self.curso.id}/')
+        self.assertEqual(repetido.data['id'], trabajo_id)
+
+        borrado.ejecutar(trabajo_id)
+        estado = self.client.get(f'/api/borrados/{trabajo_id}/')
+        self.assertEqual(estado.status_code, status.HTTP_200_OK)
+        self.assertEqual(estado.data['estado'], 'completado')
+        self.assertEqual(estado.data['borradas'], 5)
+        self.assertFalse(Curso.objects.filter(pk=self.curso.pk).exists())
+
+    def test_resume_interrupted_jobs(self):
+        """procesar_borrados finishes jobs left pending or in progress"""
+        from .models import TrabajoBorrado
+        trabajo = TrabajoBorrado.objects.create(modelo='estudiante', objeto_id=self.estudiantes[1].pk,
+                                                estado='en_curso', total=1)
+        TrabajoBorrado.objects.filter(pk=trabajo.pk).update(actualizado=timezone.now() - timedelta(hours=1))
+        out = StringIO()
+        call_command('procesar_borrados', stdout=out)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertFalse(Estudiante.objects.filter(pk=self.estudiantes[1].pk).exists())
+
+    def test_running_job_is_not_taken_twice(self):
+        """A job another thread is still running (recent progress) is left alone by procesar_borrados"""
+        from . import borrado
+        from .models import TrabajoBorrado
+        trabajo = TrabajoBorrado.objects.create(modelo='curso', objeto_id=self.curso.pk, estado='en_curso', total=5)
+        self.assertEqual(borrado.reanudar(), 0)
+        self.assertFalse(borrado.ejecutar(trabajo.pk))
+        self.assertEqual(Matricula.objects.filter(curso=self.curso).count(), 5)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'en_curso')
+
+    def test_archived_batches_renew_the_job_heartbeat(self):
+        """Every batch, also of archived enrolments, reports progress so a long purge is not taken as dead"""
+        from .borrado import borrar
+        for i, estudiante in enumerate(self.estudiantes[:3]):
+            MatriculaArchivada.objects.create(id=10**6 + i, estudiante=estudiante, curso=self.curso,
+                                              fecha_matricula=date(2020, 1, 1), anio=2020)
+        progreso = mock.Mock()
+        self.assertEqual(borrar(self.curso, tamano_lote=2, progreso=progreso), 5)
+        # 3 lotes de matrículas (2 + 2 + 1) y 2 de archivadas (2 + 1), estos con el total de matrículas ya borradas
+        self.assertEqual([c.args[0] for c in progreso.call_args_list], [2, 4, 5, 5, 5])
+
+    def test_failed_jobs_are_retried(self):
+        """A job in error is retried by procesar_borrados once BORRADO_CADUCIDAD has passed, and by a repeated DELETE"""
+        from . import borrado
+        from .models import TrabajoBorrado
+        trabajo = TrabajoBorrado.objects.create(modelo='curso', objeto_id=self.curso.pk, estado='error',
+                                                error='database is locked', total=5)
+        self.assertEqual(borrado.reanudar(), 0)  # acaba de fallar: todavía no
+        TrabajoBorrado.objects.filter(pk=trabajo.pk).update(actualizado=timezone.now() - timedelta(hours=1))
+        self.assertEqual(borrado.reanudar(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.error, trabajo.borradas), ('completado', '', 5))
+
+        fallido = TrabajoBorrado.objects.create(modelo='curso', objeto_id=self.otro.pk, estado='error', total=1)
+        tareas = []
+        with override_settings(BORRADO_LIMITE_SINCRONO=0), mock.patch.object(borrado, '_en_segundo_plano', tareas.append), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/cursos/{self.otro.id}/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['id'], response.data['estado']), (fallido.id, 'pendiente'))
+        self.assertEqual(len(tareas), 1)
+
+    def test_batch_is_retried_when_fewer_rows_are_deleted(self):
+        """If the DELETE removes fewer rows than were read the batch is rolled back and no signal is sent for it"""
+        from django.db.models.query import QuerySet
+        from .borrado import borrar, matriculas_eliminadas
+        from .models import Eliminacion
+        real = QuerySet._raw_delete
+        intentos = []
+
+        def con_borrado_concurrente(queryset, using):
+            if not intentos and queryset.model is Matricula:
+                intentos.append(1)
+                Matricula.objects.filter(pk=self.matriculas[0].pk).delete()  # "otra transacción" se adelanta
+            return real(queryset, using)
+
+        lotes = []
+        matriculas_eliminadas.connect(lambda sender, filas, **kw: lotes.append(len(filas)), sender=Matricula, weak=False,
+                                      dispatch_uid='test_reintento')
+        try:
+            with mock.patch.object(QuerySet, '_raw_delete', con_borrado_concurrente):
+                self.assertEqual(borrar(self.curso), 5)
+        finally:
+            matriculas_eliminadas.disconnect(sender=Matricula, dispatch_uid='test_reintento')
+        self.assertEqual(lotes, [5])
+        ids = [m.pk for m in self.matriculas]
+        self.assertEqual(Eliminacion.objects.filter(modelo='matricula', objeto_id__in=ids).count(), 5)
+        self.assertEqual(contadores.reconciliar(corregir=False), [])
+
+
+class ValidacionCambiosTest(APITestCase):
+    """Test cases for change-aware validation of enrollments"""
+
+    def setUp(self):
+        self.client = APIClient(HTTP_HOST='academia-django.onrender.com')
+        futuro = date.today() + timedelta(days=30)
+        self.curso = Curso.objects.create(titulo='Cálculo Calificable', descripcion='d', fecha_inicio=futuro)
+        self.otro = Curso.objects.create(titulo='Óptica Calificable', descripcion='d', fecha_inicio=futuro)
+        self.empezado = Curso.objects.create(titulo='Mecánica Empezada', descripcion='d',
+                                             fecha_inicio=date.today() - timedelta(days=10))
+        self.ana = Estudiante.objects.create(nombre='Ana Calificable', email='ana.calificable@test.com')
+        self.bea = Estudiante.objects.create(nombre='Bea Calificable', email='bea.calificable@test.com')
+        self.matricula = Matricula.objects.create(estudiante=self.ana, curso=self.curso)
+        Matricula.objects.create(estudiante=self.bea, curso=self.curso)
+        # El curso empieza después de matricular
+        Curso.objects.filter(pk=self.curso.pk).update(fecha_inicio=date.today() - timedelta(days=1), activo=False)
+
+    def test_grade_change_runs_no_rules(self):
+        """Changing only the grade of a loaded enrollment skips every rule and queries nothing"""
+        matricula = Matricula.objects.get(pk=self.matricula.pk)
+        matricula.calificacion = Decimal('8.50')
+        self.assertEqual(matricula.reglas_afectadas(), [])
+        with self.assertNumQueries(0):
+            matricula.clean()
+
+    def test_rules_follow_changed_fields(self):
+        """Each rule runs only when one of its fields changes; new enrollments run all of them"""
+        matricula = Matricula.objects.get(pk=self.matricula.pk)
+        matricula.curso_id = self.curso.pk  # mismo valor: no cuenta como cambio
+        self.assertEqual(matricula.reglas_afectadas(), [])
+        matricula.estudiante = self.bea
+        self.assertEqual(matricula.reglas_afectadas(), [Matricula._validar_duplicado])
+        matricula.curso = self.otro
+        self.assertEqual(matricula.reglas_afectadas(), [Matricula._validar_curso, Matricula._validar_duplicado])
+        nueva = Matricula(estudiante=self.bea, curso=self.otro)
+        self.assertEqual(len(nueva.reglas_afectadas()), len(Matricula.REGLAS))
+
+    def test_patch_grade_on_started_course(self):
+        """PATCH of the grade succeeds after the course started, without course or duplicate queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.patch(f'/api/matriculas/{self.matricula.id}/', {'calificacion': '9.25'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['calificacion'], '9.25')
+        self.matricula.refresh_from_db()
+        self.assertEqual(self.matricula.calificacion, Decimal('9.25'))
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        self.assertFalse([s for s in sql if 'academia_app_curso' in s], sql)
+        self.assertFalse([s for s in sql if s.startswith('SELECT 1 AS "a"')], sql)
+
+    def test_patch_changing_course_or_student_is_validated(self):
+        """Moving an enrollment to a started course or onto an existing enrollment is still rejected"""
+        response = self.client.patch(f'/api/matriculas/{self.matricula.id}/', {'curso': self.empezado.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ya comenzó', str(response.data))
+        response = self.client.patch(f'/api/matriculas/{self.matricula.id}/', {'estudiante': self.bea.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.matricula.refresh_from_db()
+        self.assertEqual((self.matricula.curso_id, self.matricula.estudiante_id), (self.curso.id, self.ana.id))
+        response = self.client.patch(f'/api/matriculas/{self.matricula.id}/', {'curso': self.otro.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import F
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.response import Response
+
+# Versionado de filas con ETag. La versión es el seq del último cambio (ModeloSincronizado),
+# que cambia en cada escritura, incluidas las masivas.
+#  - GET detalle con If-None-Match: 304 sin serializar si la versión no ha cambiado.
+#  - PUT/PATCH con If-Match: solo se aplica si la fila sigue en esa versión; si no, 412.
+
+parametro_if_match = openapi.Parameter(
+    'If-Match',
+    openapi.IN_HEADER,
+    description="ETag recibido en el GET. Si la fila ha cambiado desde entonces responde 412",
+    type=openapi.TYPE_STRING,
+    required=False
+)
+
+
+def etag(seq):
+    return f'"{seq}"'
+
+
+def _versiones(cabecera):
+    """Versiones de una cabecera If-Match / If-None-Match. None significa '*' (cualquiera)."""
+    versiones = set()
+    for valor in cabecera.split(','):
+        valor = valor.strip()
+        if valor == '*':
+            return None
+        valor = valor.removeprefix('W/').strip('"')
+        if valor.isascii() and valor.isdigit():  # isdigit() también acepta '²', que int() rechaza
+            versiones.add(int(valor))
+    return versiones
+
+
+class VersionadoMixin:
+    """ETag, If-None-Match y If-Match para el detalle de un ModelViewSet de un ModeloSincronizado."""
+
+    def _pk(self):
+        return self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+
+    def retrieve(self, request, *args, **kwargs):
+        cabecera = request.headers.get('If-None-Match')
+        if cabecera:
+            # Solo se lee el seq de la fila; si coincide no hace falta cargar ni serializar el objeto.
+            # Un pk mal formado (/estudiantes/abc/) sigue hasta super().retrieve(), que responde 404
+            try:
+                seq = self.get_queryset().filter(pk=self._pk()).values_list('seq', flat=True).first()
+            except (TypeError, ValueError, ValidationError):
+                seq = None
+            versiones = _versiones(cabecera)
+            if seq is not None and (versiones is None or seq in versiones):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag(seq)})
+        respuesta = super().retrieve(request, *args, **kwargs)
+        respuesta['ETag'] = etag(respuesta.data['seq'])
+        return respuesta
+
+    def update(self, request, *args, **kwargs):
+        cabecera = request.headers.get('If-Match')
+        if not cabecera:
+            respuesta = super().update(request, *args, **kwargs)
+        else:
+            instancia = self.get_object()
+            versiones = _versiones(cabecera)
+            with transaction.atomic(using=router.db_for_write(instancia.__class__, instance=instancia)):
+                # UPDATE condicional sin cambios: bloquea la fila y comprueba la versión en la misma sentencia,
+                # así dos PUT con el mismo ETag no pueden pasar los dos
+                condicion = {'pk': instancia.pk} if versiones is None else {'pk': instancia.pk, 'seq__in': versiones}
+                if not self.get_queryset().model.objects.filter(**condicion).update(seq=F('seq')):
+                    actual = self.get_queryset().filter(pk=instancia.pk).values_list('seq', flat=True).first()
+                    return Response(
+                        {"error": "El registro ha cambiado desde que se leyó.", "version_actual": etag(actual)},
+                        status=status.HTTP_412_PRECONDITION_FAILED,
+                        headers={'ETag': etag(actual)},
+                    )
+                respuesta = super().update(request, *args, **kwargs)
+        if respuesta.status_code < 300:
+            respuesta['ETag'] = etag(respuesta.data['seq'])
+        return respuesta
@@ -1,11 +1,35 @@
+import asyncio
+import time
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from rest_framework.exceptions import ValidationError
-from rest_framework import viewsets, status
+from rest_framework import mixins, permissions, viewsets, status
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import IntegrityError 
-from .models import Estudiante, Curso, Matricula
-from .serializers import EstudianteSerializer, CursoSerializer, MatriculaSerializer
+from .academias import alias_actual
+from .models import Estudiante, Curso, Matricula, MatriculaArchivada, TrabajoBorrado, TrabajoReporte, seq_actual
+from .serializers import EstudianteSerializer, CursoSerializer, MatriculaSerializer, MatriculaArchivadaSerializer, TrabajoBorradoSerializer, TrabajoReporteSerializer
 from rest_framework.response import Response
 from rest_framework.decorators import action #para rutas personalizadas
 from rest_framework import filters
+from rest_framework.parsers import MultiPartParser
+from .autocompletado import TIPOS as TIPOS_AUTOCOMPLETADO, indice as autocompletado
+from .borrado import BorradoMixin
+from .cache_cursos import elegibilidad
+from .columnas import ColumnasMixin, columnas, parametro_format
+from .calificaciones import registrar_calificaciones
+from .contadores import ConteoMixin, parametro_count
+from .eventos import difusor
+from .expediente import construir_expediente
+from .filtros import FiltroCampos
+from .idempotencia import parametro_idempotency_key
+from .importacion import FORMATOS, CodificacionNoValida, detectar_formato, importar_estudiantes
+from .instantaneas import instantanea_actual
+from .lotes import LoteMixin, parametro_ids
+from . import metricas as registro_metricas
+from . import perfilado
+from .sincronizacion import SincronizacionMixin, parametro_since
+from .versionado import VersionadoMixin, parametro_if_match
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -13,15 +37,16 @@ from drf_yasg import openapi
 
 #opcion2 usar DRF routers con la clases. Remplaza las rutas en app y en prueba
 
-class EstudianteViewSet(viewsets.ModelViewSet):
+class EstudianteViewSet(LoteMixin, SincronizacionMixin, ConteoMixin, ColumnasMixin, VersionadoMixin, BorradoMixin, viewsets.ModelViewSet):
     
     queryset = Estudiante.objects.all()
     serializer_class = EstudianteSerializer
 
     # Param  POST ESTUDIANTE
     @swagger_auto_schema(
-    operation_description="Crear un nuevo estudiante",
+    operation_description="Crear un nuevo estudiante. Con Idempotency-Key los reintentos devuelven la respuesta original",
     request_body=EstudianteSerializer,
+    manual_parameters=[parametro_idempotency_key],
     responses={
         201: EstudianteSerializer,
         400: "Datos inválidos"
@@ -32,19 +57,25 @@ class EstudianteViewSet(viewsets.ModelViewSet):
     
     #Param PUT ESTUDIANTE
     @swagger_auto_schema(
-    operation_description="Actualizar un estudiante existente",
+    operation_description="Actualizar un estudiante existente. Con If-Match solo se aplica si no ha cambiado desde que se leyó",
     request_body=EstudianteSerializer,
+    manual_parameters=[parametro_if_match],
     responses={
         200: EstudianteSerializer,
         400: "Datos inválidos",
-        404: "Estudiante no encontrado"
+        404: "Estudiante no encontrado",
+        412: "El estudiante ha cambiado (If-Match no coincide)"
     }
 )
     def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
     
     #Filtros por termino y orden GET
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FiltroCampos, filters.SearchFilter, filters.OrderingFilter]
+    campos_filtro = {
+        'fecha_registro__gte': ('fecha_registro__gte', 'fecha'),
+        'fecha_registro__lte': ('fecha_registro__lte', 'fecha'),
+    }
     search_fields = ['nombre', 'email']  # Búsqueda en nombre y email
     ordering_fields = ['nombre', 'email', 'fecha_registro']  # Campos para ordenar
     ordering = ['nombre']  # Orden alfabético por defecto
@@ -65,9 +96,29 @@ class EstudianteViewSet(viewsets.ModelViewSet):
                 description="Ordenar resultados por: nombre, -nombre, email, -email, fecha_registro, -fecha_registro",
                 type=openapi.TYPE_STRING,
                 required=False
-            )
+            ),
+            openapi.Parameter(
+                'fecha_registro__gte',
+                openapi.IN_QUERY,
+                description="Registrados desde esta fecha (incluida). Ej: 2025-01-01",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=False
+            ),
+            openapi.Parameter(
+                'fecha_registro__lte',
+                openapi.IN_QUERY,
+                description="Registrados hasta esta fecha (incluida). Ej: 2025-12-31",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=False
+            ),
+            parametro_since,
+            parametro_ids,
+            parametro_count,
+            parametro_format
         ],
-        operation_description="Lista todos los estudiantes con opciones de búsqueda y ordenamiento"
+        operation_description="Lista todos los estudiantes con opciones de filtrado, búsqueda y ordenamiento"
     )
     def list(self, request, *args, **kwargs):
         """
@@ -149,13 +200,129 @@ class EstudianteViewSet(viewsets.ModelViewSet):
 
         return Response(data)
 
-class CursoViewSet(viewsets.ModelViewSet):  
+    # ENDPOINT compuesto GET estudiantes/{id}/expediente/ (datos + matrículas con curso + estadísticas)
+    @swagger_auto_schema(
+        operation_description="Expediente completo del estudiante en una sola petición: sus datos, sus matrículas con el curso "
+                              "y las estadísticas. Cada sección se puede omitir y elegir sus campos",
+        manual_parameters=[
+            openapi.Parameter(
+                'secciones',
+                openapi.IN_QUERY,
+                description="Secciones a incluir: estudiante, matriculas, estadisticas. Por defecto todas",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'campos_estudiante',
+                openapi.IN_QUERY,
+                description="Campos del estudiante: id, nombre, email, fecha_registro, seq. Ej: nombre,email",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'campos_matricula',
+                openapi.IN_QUERY,
+                description="Campos de cada matrícula: id, fecha_matricula, calificacion, seq. Ej: calificacion",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'campos_curso',
+                openapi.IN_QUERY,
+                description="Campos del curso de cada matrícula: id, titulo, descripcion, fecha_inicio, activo. Ej: titulo",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Expediente del estudiante",
+                examples={
+                    "application/json": {
+                        "estudiante": {"id": 1, "nombre": "María García", "email": "maria@email.com"},
+                        "matriculas": [
+                            {"id": 4, "calificacion": "8.50", "curso": {"id": 2, "titulo": "Matemáticas"}}
+                        ],
+                        "estadisticas": {
+                            "total_cursos": 1, "cursos_activos": 1, "calificadas": 1,
+                            "media_calificacion": 8.5, "mejor_calificacion": "8.50", "peor_calificacion": "8.50"
+                        }
+                    }
+                }
+            ),
+            400: "Sección o campo no válido",
+            404: "Estudiante no encontrado"
+        }
+    )
+    @action(detail=True, methods=['get'], url_path='expediente')
+    def expediente(self, request, pk=None):
+        return Response(construir_expediente(self.get_object(), request.query_params))
+
+    # ENDPOINT importación masiva POST estudiantes/importar/
+    @swagger_auto_schema(
+        operation_description="Importa estudiantes desde un fichero CSV (columnas nombre,email) o NDJSON. "
+                              "Si el email ya existe se actualiza el nombre.",
+        manual_parameters=[
+            openapi.Parameter(
+                'fichero',
+                openapi.IN_FORM,
+                description="Fichero .csv, .ndjson o .jsonl",
+                type=openapi.TYPE_FILE,
+                required=True
+            ),
+            openapi.Parameter(
+                'formato',
+                openapi.IN_FORM,
+                description="csv o ndjson. Por defecto se deduce de la extensión",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Informe de la importación",
+                examples={
+                    "application/json": {
+                        "procesadas": 3,
+                        "creados": 1,
+                        "actualizados": 1,
+                        "total_errores": 1,
+                        "errores": [{"linea": 3, "email": "no-es-un-email", "error": "Enter a valid email address."}],
+                        "errores_omitidos": 0
+                    }
+                }
+            ),
+            400: "Falta el fichero, el formato no es válido o el fichero no está en UTF-8"
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='importar', parser_classes=[MultiPartParser])
+    def importar(self, request):
+        fichero = request.FILES.get('fichero')
+        if fichero is None:
+            return Response({"error": "Falta el fichero."}, status=status.HTTP_400_BAD_REQUEST)
+        formato = request.data.get('formato') or detectar_formato(fichero.name)
+        if formato not in FORMATOS:
+            return Response({"error": f"Formato no soportado: {formato}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            informe = importar_estudiantes(fichero, formato)
+        except CodificacionNoValida as e:
+            # Lo anterior al error ya está guardado; al volver a subir el fichero en UTF-8 esas filas se actualizan
+            return Response({"error": f"{e} Guárdalo como UTF-8 y vuelve a subirlo.", **e.informe.como_dict()},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(informe.como_dict())
+
+class CursoViewSet(LoteMixin, SincronizacionMixin, ConteoMixin, ColumnasMixin, VersionadoMixin, BorradoMixin, viewsets.ModelViewSet):  
     queryset = Curso.objects.all()
     serializer_class = CursoSerializer
 
     #Filtros por termino y orden
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['activo']  # Aparece como parámetro filter[activo]
+    filter_backends = [FiltroCampos, filters.SearchFilter, filters.OrderingFilter]
+    campos_filtro = {
+        'activo': ('activo', 'booleano'),
+        'fecha_inicio__gte': ('fecha_inicio__gte', 'fecha'),
+        'fecha_inicio__lte': ('fecha_inicio__lte', 'fecha'),
+    }
     search_fields = ['titulo', 'descripcion']  # Aparece como parámetro search
     ordering_fields = ['titulo', 'fecha_inicio']  # Aparece como parámetro ordering
 
@@ -169,6 +336,22 @@ class CursoViewSet(viewsets.ModelViewSet):
                 type=openapi.TYPE_BOOLEAN, 
                 required=False
             ),
+            openapi.Parameter(
+                'fecha_inicio__gte',
+                openapi.IN_QUERY,
+                description="Cursos que empiezan desde esta fecha (incluida). Ej: 2025-09-01",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=False
+            ),
+            openapi.Parameter(
+                'fecha_inicio__lte',
+                openapi.IN_QUERY,
+                description="Cursos que empiezan hasta esta fecha (incluida). Ej: 2025-12-31",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=False
+            ),
             openapi.Parameter(
                 'search',
                 openapi.IN_QUERY,
@@ -182,7 +365,11 @@ class CursoViewSet(viewsets.ModelViewSet):
                 description="Ordenar por: titulo, -titulo, fecha_inicio, -fecha_inicio",
                 type=openapi.TYPE_STRING,
                 required=False
-            )
+            ),
+            parametro_since,
+            parametro_ids,
+            parametro_count,
+            parametro_format
         ]
     )
     def list(self, request, *args, **kwargs):
@@ -242,12 +429,73 @@ class CursoViewSet(viewsets.ModelViewSet):
         serializado = EstudianteSerializer(estudiantes, many=True) 
         return Response(serializado.data)
 
-class MatriculaViewSet(viewsets.ModelViewSet):
+    # Endpoint adicional GET cursos/abiertos, servido desde la caché de elegibilidad
+    @swagger_auto_schema(
+        operation_description="Cursos que hoy admiten matrículas (activos y no iniciados). "
+                              "La cabecera X-Cache-Elegibilidad indica aciertos, fallos y tasa de aciertos de la caché",
+        responses={200: CursoSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], url_path='abiertos')
+    def abiertos(self, request):
+        datos = elegibilidad.abiertos(lambda cursos: CursoSerializer(cursos, many=True).data)
+        stats = elegibilidad.estadisticas()
+        return Response(datos, headers={
+            'X-Cache-Elegibilidad': f"aciertos={stats['aciertos']}; fallos={stats['fallos']}; tasa={stats['tasa_aciertos']}"
+        })
+
+    # Endpoint adicional POST curso/{id}/calificaciones, notas de todo el curso de una vez
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Registra las calificaciones de varios estudiantes del curso en una sola operación. "
+                              "Si alguna es inválida no se guarda ninguna.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            description="Pares {estudiante_id: calificacion}. null borra la calificación",
+            additional_properties=openapi.Schema(type=openapi.TYPE_NUMBER),
+            example={"1": 8.5, "2": 6.75, "5": None}
+        ),
+        responses={
+            status.HTTP_200_OK: openapi.Response(
+                description="Calificaciones guardadas",
+                examples={"application/json": {"actualizadas": 3}}
+            ),
+            status.HTTP_400_BAD_REQUEST: openapi.Response(
+                description="Calificaciones inválidas o estudiantes no matriculados",
+                examples={
+                    "application/json": {
+                        "error": {
+                            "2": ["Ensure this value is less than or equal to 10."],
+                            "7": ["El estudiante no está matriculado en este curso."]
+                        }
+                    }
+                }
+            ),
+            status.HTTP_404_NOT_FOUND: "Curso no encontrado"
+        }
+    )
+    @action(detail=True, methods=['post'], url_path='calificaciones')
+    def calificaciones(self, request, pk=None):
+        curso = self.get_object()
+        try:
+            actualizadas = registrar_calificaciones(curso, request.data)
+        except DjangoValidationError as e:
+            return Response({"error": e.message_dict}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"actualizadas": actualizadas})
+
+class MatriculaViewSet(LoteMixin, SincronizacionMixin, ConteoMixin, ColumnasMixin, VersionadoMixin, viewsets.ModelViewSet):
     queryset = Matricula.objects.all()
     serializer_class = MatriculaSerializer
 
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['estudiante', 'curso', 'calificacion']
+    filter_backends = [FiltroCampos, filters.SearchFilter, filters.OrderingFilter]
+    campos_filtro = {
+        'estudiante': ('estudiante_id', 'entero'),
+        'curso': ('curso_id', 'entero'),
+        'calificacion': ('calificacion', 'decimal'),
+        'calificacion__gte': ('calificacion__gte', 'decimal'),
+        'calificacion__lte': ('calificacion__lte', 'decimal'),
+        'fecha_matricula__gte': ('fecha_matricula__gte', 'fecha'),
+        'fecha_matricula__lte': ('fecha_matricula__lte', 'fecha'),
+    }
     search_fields = ['estudiante__nombre', 'estudiante__email', 'curso__titulo']
     ordering_fields = ['fecha_matricula', 'calificacion', 'estudiante__nombre', 'curso__titulo']
     ordering = ['-fecha_matricula']  # Más recientes primero
@@ -290,6 +538,22 @@ class MatriculaViewSet(viewsets.ModelViewSet):
                     type=openapi.TYPE_NUMBER,
                     required=False
                 ),
+                openapi.Parameter(
+                    'fecha_matricula__gte',
+                    openapi.IN_QUERY,
+                    description="Matrículas desde esta fecha (incluida). Ej: 2025-01-01",
+                    type=openapi.TYPE_STRING,
+                    format=openapi.FORMAT_DATE,
+                    required=False
+                ),
+                openapi.Parameter(
+                    'fecha_matricula__lte',
+                    openapi.IN_QUERY,
+                    description="Matrículas hasta esta fecha (incluida). Ej: 2025-12-31",
+                    type=openapi.TYPE_STRING,
+                    format=openapi.FORMAT_DATE,
+                    required=False
+                ),
                 openapi.Parameter(
                     'search',
                     openapi.IN_QUERY,
@@ -303,17 +567,37 @@ class MatriculaViewSet(viewsets.ModelViewSet):
                     description="Ordenar por: fecha_matricula (antiguas primero), -fecha_matricula (recientes primero), calificacion (baja a alta), -calificacion (alta a baja), estudiante__nombre, curso__titulo",
                     type=openapi.TYPE_STRING,
                     required=False
-                )
+                ),
+                openapi.Parameter(
+                    'include_archived',
+                    openapi.IN_QUERY,
+                    description="Incluir también las matrículas archivadas (detrás de las vigentes). Ej: true",
+                    type=openapi.TYPE_BOOLEAN,
+                    required=False
+                ),
+                parametro_since,
+                parametro_ids,
+                parametro_count,
+                parametro_format
             ],
             operation_description="Lista todas las matrículas con opciones de filtrado, búsqueda y ordenamiento"
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        if 'ids' in request.query_params or request.query_params.get('include_archived', '').lower() not in ('true', '1'):
+            return super().list(request, *args, **kwargs)
+        # Mismos filtros y orden sobre las dos tablas; primero las vigentes y después las archivadas
+        vigentes = self.filter_queryset(self.get_queryset())
+        archivadas = self.filter_queryset(MatriculaArchivada.objects.all())
+        if self.en_columnas(request):
+            return Response(columnas([vigentes, archivadas], self.get_serializer()))
+        data = MatriculaSerializer(vigentes, many=True).data + MatriculaArchivadaSerializer(archivadas, many=True).data
+        return Response(data)
 
     #Documentar POST MATRICULA
     @swagger_auto_schema(
-         operation_description="Crear una nueva matrícula de estudiante en un curso",
+         operation_description="Crear una nueva matrícula de estudiante en un curso. Con Idempotency-Key los reintentos devuelven la respuesta original",
         request_body=MatriculaSerializer,
+        manual_parameters=[parametro_idempotency_key],
         responses={
             status.HTTP_201_CREATED: MatriculaSerializer,
             status.HTTP_400_BAD_REQUEST: openapi.Response(
@@ -352,4 +636,265 @@ class MatriculaViewSet(viewsets.ModelViewSet):
                 {"error": "El estudiante ya está matriculado en este curso."},
                 status=status.HTTP_409_CONFLICT
             )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+# Consulta del archivo de matrículas GET /matriculas-archivadas/ (solo lectura)
+class MatriculaArchivadaViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = MatriculaArchivada.objects.all()
+    serializer_class = MatriculaArchivadaSerializer
+
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['estudiante__nombre', 'estudiante__email', 'curso__titulo']
+    ordering_fields = ['fecha_matricula', 'calificacion', 'estudiante__nombre', 'curso__titulo', 'anio']
+    ordering = ['-fecha_matricula']
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'anio',
+                openapi.IN_QUERY,
+                description="Año de inicio del curso. Ej: 2023",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'search',
+                openapi.IN_QUERY,
+                description="Buscar en nombre/email de estudiante o título de curso",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'ordering',
+                openapi.IN_QUERY,
+                description="Ordenar por: fecha_matricula, calificacion, estudiante__nombre, curso__titulo, anio (con - para descendente)",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        operation_description="Lista las matrículas archivadas de cursos terminados o inactivos"
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        anio = self.request.query_params.get('anio')
+        if anio:
+            if not (anio.isascii() and anio.isdigit()):
+                raise ValidationError({"anio": ["Debe ser un año. Ej: 2023"]})
+            queryset = queryset.filter(anio=int(anio))
+        return queryset
+
+
+# Cola de reportes masivos: POST /reportes/jobs/, GET /reportes/jobs/{id}/ y GET /reportes/jobs/{id}/descarga/
+# Los procesa en segundo plano `python manage.py procesar_reportes`.
+class TrabajoReporteViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    queryset = TrabajoReporte.objects.order_by('-id')
+    serializer_class = TrabajoReporteSerializer
+
+    @swagger_auto_schema(
+        operation_description="Encola un reporte con el expediente de todos los estudiantes (json o csv). "
+                              "Devuelve el trabajo para consultar su progreso.",
+        request_body=TrabajoReporteSerializer,
+        responses={
+            status.HTTP_202_ACCEPTED: TrabajoReporteSerializer,
+            status.HTTP_400_BAD_REQUEST: "Formato no válido"
+        }
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        operation_description="Descarga el fichero del reporte cuando el trabajo está completado",
+        responses={
+            200: "Fichero JSON o CSV",
+            409: "El trabajo todavía no está completado",
+            404: "Trabajo no encontrado",
+            410: "El fichero del reporte ya no existe; hay que encolar uno nuevo"
+        }
+    )
+    @action(detail=True, methods=['get'], url_path='descarga')
+    def descarga(self, request, pk=None):
+        trabajo = self.get_object()
+        if trabajo.estado != 'completado':
+            return Response(
+                {"error": "El reporte no está listo.", "estado": trabajo.estado},
+                status=status.HTTP_409_CONFLICT
+            )
+        content_type = 'text/csv' if trabajo.formato == 'csv' else 'application/json'
+        try:
+            fichero = open(trabajo.archivo, 'rb')
+        except FileNotFoundError:
+            # Borrado a mano o REPORTES_DIR cambiado tras generarlo
+            return Response({"error": "El fichero del reporte ya no existe."}, status=status.HTTP_410_GONE)
+        return FileResponse(
+            fichero,
+            as_attachment=True,
+            filename=f"reporte_{trabajo.id}.{trabajo.formato}",
+            content_type=content_type,
+        )
+
+# Progreso de los borrados en segundo plano GET /borrados/ y GET /borrados/{id}/
+class TrabajoBorradoViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = TrabajoBorrado.objects.order_by('-id')
+    serializer_class = TrabajoBorradoSerializer
+
+# Perfiles de peticiones guardados por PerfiladorMiddleware: GET /perfiles/ y GET /perfiles/{id}/ (solo staff)
+class PerfilViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+    lookup_value_regex = '[0-9A-Za-z-]+'
+
+    @swagger_auto_schema(
+        operation_description="Lista los perfiles guardados (los más recientes primero) con el reparto de tiempo. "
+                              "Se generan con ?_profile=1 en cualquier petición de un usuario staff o por muestreo",
+        responses={200: "Lista de resúmenes", 403: "Solo para staff"}
+    )
+    def list(self, request):
+        return Response(perfilado.listar())
+
+    @swagger_auto_schema(
+        operation_description="Perfil completo: reparto de tiempo (ORM, serialización, renderizado, middleware, vista) "
+                              "y funciones con más tiempo acumulado. Con ?formato=prof descarga el fichero de pstats",
+        manual_parameters=[
+            openapi.Parameter(
+                'formato',
+                openapi.IN_QUERY,
+                description="json (por defecto) o prof (fichero para pstats o snakeviz)",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        responses={200: "Perfil", 403: "Solo para staff", 404: "Perfil no encontrado"}
+    )
+    def retrieve(self, request, pk=None):
+        if request.query_params.get('formato') == 'prof':
+            ruta = perfilado.ruta_perfil(pk, 'prof')
+            if ruta:
+                return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=ruta.name)
+        else:
+            resumen = perfilado.leer(pk)
+            if resumen:
+                return Response(resumen)
+        return Response({"error": "Perfil no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+# Autocompletado GET /autocomplete/?q= servido desde el índice en memoria (academia_app/autocompletado.py)
+class AutocompletadoViewSet(viewsets.ViewSet):
+
+    @swagger_auto_schema(
+        operation_description="Sugerencias de estudiantes (por nombre o email) y cursos (por título) cuyas palabras "
+                              "empiezan por las de q, sin distinguir tildes ni mayúsculas (\"lucia go\" encuentra a "
+                              "Lucía Gómez). La cabecera X-Autocompletado da el tiempo de la búsqueda en el índice, "
+                              "sus entradas y la memoria que ocupa",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Texto escrito hasta ahora",
+                              type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('tipo', openapi.IN_QUERY, description="estudiante o curso (por defecto los dos)",
+                              type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('limite', openapi.IN_QUERY, description="Número de sugerencias (por defecto AUTOCOMPLETADO_LIMITE)",
+                              type=openapi.TYPE_INTEGER, required=False),
+        ],
+        responses={200: "{\"resultados\": [{tipo, id, texto, detalle}]}", 400: "Parámetros no válidos"}
+    )
+    def list(self, request):
+        consulta = request.query_params.get('q', '')
+        tipo = request.query_params.get('tipo')
+        limite = request.query_params.get('limite', str(settings.AUTOCOMPLETADO_LIMITE))
+        if tipo is not None and tipo not in TIPOS_AUTOCOMPLETADO:
+            return Response({"error": f"tipo debe ser uno de: {', '.join(TIPOS_AUTOCOMPLETADO)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not (limite.isascii() and limite.isdigit()) or not 1 <= int(limite) <= settings.AUTOCOMPLETADO_LIMITE_MAXIMO:
+            return Response({"error": f"limite debe ser un entero entre 1 y {settings.AUTOCOMPLETADO_LIMITE_MAXIMO}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        indice = autocompletado.actual()
+        inicio = time.perf_counter()
+        resultados = indice.buscar(consulta, (tipo,) if tipo else TIPOS_AUTOCOMPLETADO, int(limite))
+        microsegundos = round((time.perf_counter() - inicio) * 1e6)
+        stats = indice.estadisticas()
+        return Response({"resultados": resultados}, headers={
+            'X-Autocompletado': f"microsegundos={microsegundos}; entradas={stats['entradas']}; bytes={stats['bytes']}"
+        })
+
+# Instantánea de la base de datos de la academia GET /instantanea/ (academia_app/instantaneas.py)
+class InstantaneaViewSet(viewsets.ViewSet):
+    # Es un volcado de todas las tablas de la academia, y generarlo (backup, VACUUM y gzip) cuesta segundos
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Descarga una copia coherente (un mismo instante) de estudiantes, cursos, matrículas y "
+                              "matrículas archivadas: un fichero SQLite comprimido con gzip con una tabla instantanea "
+                              "(seq, creada, academia). Mientras no haya cambios se sirve la misma copia; con "
+                              "If-None-Match y el ETag de la descarga anterior responde 304 sin cuerpo",
+        manual_parameters=[
+            openapi.Parameter('If-None-Match', openapi.IN_HEADER, description="ETag de la última descarga",
+                              type=openapi.TYPE_STRING, required=False)
+        ],
+        responses={200: "Fichero .sqlite3.gz", 304: "Sin cambios desde la instantánea del ETag",
+                   403: "Solo usuarios staff"}
+    )
+    def list(self, request):
+        etag = lambda seq: f'"instantanea-{alias_actual()}-{seq}"'
+        if request.headers.get('If-None-Match') == etag(seq_actual()):
+            respuesta = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            seq, ruta = instantanea_actual()
+            respuesta = FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f"academia_{seq}.sqlite3.gz",
+                                     content_type='application/gzip')
+            respuesta['ETag'] = etag(seq)
+            respuesta['X-Instantanea-Seq'] = str(seq)
+        respuesta['Cache-Control'] = 'no-cache'  # se puede guardar, pero preguntando antes si sigue valiendo
+        return respuesta
+
+# Métricas Prometheus GET /metrics, sumadas entre todos los workers
+def metricas(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return HttpResponse(registro_metricas.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Stream SSE GET /api/eventos/ (vista async, se sirve con academia_api/asgi.py)
+async def eventos(request):
+    """
+    Envía en tiempo real altas, bajas y recalificaciones de matrículas y activaciones de cursos.
+    ?curso=<id> filtra por curso. Al reconectar, el navegador manda Last-Event-ID y se reenvían los eventos perdidos.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    curso = request.GET.get('curso')
+    ultimo = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if any(valor is not None and not (valor.isascii() and valor.isdigit()) for valor in (curso, ultimo)):
+        return JsonResponse({"error": "curso y Last-Event-ID deben ser enteros."}, status=status.HTTP_400_BAD_REQUEST)
+
+    respuesta = StreamingHttpResponse(
+        # El difusor se elige aquí: el generador se consume después de que los middlewares hayan terminado
+        _flujo_eventos(difusor.actual(), int(curso) if curso else None, int(ultimo) if ultimo else None),
+        content_type='text/event-stream',
+    )
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'  # que un proxy nginx no acumule el stream
+    return respuesta
+
+
+async def _flujo_eventos(canal, curso_id, ultimo_id):
+    suscripcion, pendientes, completo = canal.suscribir(curso_id, ultimo_id)
+    try:
+        yield "retry: 3000\n\n"
+        if not completo:
+            # Se han perdido eventos: el cliente debe resincronizar con ?since=
+            yield "event: reinicio\ndata: {}\n\n"
+        for evento in pendientes:
+            yield evento.como_sse()
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=settings.EVENTOS_LATIDO)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            yield evento.como_sse()
+            if suscripcion.desbordada and suscripcion.cola.empty():
+                yield "event: reinicio\ndata: {}\n\n"
+                return
+    finally:
+        canal.cancelar(suscripcion)
@@ -0,0 +1,96 @@
+import json
+import random
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import EventoSalida
+
+# Entrega de la bandeja de salida a los webhooks configurados (WEBHOOK_URLS).
+# Semántica al menos una vez: un evento solo se marca entregado tras un 2xx, así que un
+# destino puede recibirlo repetido y debe deduplicar por su "id".
+
+
+def encolar_evento(tipo, payload, using=None):
+    """Escribe el evento para cada destino. Llamar dentro de la transacción del cambio que lo origina."""
+    if not settings.WEBHOOK_URLS:
+        return
+    EventoSalida.objects.using(using).bulk_create(
+        [EventoSalida(tipo=tipo, destino=destino, payload=payload) for destino in settings.WEBHOOK_URLS]
+    )
+
+
+def _espera(intentos):
+    # Backoff exponencial con jitter para no reintentar todos a la vez
+    segundos = min(settings.WEBHOOK_BACKOFF_BASE * 2 ** intentos, settings.WEBHOOK_BACKOFF_MAX)
+    return timedelta(seconds=segundos * random.uniform(0.5, 1.0))
+
+
+def _enviar(destino, eventos):
+    """POST de un lote a un destino. Devuelve None si fue bien o el texto del error."""
+    cuerpo = json.dumps({
+        "eventos": [
+            {"id": e.id, "tipo": e.tipo, "creado": e.creado.isoformat(), "datos": e.payload}
+            for e in eventos
+        ]
+    }).encode('utf-8')
+    peticion = urllib.request.Request(destino, data=cuerpo, method='POST', headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(peticion, timeout=settings.WEBHOOK_TIMEOUT) as respuesta:
+            respuesta.read()
+    except urllib.error.HTTPError as e:
+        return f"HTTP {e.code}"
+    except (urllib.error.URLError, OSError) as e:
+        return str(getattr(e, 'reason', e))
+    return None
+
+
+def _reclamar(lote, ahora):
+    # Aparta los eventos pendientes moviendo su próximo intento; otro despachador no los coge mientras se envían
+    with transaction.atomic(using=router.db_for_write(EventoSalida)):
+        pendientes = list(
+            EventoSalida.objects.filter(
+                entregado__isnull=True,
+                intentos__lt=settings.WEBHOOK_MAX_INTENTOS,
+                proximo_intento__lte=ahora,
+            ).order_by('id')[:lote]
+        )
+        EventoSalida.objects.filter(id__in=[e.id for e in pendientes]).update(
+            proximo_intento=ahora + timedelta(seconds=settings.WEBHOOK_TIMEOUT * 2)
+        )
+    pendientes.sort(key=lambda e: e.destino)  # estable: dentro de cada destino se mantiene el orden de creación
+    return pendientes
+
+
+def despachar_pendientes(lote=None, hilos=None):
+    """Entrega una tanda de eventos pendientes agrupados por destino. Devuelve (entregados, fallidos)."""
+    ahora = timezone.now()
+    pendientes = _reclamar(lote or settings.WEBHOOK_LOTE, ahora)
+    if not pendientes:
+        return 0, 0
+    por_destino = [(destino, list(eventos)) for destino, eventos in groupby(pendientes, key=lambda e: e.destino)]
+
+    with ThreadPoolExecutor(max_workers=hilos or settings.WEBHOOK_HILOS) as pool:
+        errores = list(pool.map(lambda par: _enviar(*par), por_destino))
+
+    entregados = fallidos = 0
+    ahora = timezone.now()
+    with transaction.atomic(using=router.db_for_write(EventoSalida)):
+        for (destino, eventos), error in zip(por_destino, errores):
+            if error is None:
+                EventoSalida.objects.filter(id__in=[e.id for e in eventos]).update(entregado=ahora, ultimo_error='')
+                entregados += len(eventos)
+                continue
+            for evento in eventos:
+                evento.intentos += 1
+                evento.proximo_intento = ahora + _espera(evento.intentos)
+                evento.ultimo_error = error
+            EventoSalida.objects.bulk_update(eventos, ['intentos', 'proximo_intento', 'ultimo_error'])
+            fallidos += len(eventos)
+    return entregados, fallidos
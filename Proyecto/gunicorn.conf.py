@@ -0,0 +1,11 @@
+# Configuración de gunicorn (se carga sola al arrancar desde esta carpeta)
+import os
+
+
+def on_starting(server):
+    # Métricas de /metrics: se empieza con el directorio vacío para no sumar procesos de un arranque anterior
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academia_api.settings')
+    django.setup()
+    from academia_app.metricas import limpiar_directorio
+    limpiar_directorio()